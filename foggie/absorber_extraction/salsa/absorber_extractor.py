@@ -20,6 +20,7 @@ from yt.data_objects.static_output import \
 
 from foggie.absorber_extraction.salsa.utils.utility_functions import ion_p_num
 from foggie.utils.consistency import min_absorber_dict
+from foggie.utils.coldens_threshold import coldens_fraction_threshold
 
 class AbsorberExtractor():
     """
@@ -306,50 +307,52 @@ class AbsorberExtractor():
         stats_table['wave'] = self.wavelength_center
         stats_table['redshift'] = self.ds.current_redshift
 
-        # fill table with absorber features
-        for i in range(n_abs):
-            #load data for calculating properties
-            start, end = self.spice_intervals[i]
-            stats_table.loc[i, 'interval_start'] = start
-            stats_table.loc[i, 'interval_end'] = end
-            dl = self.data['dl'][start:end].in_units('cm')
-            density = self.data[('gas', 'density')][start:end].in_units('g/cm**3')
-            tot_density = np.sum(dl*density)
-
-            #calculate column density
-            ion_field = ion_p_num(self.ion_name)
-            ion_density=self.data[ion_field][start:end].in_units('cm**-3')
-            col_density = np.sum(dl*ion_density)
-
-            stats_table.loc[i, 'col_dens'] = np.log10(col_density)
-
-            #calculate delta_v of absorber. ion col dense weighted
-            vel_los_dat = self.data['velocity_los'][start:end].in_units('km/s')
-            central_vel = np.sum(dl*ion_density*vel_los_dat)/col_density
-            stats_table.loc[i, 'delta_v'] = central_vel
-
-            #calculate velocity dispersion
-
-            # set single cell absorber to zero velocity variance
-            if end-start == 1:
-                vel_variance=np.nan
-            else:
-                #weighted sample variance
-                vel_variance=col_density \
-                     *np.sum(dl*ion_density * ( vel_los_dat - self.ds.quan(central_vel, 'km/s') )**2) \
-                     /(col_density**2 - np.sum( (dl*ion_density)**2 ))
-
-            stats_table.loc[i, 'vel_dispersion'] = np.sqrt(vel_variance)
-
-            #calculate other field averages. gas col density weighted
-            for fld in fields:
-                fld_data = self.data[fld][start:end]
-                avg_fld = np.sum(dl*density*fld_data)/tot_density
-
-                if fld in units_dict.keys():
-                    stats_table.loc[i, fld] = avg_fld.in_units( units_dict[fld] )
-                else:
-                    stats_table.loc[i, fld] = avg_fld
+        # gather the cells of every absorber into one array, with the cells of
+        # absorber i in [offsets[i], offsets[i]+lengths[i])
+        starts = np.array([b for b, e in self.spice_intervals], dtype=np.int64)
+        ends = np.array([e for b, e in self.spice_intervals], dtype=np.int64)
+        lengths = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        cells = np.repeat(starts - offsets, lengths) + np.arange(np.sum(lengths))
+
+        stats_table['interval_start'] = starts
+        stats_table['interval_end'] = ends
+
+        #load data for calculating properties once for the whole ray
+        dl = np.asarray(self.data['dl'].in_units('cm'))[cells]
+        density = np.asarray(self.data[('gas', 'density')].in_units('g/cm**3'))[cells]
+        ion_field = ion_p_num(self.ion_name)
+        ion_density = np.asarray(self.data[ion_field].in_units('cm**-3'))[cells]
+        vel_los_dat = np.asarray(self.data['velocity_los'].in_units('km/s'))[cells]
+
+        gas_coldens = dl*density
+        ion_coldens = dl*ion_density
+        tot_density = np.add.reduceat(gas_coldens, offsets)
+
+        #calculate column density
+        col_density = np.add.reduceat(ion_coldens, offsets)
+        stats_table['col_dens'] = np.log10(col_density)
+
+        #calculate delta_v of absorber. ion col dense weighted
+        central_vel = np.add.reduceat(ion_coldens*vel_los_dat, offsets)/col_density
+        stats_table['delta_v'] = central_vel
+
+        #calculate velocity dispersion as the weighted sample variance
+        vel_offset = vel_los_dat - np.repeat(central_vel, lengths)
+        vel_variance = col_density*np.add.reduceat(ion_coldens*vel_offset**2, offsets) \
+                       /(col_density**2 - np.add.reduceat(ion_coldens**2, offsets))
+
+        # set single cell absorber to zero velocity variance
+        vel_variance[lengths == 1] = np.nan
+        stats_table['vel_dispersion'] = np.sqrt(vel_variance)
+
+        #calculate other field averages. gas col density weighted
+        for fld in fields:
+            fld_data = self.data[fld]
+            if fld in units_dict.keys():
+                fld_data = fld_data.in_units( units_dict[fld] )
+            fld_data = np.asarray(fld_data)[cells]
+            stats_table[fld] = np.add.reduceat(gas_coldens*fld_data, offsets)/tot_density
 
         self.spice_df = stats_table
         return self.spice_df
@@ -496,15 +499,7 @@ class AbsorberExtractor():
 
     def _cloud_method(self, num_density_arr, coldens_fraction):
         "run the cloud method"
-        cut = 0.999
-        total = np.sum(num_density_arr)
-        ratio = 0.001
-        while ratio < coldens_fraction:
-            part = np.sum(num_density_arr[num_density_arr > cut * np.max(num_density_arr)])
-            ratio = part / total
-            cut = cut - 0.001
-
-        threshold = cut * np.max(num_density_arr)
+        threshold = coldens_fraction_threshold(num_density_arr, coldens_fraction)
 
         return threshold
 
@@ -657,23 +652,16 @@ class AbsorberExtractor():
             list of the intervals defining the absorbers in this ray.
         """
         num_density = self.data[ion_p_num(self.ion_name)].in_units("cm**(-3)")
-        in_absorber = False
-        intervals = []
-
-        #Iterate over values in field
-        for i,value in enumerate(num_density):
-            #Check if started an absorber and if above cutoff
-            if in_absorber and value < cutoff:
-                in_absorber = False
-                #add interval to list
-                intervals.append((start,i))
-            # check if just entered an absorber
-            elif not in_absorber and value >= cutoff:
-                in_absorber = True
-                start = i
-            else:
-                continue
-        #check if was still in absorber when hitting end of ray
-        if in_absorber and start != i:
-            intervals.append((start, i))
+        n_cells = len(num_density)
+
+        #find where the ray enters (+1) and leaves (-1) regions above cutoff
+        in_absorber = np.concatenate([[0], np.asarray(num_density >= cutoff, dtype=np.int8), [0]])
+        edges = np.diff(in_absorber)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        #absorbers still open at the end of the ray end at the last index
+        ends[ends == n_cells] = n_cells - 1
+        keep = ends > starts
+        intervals = list(zip(starts[keep].tolist(), ends[keep].tolist()))
         return intervals
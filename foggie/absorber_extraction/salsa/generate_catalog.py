@@ -6,17 +6,21 @@
 # Sept 24, 2020 put import of units_dict in here rather than as kwarg in call 
 #
 
+import os
+import heapq
 import numpy as np
 import yt
 import trident
 import pandas as pd
 
 from foggie.absorber_extraction.salsa.absorber_extractor import AbsorberExtractor
-from foggie.absorber_extraction.salsa.utils.collect_files import collect_files, check_rays
+from foggie.absorber_extraction.salsa.utils.collect_files import check_rays, \
+    build_ray_manifest, shard_filename, extraction_key
 from foggie.absorber_extraction.salsa.utils.utility_functions import ion_p_num
 from foggie.absorber_extraction.salsa.generate_light_rays import generate_lrays
 from foggie.utils.consistency import units_dict
 from mpi4py import MPI
+from multiprocessing import Pool
 
 from yt.data_objects.static_output import \
     Dataset
@@ -33,7 +37,9 @@ def generate_catalog(ds_file, n_rays,
                      ftype='gas',
                      cut_region_filters=[],
                      extractor_kwargs={},
-                     units_dict={}):
+                     units_dict={},
+                     shard_directory=None,
+                     n_procs=1):
 
     """
     Generates a catalog of absorber properties from a given number of lightrays
@@ -41,6 +47,14 @@ def generate_catalog(ds_file, n_rays,
     create them by uniform randomly sampling impact parameter. Uses OpenMPI to
     split up light ray creation and absorber extraction among processors.
 
+    The rays are indexed once in a manifest (ray_manifest.csv in ray_directory)
+    holding the fields and number of cells of each ray and which ions were
+    already extracted. The absorbers of each ray and ion are saved as a catalog
+    shard as soon as they are extracted, so an interrupted run only extracts
+    the rays that are left when restarted. Rays are assigned to processes by
+    their number of cells so every process has about the same amount of work,
+    and the shards are merged into the full catalog at the end.
+
     Parameters
     ----------
     ds_file: str or dataset
@@ -109,6 +123,16 @@ def generate_catalog(ds_file, n_rays,
 
         Default: {}
 
+    shard_directory: str, optional
+        Directory where the catalog shard of each ray and ion is saved. If None,
+        uses a 'catalog_shards' directory inside ray_directory.
+        Default: None
+
+    n_procs: int, optional
+        Number of local processes to extract absorbers with when not running
+        under MPI (ds_file must then be a path or a dataset loaded from a file).
+        Default: 1
+
     Returns
     -------
     full_catalog: pandas.DataFrame
@@ -159,17 +183,94 @@ def generate_catalog(ds_file, n_rays,
     comm.Barrier()
     #Extract Absorbers
 
-    #collect and split up ray files
-    ray_files = np.array(collect_files(ray_directory, key_words=['ray']), dtype=str)
-    ray_files_split = np.array_split(ray_files, comm.size)
-    my_rays = ray_files_split[ comm.rank ]
+    if shard_directory is None:
+        shard_directory = f"{ray_directory}/catalog_shards"
 
-    #add directory path to rays
-    my_ray_files=[ ray_directory+'/'+r for r in my_rays ]
+    #shards are named after the extraction parameters, so changing them
+    #extracts every ray again instead of reusing shards made with the old ones
+    shard_key = extraction_key(method, fields, units_dict, cut_region_filters, extractor_kwargs)
 
-    #create catalog for each ion
-    df_list=[]
+    #index the rays and find which rays and ions are left to extract
+    manifest = None
+    if comm.rank == 0:
+        os.makedirs(shard_directory, exist_ok=True)
+        manifest = build_ray_manifest(ray_directory, ion_list, method, shard_directory, shard_key)
+    manifest = comm.bcast(manifest, root=0)
+
+    tasks = []
+    costs = []
     for ion in ion_list:
+        pending = manifest[manifest[f"status_{ion}"] != 'done']
+        for rfile, n_cells in zip(pending['ray_file'], pending['n_cells']):
+            tasks.append((ray_directory+'/'+rfile, ion))
+            costs.append(n_cells)
+    if comm.rank == 0:
+        print(f"{len(tasks)} of {len(manifest)*len(ion_list)} rays and ions left to extract")
+
+    #extract absorbers, saving each ray's catalog shard as it is done
+    extract_args = (method, fields, units_dict, cut_region_filters, extractor_kwargs, shard_directory, shard_key)
+    if comm.size == 1 and n_procs > 1:
+        if isinstance(ds_file, str):
+            ds_filename = ds_file
+        else:
+            ds_filename = ds.parameter_filename
+        order = np.argsort(costs)[::-1]
+        with Pool(n_procs, initializer=_init_pool_worker, initargs=(ds_filename,)+extract_args) as pool:
+            for _ in pool.imap_unordered(_pool_extract, [tasks[i] for i in order]):
+                pass
+    else:
+        my_tasks = [tasks[i] for i in assign_by_cost(costs, comm.size)[comm.rank]]
+        abs_exts = {}
+        for ray_file, ion in my_tasks:
+            extract_shard(ds, ray_file, ion, abs_exts, *extract_args)
+
+    comm.Barrier()
+
+    #merge shards into one catalog
+    full_catalog = None
+    if comm.rank == 0:
+        manifest = build_ray_manifest(ray_directory, ion_list, method, shard_directory, shard_key)
+        shard_files = [shard_filename(shard_directory, rfile, ion, method, shard_key)
+                       for ion in ion_list for rfile in manifest['ray_file']]
+        full_catalog = merge_shards(shard_files)
+    full_catalog = comm.bcast(full_catalog, root=0)
+
+    return full_catalog
+
+def assign_by_cost(costs, n_workers):
+    """
+    Split tasks among workers so each gets about the same total cost, by
+    handing the most costly remaining task to the least loaded worker.
+
+    Parameters
+    ----------
+    costs: list or array
+        Cost (ie number of cells of the ray) of each task
+
+    n_workers: int
+        Number of workers to split tasks among
+
+    Returns
+    -------
+    assignments: list of lists of int
+        Indices of the tasks given to each worker, most costly first
+    """
+    assignments = [[] for i in range(n_workers)]
+    loads = [(0, i) for i in range(n_workers)]
+    for task in np.argsort(costs, kind='stable')[::-1]:
+        load, worker = heapq.heappop(loads)
+        assignments[worker].append(int(task))
+        heapq.heappush(loads, (load + costs[task], worker))
+    return assignments
+
+def extract_shard(ds, ray_file, ion, abs_exts, method, fields, units_dict,
+                  cut_region_filters, extractor_kwargs, shard_directory, shard_key):
+    """
+    Extract the absorbers of one ion from one ray and save them as a catalog
+    shard named after shard_key, the extraction_key of the parameters. Absorber
+    extractors are made once per ion and kept in abs_exts.
+    """
+    if ion not in abs_exts:
         #check if extractor kwargs has ion specific information
         if ion in extractor_kwargs.keys():
             curr_kwargs = extractor_kwargs[ion]
@@ -177,32 +278,46 @@ def generate_catalog(ds_file, n_rays,
             curr_kwargs=extractor_kwargs.copy()
 
         # setup absorber extractor
-        abs_ext = AbsorberExtractor(ds, my_ray_files[0], ion_name=ion,
-                                     cut_region_filters=cut_region_filters,
-                                     **curr_kwargs)
-
-        # get catalogs
-        my_df = get_absorbers(abs_ext, my_ray_files, method, fields=fields, units_dict=units_dict)
-        if my_df is not None:
-            df_list.append(my_df)
-
-    # Return Nonetype if no absorbers found
-    if df_list == []:
-        my_catalog = None
-    else:
-        my_catalog= pd.concat(df_list, ignore_index=True)
-    comm.Barrier()
+        abs_exts[ion] = AbsorberExtractor(ds, ray_file, ion_name=ion,
+                                          cut_region_filters=cut_region_filters,
+                                          **curr_kwargs)
 
-    #gather all catalogs and creae one large
-    all_dfs = comm.allgather(my_catalog)
+    df = get_absorbers(abs_exts[ion], [ray_file], method, fields=fields, units_dict=units_dict)
 
-    # check if any absorbers were found
-    if all(v is None for v in all_dfs):
-        full_catalog = None
-    else:
-        full_catalog = pd.concat(all_dfs, ignore_index=True)
+    #write to a temporary file first so a killed job never leaves a partial shard
+    shard = shard_filename(shard_directory, ray_file, ion, method, shard_key)
+    pd.to_pickle(df, shard + '.tmp')
+    os.replace(shard + '.tmp', shard)
 
-    return full_catalog
+def merge_shards(shard_files):
+    """
+    Combine catalog shards into one catalog. Returns None if no absorbers were
+    found in any of them.
+    """
+    dfs = []
+    for shard in shard_files:
+        if os.path.exists(shard):
+            df = pd.read_pickle(shard)
+            if df is not None:
+                dfs.append(df)
+
+    if dfs == []:
+        return None
+    return pd.concat(dfs, ignore_index=True)
+
+_pool_state = {}
+
+def _init_pool_worker(ds_filename, *extract_args):
+    """
+    Load the dataset once in each local worker process.
+    """
+    _pool_state['ds'] = yt.load(ds_filename)
+    _pool_state['abs_exts'] = {}
+    _pool_state['extract_args'] = extract_args
+
+def _pool_extract(task):
+    ray_file, ion = task
+    extract_shard(_pool_state['ds'], ray_file, ion, _pool_state['abs_exts'], *_pool_state['extract_args'])
 
 def get_absorbers(abs_extractor, ray_list, method, fields=None, units_dict=None):
     """
@@ -242,8 +357,7 @@ def get_absorbers(abs_extractor, ray_list, method, fields=None, units_dict=None)
                 # add ray index
                 ray_num = get_ray_num(ray)
                 start = 65 # Ascii number for 'A'
-                for i in range(abs_extractor.num_spice):
-                    df.loc[i,'absorber_index'] = f"{ray_num}{chr(start+i)}"
+                df['absorber_index'] = [f"{ray_num}{chr(start+i)}" for i in range(abs_extractor.num_spice)]
                 df_list.append(df)
 
     elif method == 'spectacle':
@@ -14,10 +14,10 @@ from yt.data_objects.static_output import \
 
 from mpi4py import MPI
 
-from scipy.spatial.transform import Rotation
 import matplotlib.pyplot as plt
 
-def random_sightlines(ds_file, center, num_sightlines, max_impact_param, min_impact_param=0, length=200):
+def random_sightlines(ds_file, center, num_sightlines, max_impact_param, min_impact_param=0, length=200,
+                      stratified=False, seed=None):
     """
     randomly sample impact parameter to get random sightlines from a given galaxy center
 
@@ -43,6 +43,17 @@ def random_sightlines(ds_file, center, num_sightlines, max_impact_param, min_imp
          length of the sightline in kpc
          Default: 200
 
+    stratified : bool, optional
+        If True, impact parameter and azimuthal angle are each drawn once from
+        every one of num_sightlines equal-probability strata (in random order),
+        so the sample covers the range evenly with no clumps or gaps.
+        Default: False
+
+    seed : int, optional
+        Seed for the random number generator so the sightlines are reproducible.
+        If None, numpy's global random state is used.
+        Default: None
+
     Returns
     --------
     start_points : array
@@ -66,13 +77,18 @@ def random_sightlines(ds_file, center, num_sightlines, max_impact_param, min_imp
     min_impact_param = ds.quan(min_impact_param, 'kpc').in_units('code_length')
     max_impact_param = ds.quan(max_impact_param, 'kpc').in_units('code_length')
 
+    if seed is None:
+        rng = np.random
+    else:
+        rng = np.random.default_rng(seed)
+
     #randomly select angle and distance from center of gal
     #take sqrt so that impact param is uniform in projected area space
-    impact_param = np.sqrt(np.random.uniform(min_impact_param.value**2, max_impact_param.value**2, num_sightlines))
+    impact_param = np.sqrt(_sample_uniform(rng, min_impact_param.value**2, max_impact_param.value**2, num_sightlines, stratified))
 
     #theta represents polar angle. phi represents azimuthal
-    theta = np.random.uniform(0, np.pi, num_sightlines)
-    phi = np.random.uniform(0, 2*np.pi, num_sightlines)
+    theta = rng.uniform(0, np.pi, num_sightlines)
+    phi = _sample_uniform(rng, 0, 2*np.pi, num_sightlines, stratified)
 
     #construct vector from gal_center to sightline midpoint
     rad_vec= np.empty((num_sightlines, 3))
@@ -80,21 +96,18 @@ def random_sightlines(ds_file, center, num_sightlines, max_impact_param, min_imp
     rad_vec[:, 1] = impact_param*np.sin(phi)*np.sin(theta)
     rad_vec[:, 2] = impact_param*np.cos(theta)
 
-    #define vector along sightline (perpendicular to radial vector)
+    #define unit vector along sightline (perpendicular to radial vector)
     perp_vec = np.empty_like(rad_vec)
     perp_vec[:, 0] = rad_vec[:, 1]
     perp_vec[:, 1] = -1*rad_vec[:, 0]
     perp_vec[:, 2] = 0.
+    perp_vec /= np.sqrt(perp_vec[:, 0]**2 + perp_vec[:, 1]**2)[:, np.newaxis]
 
-    #randomly rotate perp_vec around rad vec
-    alpha=np.random.uniform(0., 2*np.pi, num_sightlines)
-    for i in range(num_sightlines):
-        #normalize perpendicular vector
-        perp_vec[i, :] =  perp_vec[i, :]/np.sqrt(perp_vec[i, 0]**2 + perp_vec[i, 1]**2)
-        #rotate around radial vector by random amount
-        rot_vec = alpha[i] *rad_vec[i, :]/np.linalg.norm(rad_vec[i, :])
-        rot = Rotation.from_rotvec(rot_vec)
-        perp_vec[i, :] = rot.apply(perp_vec[i, :])
+    #randomly rotate perp_vec around rad vec. perp_vec is perpendicular to the
+    #rotation axis, so Rodrigues' formula reduces to p*cos(a) + (k x p)*sin(a)
+    alpha=rng.uniform(0., 2*np.pi, num_sightlines)
+    rad_unit = rad_vec/np.linalg.norm(rad_vec, axis=1)[:, np.newaxis]
+    perp_vec = perp_vec*np.cos(alpha)[:, np.newaxis] + np.cross(rad_unit, perp_vec)*np.sin(alpha)[:, np.newaxis]
 
 
     #shift to be centered at galaxy
@@ -185,6 +198,16 @@ def construct_rays(ds_file,
 
     comm.Barrier()
 
+def _sample_uniform(rng, low, high, n, stratified):
+    """
+    draw n uniform samples between low and high, either independently or one
+    from each of n equal-width strata in random order
+    """
+    if not stratified:
+        return rng.uniform(low, high, n)
+    u = (rng.permutation(n) + rng.uniform(0., 1., n))/n
+    return low + u*(high - low)
+
 def generate_lrays(ds, center,
                 n_rays, max_impact_param,
                 min_impact_param=0.,
@@ -193,7 +216,9 @@ def generate_lrays(ds, center,
                 ion_list=['H I', 'C IV', 'O VI'],
                 fields=None,
                 ftype='gas',
-                out_dir='./'):
+                out_dir='./',
+                stratified=False,
+                seed=None):
     """
     Generate a sample of trident lightrays that randomly, uniformly cover
     impact parameter.
@@ -234,6 +259,13 @@ def generate_lrays(ds, center,
     out_dir : string
         path to where ray files will be written
 
+    stratified : bool
+        stratify the sampling of impact parameter and azimuthal angle (see
+        random_sightlines)
+
+    seed : int
+        seed for reproducible sightlines (see random_sightlines)
+
     """
 
     comm = MPI.COMM_WORLD
@@ -243,7 +275,9 @@ def generate_lrays(ds, center,
                                                  n_rays,
                                                  max_impact_param,
                                                  min_impact_param=min_impact_param,
-                                                 length=length)
+                                                 length=length,
+                                                 stratified=stratified,
+                                                 seed=seed)
         imp_param = ds.arr(imp_param, 'code_length').in_units('kpc')
         np.save(f"{out_dir}/impact_parameter.npy", imp_param)
 
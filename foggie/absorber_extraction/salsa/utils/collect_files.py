@@ -6,7 +6,10 @@
 #
 #
 from os import listdir
-import yt
+import os
+import json
+import hashlib
+import h5py
 from astropy.table import QTable, vstack
 from mpi4py import MPI
 import pandas as pd
@@ -128,16 +131,16 @@ def check_rays(ray_dir, n_rays, fields, parallel=True):
 
         # check if fields are in each ray
         for rfile in my_ray_files:
-            #load ray file
+            #read fields from the ray file
             try:
-                ray = yt.load(f"{ray_dir}/{rfile}")
-            except yt.utilities.exceptions.YTOutputNotIdentified:
+                ray_fields, n_cells = get_ray_info(f"{ray_dir}/{rfile}")
+            except OSError:
                 print(f"Couldn't load {rfile}. Reconstructing rays")
                 raise RuntimeError(f"Couldn't load {rfile}. Delete these rays so new ones can be constructed")
 
             # check each field is in ray
             for fld in fields:
-                if ('all', fld) in ray.field_list:
+                if fld in ray_fields:
                     pass
                 else:
                     raise RuntimeError(f"{fld} not present in {rfile}. Either delete these rays so new ones can be constructed or remove this field")
@@ -151,6 +154,154 @@ def check_rays(ray_dir, n_rays, fields, parallel=True):
         else:
             raise RuntimeError(f"found {len(ray_files)} rays instead of {n_rays}. Either delete rays or change number of rays to match")
 
+def get_ray_info(ray_file):
+    """
+    Reads which fields a trident light ray file holds and how many cells it
+    has straight from the hdf5 file, without loading it with yt.
+
+    Parameters
+    ----------
+    ray_file : str
+        Path to the hdf5 ray file
+
+    Returns
+    --------
+    fields : set of str
+        Names of the fields saved in the ray
+
+    n_cells : int
+        Number of cells along the ray
+    """
+    fields = set()
+    n_cells = 0
+    with h5py.File(ray_file, 'r') as f:
+        for group in f.values():
+            if not isinstance(group, h5py.Group):
+                continue
+            for name, dset in group.items():
+                if isinstance(dset, h5py.Dataset) and len(dset.shape) > 0:
+                    fields.add(name)
+                    n_cells = max(n_cells, dset.shape[0])
+    return fields, n_cells
+
+def extraction_key(method, fields, units_dict, cut_region_filters, extractor_kwargs):
+    """
+    Short hash of the parameters of an absorber extraction, so that catalog
+    shards made with different parameters are never mixed up.
+
+    Parameters
+    ----------
+    method : str
+        Absorber extraction method, 'spice' or 'spectacle'
+
+    fields : list of str
+        Fields added to the catalog
+
+    units_dict : dict
+        Units of the fields
+
+    cut_region_filters : list of str
+        Filters applied to the rays before extracting
+
+    extractor_kwargs : dict
+        Keyword arguments given to the AbsorberExtractor
+
+    Returns
+    --------
+    key : str
+        First 8 characters of the md5 hash of the parameters
+    """
+    params = [method, list(fields), units_dict, list(cut_region_filters), extractor_kwargs]
+    params = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.md5(params.encode()).hexdigest()[:8]
+
+def shard_filename(shard_dir, ray_file, ion, method, key):
+    """
+    Name of the catalog shard holding the absorbers of one ion in one ray,
+    extracted with the parameters whose extraction_key is key.
+    """
+    ray_name = os.path.splitext(os.path.basename(ray_file))[0]
+    return f"{shard_dir}/{ray_name}_{ion.replace(' ', '')}_{method}_{key}.pkl"
+
+def shard_done(shard_dir, ray_dir, ray_file, ion, method, key):
+    """
+    Check if the absorbers of an ion in a ray were already extracted with the
+    same parameters, i.e. if its catalog shard exists and is newer than the ray
+    file. Shards made with other parameters have another name and are ignored.
+    """
+    shard = shard_filename(shard_dir, ray_file, ion, method, key)
+    if not os.path.exists(shard):
+        return False
+    return os.path.getmtime(shard) >= os.path.getmtime(f"{ray_dir}/{ray_file}")
+
+def build_ray_manifest(ray_dir, ion_list, method, shard_dir, key, manifest_file=None):
+    """
+    Builds (or updates) a lightweight index of the ray files in a directory,
+    with the fields present and number of cells of each ray, and the status of
+    the absorber extraction of each ion. Rays already in the manifest are only
+    re-read if their file changed since, so the index is cheap to rebuild when
+    restarting. The manifest is saved as a csv file.
+
+    Parameters
+    ----------
+    ray_dir : str
+        The path to the directory where rays are held
+
+    ion_list : list of str
+        Ions whose extraction status is recorded
+
+    method : str
+        Absorber extraction method, 'spice' or 'spectacle'
+
+    shard_dir : str
+        The path to the directory holding the catalog shards of each ray
+
+    key : str
+        extraction_key of the extraction parameters, only shards made with
+        these parameters count as done
+
+    manifest_file : str, optional
+        Where to save the manifest. If None, saves it as ray_manifest.csv in
+        ray_dir.
+        Default: None
+
+    Returns
+    --------
+    manifest : pandas.DataFrame
+        One row per ray file with columns 'ray_file', 'mtime', 'n_cells',
+        'fields' (separated by ';') and 'status_<ion>' ('done' or 'pending')
+    """
+    if manifest_file is None:
+        manifest_file = f"{ray_dir}/ray_manifest.csv"
+
+    ray_files = sorted(collect_files(ray_dir, key_words=['ray']))
+    old_rows = {}
+    if os.path.exists(manifest_file):
+        old = pd.read_csv(manifest_file, keep_default_na=False)
+        for row in old.to_dict('records'):
+            old_rows[row['ray_file']] = row
+
+    rows = []
+    for rfile in ray_files:
+        mtime = os.path.getmtime(f"{ray_dir}/{rfile}")
+        if rfile in old_rows and old_rows[rfile]['mtime'] == mtime:
+            row = {k: old_rows[rfile][k] for k in ['ray_file', 'mtime', 'n_cells', 'fields']}
+        else:
+            ray_fields, n_cells = get_ray_info(f"{ray_dir}/{rfile}")
+            row = {'ray_file': rfile, 'mtime': mtime, 'n_cells': n_cells,
+                   'fields': ';'.join(sorted(ray_fields))}
+        for ion in ion_list:
+            if shard_done(shard_dir, ray_dir, rfile, ion, method, key):
+                row[f"status_{ion}"] = 'done'
+            else:
+                row[f"status_{ion}"] = 'pending'
+        rows.append(row)
+
+    manifest = pd.DataFrame(rows, columns=['ray_file', 'mtime', 'n_cells', 'fields'] +
+                                          [f"status_{ion}" for ion in ion_list])
+    manifest.to_csv(manifest_file, index=False)
+    return manifest
+
 def combine_astropy_files(directory, kw='ice', outfile=None):
 
     #get files
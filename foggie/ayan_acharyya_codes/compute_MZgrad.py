@@ -192,22 +192,22 @@ def get_df_from_ds(ds, args):
     Path(args.output_dir + 'txtfiles/').mkdir(parents=True, exist_ok=True)  # creating the directory structure, if doesn't exist already
     outfilename = get_correct_tablename(args)
 
-    if not os.path.exists(outfilename) or args.clobber:
+    fields = ['rad', 'metal'] # only the relevant properties
+    if args.weight is not None: fields += [args.weight]
+
+    if not df_file_exists(outfilename) or args.clobber:
         myprint(outfilename + ' does not exist. Creating afresh..', args)
 
         df = pd.DataFrame()
-        fields = ['rad', 'metal'] # only the relevant properties
-        if args.weight is not None: fields += [args.weight]
 
         for index, field in enumerate(fields):
             myprint('Doing property: ' + field + ', which is ' + str(index + 1) + ' of the ' + str(len(fields)) + ' fields..', args)
             df[field] = ds[field_dict[field]].in_units(unit_dict[field]).ndarray_view()
 
-        df.to_csv(outfilename, sep='\t', index=None)
+        write_columnar_df(df, outfilename)
     else:
         myprint('Reading from existing file ' + outfilename, args)
-        df = pd.read_table(outfilename, delim_whitespace=True, comment='#')
-        df = df[df['rad'].between(0, args.galrad)] # in case this dataframe has been read in from a file corresponding to a larger chunk of the box
+        df = read_df_file(outfilename, args, columns=fields, rad_max=args.galrad) # in case this dataframe has been read in from a file corresponding to a larger chunk of the box
 
     df['log_metal'] = np.log10(df['metal'])
     df['rad_re'] = df['rad'] / args.re  # normalise by Re
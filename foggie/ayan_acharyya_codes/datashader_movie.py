@@ -55,7 +55,7 @@ def get_correct_tablename(args):
     if args.quick: outfileroot = args.output_dir + 'txtfiles/' + args.output + '_df_boxrad_*kpc_%s_vs_%s_colby_%s%s.txt' % (args.ycol, args.xcol, args.colorcol, inflow_outflow_text)
     else: outfileroot = args.output_dir + 'txtfiles/' + args.output + '_df_boxrad_*kpc.txt'
 
-    outfile_list = glob.glob(outfileroot)
+    outfile_list = glob.glob(outfileroot) + glob.glob(get_columnar_dirname(outfileroot)) # either txt files or their binary columnar versions
     if len(outfile_list) == 0:
         correct_rad_to_grab = args.galrad
     else:
@@ -102,16 +102,16 @@ def extract_columns_from_df(df_allprop, args):
 def get_df_from_ds(ds, args):
     '''
     Function to make a pandas dataframe from the yt dataset based on the given field list and color category,
-    then writes dataframe to file for faster access in future
+    then writes dataframe to file (one binary .npy file per column, see util.write_columnar_df()) for faster access in future
     This function is somewhat based on foggie.utils.prep_dataframe.prep_dataframe()
     :return: dataframe
     '''
-    # -------------read/write pandas df file with ALL fields-------------------
+    # -------------read/write binary columnar df file with ALL fields-------------------
     Path(args.output_dir + 'txtfiles/').mkdir(parents=True, exist_ok=True)  # creating the directory structure, if doesn't exist already
     outfilename = get_correct_tablename(args)
 
-    if not os.path.exists(outfilename) or args.clobber:
-        if not os.path.exists(outfilename):
+    if not df_file_exists(outfilename) or args.clobber:
+        if not df_file_exists(outfilename):
             myprint(outfilename + ' does not exist. Creating afresh..', args)
         elif args.clobber:
             myprint(outfilename + ' exists but over-writing..', args)
@@ -128,13 +128,12 @@ def get_df_from_ds(ds, args):
             elif 'theta' in field and 'disk' in field: df_allprop[field] = np.degrees(ds[field_dict[field]].v) # to convert from radian to degrees
             else: df_allprop[field] = ds[field_dict[field]].in_units(unit_dict[field]).ndarray_view()
 
-        df_allprop.to_csv(outfilename, sep='\t', index=None)
+        write_columnar_df(df_allprop, outfilename)
     else:
         myprint('Reading from existing file ' + outfilename, args)
-        df_allprop = pd.read_table(outfilename, delim_whitespace=True, comment='#')
-        try:
-            df_allprop = df_allprop[df_allprop['rad'].between(0, args.galrad)] # curtailing in radius space, in case this dataframe has been read in from a file corresponding to a larger chunk of the box
-        except KeyError: # for files produced previously and therefore may not have a 'rad' column
+        columns_needed = ['rad', 'vrad', args.xcol, args.ycol, args.colorcol] + ([args.weight] if args.weight else []) # only the columns used by extract_columns_from_df()
+        df_allprop = read_df_file(outfilename, args, columns=columns_needed, rad_max=args.galrad) # curtailing in radius space, in case this dataframe has been read in from a file corresponding to a larger chunk of the box
+        if 'rad' not in df_allprop: # for files produced previously and therefore may not have a 'rad' column
             rad_picked_up = float(get_text_between_strings(outfilename, 'boxrad_', 'kpc'))
             if rad_picked_up == args.galrad: pass # if this file actually corresponds to the correct radius, then you're fine (even if the file itself doesn't have radius column)
             else: sys.exit('Please regenerate ' + outfilename + ', using the --clobber option') # otherwise throw error
@@ -31,7 +31,7 @@ def get_correct_tablename(args):
     '''
     outfileroot = args.output_dir + 'txtfiles/' + args.output + '_df_boxrad_*kpc_%s_vs_%s_colby_%s%s.txt' % (args.ycol, args.xcol, args.colorcol, inflow_outflow_text)
 
-    outfile_list = glob.glob(outfileroot)
+    outfile_list = glob.glob(outfileroot) + glob.glob(get_columnar_dirname(outfileroot)) # either txt files or their binary columnar versions
     if len(outfile_list) == 0:
         correct_rad_to_grab = args.galrad
     else:
@@ -57,11 +57,12 @@ def get_df_from_ds(ds, args):
     Path(args.output_dir + 'txtfiles/').mkdir(parents=True, exist_ok=True)  # creating the directory structure, if doesn't exist already
     outfilename = get_correct_tablename(args)
 
-    if not os.path.exists(outfilename) or args.clobber:
+    all_fields = [args.xcol, args.ycol, args.colorcol]
+    if 'rad' not in all_fields: all_fields = ['rad'] + all_fields
+
+    if not df_file_exists(outfilename) or args.clobber:
         myprint('Creating file ' + outfilename + '..', args)
         df = pd.DataFrame()
-        all_fields = [args.xcol, args.ycol, args.colorcol]
-        if 'rad' not in all_fields: all_fields = ['rad'] + all_fields
 
         for index,field in enumerate(all_fields):
             myprint('Doing property: ' + field + ', which is ' + str(index + 1) + ' of the ' + str(len(all_fields)) + ' fields..', args)
@@ -70,13 +71,11 @@ def get_df_from_ds(ds, args):
             else: arr = ds[field_dict[field]].in_units(unit_dict[field]).ndarray_view()
             df[field] = arr
 
-        df.to_csv(outfilename, sep='\t', index=None)
+        write_columnar_df(df, outfilename)
     else:
         myprint('Reading from existing file ' + outfilename, args)
-        df = pd.read_table(outfilename, delim_whitespace=True, comment='#')
-        try:
-            df = df[df['rad'].between(0, args.galrad)] # curtailing in radius space, in case this dataframe has been read in from a file corresponding to a larger chunk of the box
-        except KeyError: # for files produced previously and therefore may not have a 'rad' column
+        df = read_df_file(outfilename, args, columns=all_fields, rad_max=args.galrad) # curtailing in radius space, in case this dataframe has been read in from a file corresponding to a larger chunk of the box
+        if 'rad' not in df: # for files produced previously and therefore may not have a 'rad' column
             rad_picked_up = float(get_text_between_strings(outfilename, 'boxrad_', 'kpc'))
             if rad_picked_up == args.galrad: pass # if this file actually corresponds to the correct radius, then you're fine (even if the file itself doesn't have radius column)
             else: sys.exit('Please regenerate ' + outfilename + ', using the --clobber option') # otherwise throw error
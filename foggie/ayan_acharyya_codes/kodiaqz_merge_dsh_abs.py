@@ -173,7 +173,7 @@ if __name__ == '__main__':
         thisboxrad = z_boxrad_dict[output] if args.fullbox else args.galrad
         file = output_dir.replace(args.halo, halo) + 'txtfiles/' + output + '_df_boxrad_%.2Fkpc.txt' % (thisboxrad)
 
-        df = pd.read_table(file, delim_whitespace=True, comment='#')
+        df = read_df_file(file, args)
         df = extract_columns_from_df(df, args)
         df_merged = df_merged.append(df)
 
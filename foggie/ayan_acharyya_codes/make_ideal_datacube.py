@@ -15,6 +15,7 @@ from util import *
 from compute_hiir_radii import *
 from filter_star_properties import get_star_properties
 import make_mappings_grid as mmg
+from scipy import sparse
 
 # -------------------------------------------------------------------------------------------------
 def get_erf(lambda_array, height, centre, width, delta_lambda):
@@ -40,6 +41,51 @@ def gauss(wave_arr, flux_arr, this_wave_cen, this_flux, vel_disp, vel_z):
     flux_arr = flux_arr + gaussian
     return flux_arr
 
+# -------------------------------------------------------------------------------------------------
+def get_rebin_matrix(bin_index, nbins):
+    '''
+    Function to compute a sparse matrix that rebins spectra sampled on the base wavelength array on to nbins spectral bins,
+    such that spectrum @ rebin_matrix is the mean of the spectrum within each bin, i.e. same as [spectrum[bin_index == ii].mean() for ii in range(1, nbins + 1)]
+    :return: sparse matrix of shape (len(bin_index), nbins), and boolean array of bins that have no base wavelength in them (whose mean is undefined)
+    '''
+    in_range = (bin_index >= 1) & (bin_index <= nbins)
+    rows = np.where(in_range)[0]
+    cols = bin_index[in_range] - 1
+    counts = np.bincount(cols, minlength=nbins)
+    rebin_matrix = sparse.csr_matrix((1. / counts[cols], (rows, cols)), shape=(len(bin_index), nbins))
+
+    return rebin_matrix, counts == 0
+
+# -------------------------------------------------------------------------------------------------
+def get_block_spectra(block, cont_table, wave_arr, linelist, vel_disp, vel_col, rebin_matrix, empty_bins):
+    '''
+    Function to compute the spectra (stellar continuum + emission lines) of a block of HII regions all at once, as 2D arrays, i.e. the batched version of gauss()
+    :param cont_table: 2D array of the SB99 continuum for every (rounded) stellar age, evaluated on wave_arr
+    :return: 2D array of spectra rebinned by rebin_matrix, with one row per HII region in block; ergs/s/A
+    '''
+    age_rounded = np.round(block['age'].values).astype(int)
+    flux = cont_table[age_rounded] * (block['mass'].values / sb99_mass)[:, np.newaxis]  # to scale the continuum by HII region mass, as the ones produced by SB99 was for sb99_mass; ergs/s/A
+
+    for line_index, thisline in linelist.iterrows():
+        this_wave_cen = thisline['wave_vacuum'] * (1 + block[vel_col].values / c)  # shift central wavelength wrt w0 due to LoS velocity of HII region as compared to systemic velocity
+        sigma = this_wave_cen * vel_disp / c # converting velocity dispersion (km/s) to sigma (Angstrom)
+        amplitude = block[thisline['label']].values / np.sqrt(2 * np.pi * sigma ** 2)  # height of Gaussian, such that area = line flux
+        right_index = np.clip(np.searchsorted(wave_arr, this_wave_cen, side='left'), 1, len(wave_arr) - 1) # first wavelength >= central wavelength, as in gauss()
+        delta_wave = wave_arr[right_index] - wave_arr[right_index - 1]
+        flux += get_erf(wave_arr[np.newaxis, :], amplitude[:, np.newaxis], this_wave_cen[:, np.newaxis], sigma[:, np.newaxis], delta_wave[:, np.newaxis]) # adding every line flux on top of continuum; ergs/s/A
+
+    flux = rebin_matrix.T.dot(flux.T).T  # spectral smearing i.e. rebinning of spectrum; mean is used to conserve flux, as f is in units of ergs/s/A
+    flux[:, empty_bins] = np.nan
+
+    return flux
+
+# -------------------------------------------------------------------------------------------------
+def get_block_spectra_wrapper(arguments):
+    '''
+    Wrapper for get_block_spectra(), with all arguments in one tuple, so that it can be mapped over worker processes
+    '''
+    return get_block_spectra(*arguments)
+
 # -----------------------------------------------------------------------
 def shift_ref_frame(paramlist, args):
     '''
@@ -173,30 +219,35 @@ def get_ideal_datacube(args, linelist):
         myprint('Reading from already existing file ' + args.idealcube_filename + ', use --args.clobber to overwrite', args)
     else:
         myprint('Ideal cube file does not exist. Creating now..', args)
-        cont_interp_func_arr = get_SB99continuum()
+        cont_table = np.array([cont_interp_func(ifu.base_wave_arr) for cont_interp_func in get_SB99continuum()]) # continuum vs wavelength for every stellar age, evaluated only once
         ifu.counts = np.zeros((np.shape(ifu.data)[0], np.shape(ifu.data)[1])) # to keep a tab on how many HII regions contributed to a certain pixel
-
-        # -------iterating over each HII region now, to compute LoS spectra (stellar continuum + nebular emission) for each-------------
-        for index, HIIregion in paramlist.iterrows():
-            age_rounded = int(round(HIIregion['age']))
-            flux = np.multiply(cont_interp_func_arr[age_rounded](ifu.base_wave_arr), (HIIregion['mass'] / sb99_mass))  # to scale the continuum by HII region mass, as the ones produced by SB99 was for sb99_mass; ergs/s/A
-
-            for line_index, thisline in ifu.linelist.iterrows():
-                try:
-                    flux = gauss(ifu.base_wave_arr, flux, thisline['wave_vacuum'], HIIregion[thisline['label']], args.vel_disp, HIIregion['vel_' + projection_dict[args.projection][2] + '_inc'])  # adding every line flux on top of continuum; gaussians are in ergs/s/A
-                except KeyError:
-                    ifu.linelist = ifu.linelist.drop(line_index)  # discarding label from linelist if it is not present in HIIRegion dataframe
-                    pass
-            ifu.linelist = ifu.linelist.reset_index(drop=True)
-
-            flux = np.array([flux[ifu.bin_index == ii].mean() for ii in range(1, len(ifu.dispersion_arr) + 1)])  # spectral smearing i.e. rebinning of spectrum                                                                                                                             #mean() is used here to conserve flux; as f is in units of ergs/s/A, we want integral of f*dlambda to be preserved (same before and after resampling)
-            # this can be checked as np.sum(f[1:]*np.diff(wavelength_array))
-            x_cell = int(HIIregion['pos_' + projection_dict[args.projection][0] + '_grid'])
-            y_cell = int(HIIregion['pos_' + projection_dict[args.projection][1] + '_grid'])
-            ifu.data[x_cell][y_cell][:] += flux  # flux is ergs/s/A
-            ifu.counts[x_cell][y_cell] += 1
-            myprint('Particle ' + str(index + 1) + ' of ' + str(len(paramlist)) + '..', args)
-            if args.debug: myprint('with bolometric flux = ' + '%.2E'%(np.sum(flux)) + ' ers/s/A, ' + ' is assigned to cell ' + str(x_cell) + ',' + str(y_cell) + ' which now has total ' + '%d'%(ifu.counts[x_cell][y_cell]) + ' star particles and total flux ' + '%.2E'%(np.sum(ifu.data[x_cell, y_cell, :])) + ' ers/s/A', args)
+        ifu.linelist = ifu.linelist[ifu.linelist['label'].isin(paramlist.columns)].reset_index(drop=True)  # discarding labels from linelist if it is not present in HIIRegion dataframe
+        rebin_matrix, empty_bins = get_rebin_matrix(ifu.bin_index, len(ifu.dispersion_arr))
+
+        vel_col = 'vel_' + projection_dict[args.projection][2] + '_inc'
+        x_cell = paramlist['pos_' + projection_dict[args.projection][0] + '_grid'].values.astype(int)
+        y_cell = paramlist['pos_' + projection_dict[args.projection][1] + '_grid'].values.astype(int)
+        np.add.at(ifu.counts, (x_cell, y_cell), 1)
+
+        # -------computing LoS spectra (stellar continuum + nebular emission) for blocks of HII regions at a time, optionally over several processes-------------
+        columns_needed = ['age', 'mass', vel_col] + list(ifu.linelist['label'])
+        block_starts = range(0, len(paramlist), args.hii_block_size)
+        block_args = ((paramlist[columns_needed].iloc[start : start + args.hii_block_size], cont_table, ifu.base_wave_arr, ifu.linelist, args.vel_disp, vel_col, rebin_matrix, empty_bins) for start in block_starts)
+        if args.ncpus > 1:
+            pool = mproc.Pool(args.ncpus)
+            block_fluxes = pool.imap(get_block_spectra_wrapper, block_args)
+        else:
+            block_fluxes = map(get_block_spectra_wrapper, block_args)
+
+        for start, flux in zip(block_starts, block_fluxes):
+            end = start + len(flux)
+            np.add.at(ifu.data, (x_cell[start:end], y_cell[start:end]), flux)  # flux is ergs/s/A
+            myprint('Particles ' + str(start + 1) + ' to ' + str(end) + ' of ' + str(len(paramlist)) + '..', args)
+            if args.debug: myprint('with total bolometric flux = ' + '%.2E'%(np.nansum(flux)) + ' ers/s/A, assigned to ' + str(len(np.unique(np.vstack([x_cell[start:end], y_cell[start:end]]), axis=1)[0])) + ' cells', args)
+
+        if args.ncpus > 1:
+            pool.close()
+            pool.join()
 
         ifu.data = ifu.data / (4 * np.pi * (ifu.distance * Mpc_to_cm)**2) # converting from ergs/s/A to ergs/s/cm^2/A
         write_fitsobj(args.idealcube_filename, ifu, instrument, args, for_qfits=True) # writing into FITS file
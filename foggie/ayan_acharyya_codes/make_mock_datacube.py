@@ -12,44 +12,92 @@
 """
 from header import *
 from util import *
-from make_ideal_datacube import get_ideal_datacube
+from make_ideal_datacube import get_ideal_datacube, get_rebin_matrix
+import scipy.fft
+
+# ---------------------------------------------------------------------
+def convolve_cube(cube, kernel):
+    '''
+    Function to convolve every wavelength slice of a 3D (x, y, wavelength) cube with a given 2D kernel all at once, via FFTs along the two spatial axes
+    This does the same as con.convolve_fft(slice, kernel, normalize_kernel=True) with its default boundary (fill with zeroes) and NaN treatment (interpolate),
+    i.e. pixels beyond the edge count as zeroes, while NaN pixels are ignored and the convolved value is normalised by the kernel weight of the non-NaN pixels
+    :return: 3D array
+    '''
+    kernel = np.array(getattr(kernel, 'array', kernel), dtype=float) # works for astropy kernel objects as well as plain arrays
+    kernel = kernel / np.sum(kernel)
+    (xlen, ylen), (kxlen, kylen) = np.shape(cube)[:2], np.shape(kernel)
+    fft_shape = [scipy.fft.next_fast_len(xlen + kxlen - 1), scipy.fft.next_fast_len(ylen + kylen - 1)] # zero-padded, so that the convolution does not wrap around
+    crop = (slice(kxlen // 2, kxlen // 2 + xlen), slice(kylen // 2, kylen // 2 + ylen))
+
+    invalid = ~np.isfinite(cube)
+    kernel_fft = scipy.fft.rfftn(kernel, s=fft_shape)[:, :, np.newaxis]
+    convolved = scipy.fft.irfftn(scipy.fft.rfftn(np.where(invalid, 0., cube), s=fft_shape, axes=(0, 1)) * kernel_fft, s=fft_shape, axes=(0, 1))[crop]
+    weight = 1. - scipy.fft.irfftn(scipy.fft.rfftn(invalid.astype(float), s=fft_shape, axes=(0, 1)) * kernel_fft, s=fft_shape, axes=(0, 1))[crop] # only NaN pixels have weight 0, the padding beyond the edge has weight 1
+    weight[np.abs(weight) < 1e-8] = np.nan # no valid pixel within the kernel
+
+    return convolved / weight
+
+# ---------------------------------------------------------------------
+def check_convolve_cube(cube, kernel, args, nslices=1):
+    '''
+    Function to check convolve_cube() against con.convolve_fft() on the first nslices wavelength slices of a given cube, separately for the pixels along the edges and everywhere else
+    :return: maximum fractional difference at the edges and in the interior
+    '''
+    convolved = convolve_cube(cube[:, :, :nslices], kernel)
+    expected = np.dstack([con.convolve_fft(cube[:, :, index], kernel, normalize_kernel=True) for index in range(nslices)])
+
+    edge = np.zeros(np.shape(cube)[:2], dtype=bool)
+    edge_width = np.shape(getattr(kernel, 'array', kernel))[0] // 2 + 1 # pixels that are within the kernel half-width of an edge
+    edge[:edge_width, :], edge[-edge_width:, :], edge[:, :edge_width], edge[:, -edge_width:] = True, True, True, True
+
+    frac_diff = np.abs(convolved - expected) / np.nanmax(np.abs(expected))
+    max_edge_diff, max_interior_diff = np.nanmax(frac_diff[edge]), np.nanmax(frac_diff[~edge])
+    myprint('Checked convolve_cube against convolve_fft: maximum fractional difference %.2E at the edges, %.2E in the interior' % (max_edge_diff, max_interior_diff), args)
+    if max(max_edge_diff, max_interior_diff) > 1e-6: print('Warning: convolve_cube does not agree with convolve_fft')
+
+    return max_edge_diff, max_interior_diff
 
 # ---------------------------------------------------------------------
 def spatial_convolve(ideal_ifu, mock_ifu, args):
     '''
-    Function to spatially (rebin and) convolve ideal data cube, with a given PSF, wavelength slice by wavelength slice
+    Function to spatially (rebin and) convolve ideal data cube, with a given PSF, in slabs of args.cube_slab_size wavelength slices at a time
     :return: mockcube object: mock_ifu
     '''
     start_time = time.time()
 
     wlen = np.shape(ideal_ifu.data)[2] # length of dispersion axis
     mock_ifu.data = np.zeros((mock_ifu.box_size_in_pix, mock_ifu.box_size_in_pix, wlen))  # initialise datacube with zeroes
-
-    for slice in range(wlen):
-        myprint('Rebinning & convolving slice ' + str(slice + 1) + ' of ' + str(wlen) + '..', args)
-        rebinned_slice = rebin(ideal_ifu.data[:, :, slice], (mock_ifu.box_size_in_pix, mock_ifu.box_size_in_pix))  # rebinning before convolving
-        mock_ifu.data[:, :, slice] = con.convolve_fft(rebinned_slice, mock_ifu.kernel, normalize_kernel=True)  # convolving with kernel
-
-    myprint('Completed spatial convolution in %s minutes' % ((time.time() - start_time) / 60), args)
+    rebin_time, convolve_time = 0., 0.
+
+    for start in range(0, wlen, args.cube_slab_size):
+        end = min(start + args.cube_slab_size, wlen)
+        myprint('Rebinning & convolving slices ' + str(start + 1) + ' to ' + str(end) + ' of ' + str(wlen) + '..', args)
+        stage_start = time.time()
+        rebinned_slab = rebin_cube(ideal_ifu.data[:, :, start : end], (mock_ifu.box_size_in_pix, mock_ifu.box_size_in_pix))  # rebinning before convolving
+        rebin_time += time.time() - stage_start
+        if args.debug and start == 0: check_convolve_cube(rebinned_slab, mock_ifu.kernel, args) # compare the first slice with astropy's convolve_fft
+        stage_start = time.time()
+        mock_ifu.data[:, :, start : end] = convolve_cube(rebinned_slab, mock_ifu.kernel)  # convolving with kernel
+        convolve_time += time.time() - stage_start
+
+    myprint('Completed spatial convolution in %s minutes (rebinning %.2F s, convolving %.2F s)' % ((time.time() - start_time) / 60, rebin_time, convolve_time), args)
     return mock_ifu
 
 # ---------------------------------------------------------------------
 def spectral_bin(mock_ifu, args):
     '''
-    Function to spectrally rebin given data cube, with a given spectral resolution, pixel by pixel
+    Function to spectrally rebin given data cube, with a given spectral resolution, for all pixels at once via a sparse rebinning matrix
     :return: mockcube object: mock_ifu
     '''
     start_time = time.time()
 
     smoothed_data = mock_ifu.data # smoothed_data is only spatially smoothed but as yet spectrally unbinned
-    xlen, ylen = np.shape(smoothed_data)[0], np.shape(smoothed_data)[1]
-    mock_ifu.data = np.zeros((mock_ifu.box_size_in_pix, mock_ifu.box_size_in_pix, mock_ifu.ndisp))  # initialise datacube with zeroes
+    xlen, ylen, wlen = np.shape(smoothed_data)
+    rebin_matrix, empty_bins = get_rebin_matrix(mock_ifu.bin_index, len(mock_ifu.dispersion_arr))
 
-    for index in range(xlen*ylen):
-        i, j = int(index / ylen), int(index % ylen) # cell position
-        myprint('Spectral rebinning pixel (' + str(i) + ',' + str(j) + '), i.e. ' + str(index + 1) + ' out of ' + str(xlen * ylen) + '..', args)
-        unbinned_spectra = smoothed_data[i, j, :]
-        mock_ifu.data[i, j, :] = np.array([unbinned_spectra[mock_ifu.bin_index == ii].mean() for ii in range(1, len(mock_ifu.dispersion_arr) + 1)])  # spectral smearing i.e. rebinning of spectrum                                                                                                                             #mean() is used here to conserve flux; as f is in units of ergs/s/A, we want integral of f*dlambda to be preserved (same before and after resampling)
+    binned_data = rebin_matrix.T.dot(smoothed_data.reshape(xlen * ylen, wlen).T).T  # spectral smearing i.e. rebinning of spectrum; mean is used to conserve flux, as f is in units of ergs/s/A
+    binned_data[:, empty_bins] = np.nan
+    mock_ifu.data = binned_data.reshape(xlen, ylen, len(mock_ifu.dispersion_arr))
 
     myprint('Completed spectral binning in %s minutes' % ((time.time() - start_time) / 60), args)
     return mock_ifu
@@ -57,38 +105,25 @@ def spectral_bin(mock_ifu, args):
 # ---------------------------------------------------------------------
 def add_noise(mock_ifu, instrument, args):
     '''
-    Function to add noise to a data cube, with a given target SNR, voxel by voxel (i.e. the noise is spatially and spectrally variable)
+    Function to add noise to a data cube, with a given target SNR, voxel by voxel (i.e. the noise is spatially and spectrally variable), for all voxels at once
     :return: mockcube object: mock_ifu
     '''
     start_time = time.time()
 
     clean_data = mock_ifu.data # clean_data has no noise, in flux density units
-    (xlen, ylen, zlen) = np.shape(clean_data)
-    mock_ifu.data = np.zeros(np.shape(clean_data))  # initialise datacube with zeroes
-    mock_ifu.error = np.zeros(np.shape(clean_data))  # initialise datacube with zeroes
-
-    for index in range(xlen * ylen * zlen):
-        i, j, k = int(index / (ylen * zlen)), int((index / zlen) % ylen), int(index % zlen) # cell position
-        myprint('Adding noise to voxel (' + str(i) + ',' + str(j) + ',' + str(k) + '), i.e. ' + str(index + 1) + ' out of ' + str(xlen * ylen * zlen) + '..', args)
-        flux = clean_data[i, j, k]
-        wavelength = mock_ifu.dispersion_arr[k]
-        delta_lambda = mock_ifu.delta_lambda[k]
-
-        if args.debug: myprint('Deb225: flux = ' + str(flux) + ' ergs/s/cm^2/A; wavelength = ' + str(wavelength) + ' A; delta lambda = ' + str(delta_lambda) + ' A', args)
-        # compute conversion factor from flux density units to photon count (will be used to add noise), based on telescope properties
-        flux_density_to_counts = np.pi * (instrument.radius * 1e2)**2 * mock_ifu.exptime * instrument.el_per_phot * delta_lambda / (planck * (c * 1e3) / (wavelength * 1e-10))  # to bring ergs/s/A/pixel to units of counts/pixel (ADUs)
-
-        flux = flux * flux_density_to_counts  # converting flux density units to counts (photons)
-
-        if args.debug: myprint('Deb231: flux = ' + str(flux) + ' electrons/pix; using factor = ' + str(flux_density_to_counts) + ' A.s.cm^2/ergs', args)
+    wavelength = mock_ifu.dispersion_arr[np.newaxis, np.newaxis, :]
+    delta_lambda = mock_ifu.delta_lambda[np.newaxis, np.newaxis, :]
 
-        absolute_noise, random_noise = get_noise_in_voxel(flux, wavelength, mock_ifu.snr, args)
-        noisyflux = flux + random_noise # adding noise to the flux, in counts unit
+    # compute conversion factor from flux density units to photon count (will be used to add noise), based on telescope properties
+    flux_density_to_counts = np.pi * (instrument.radius * 1e2)**2 * mock_ifu.exptime * instrument.el_per_phot * delta_lambda / (planck * (c * 1e3) / (wavelength * 1e-10))  # to bring ergs/s/A/pixel to units of counts/pixel (ADUs)
+    flux = clean_data * flux_density_to_counts  # converting flux density units to counts (photons)
+    if args.debug: myprint('Deb231: total flux = ' + str(np.nansum(flux)) + ' electrons', args)
 
-        mock_ifu.data[i, j, k] = noisyflux / flux_density_to_counts # converting counts to flux density units
-        mock_ifu.error[i, j, k] = absolute_noise / flux_density_to_counts # converting counts to flux density units; such that noisy flux spaxel = pure signal + random draw off error spaxel value
+    absolute_noise, random_noise = get_noise_in_voxel(flux, wavelength, mock_ifu.snr, args)
+    noisyflux = flux + random_noise # adding noise to the flux, in counts unit
 
-        if args.debug: myprint('Deb236: noisy flux = ' + str(noisyflux) + ' electrons/pix = ' + str(mock_ifu.data[i, j, k]) + ' ergs/s/cm^2/A', args)
+    mock_ifu.data = noisyflux / flux_density_to_counts # converting counts to flux density units
+    mock_ifu.error = absolute_noise / flux_density_to_counts # converting counts to flux density units; such that noisy flux spaxel = pure signal + random draw off error spaxel value
 
     myprint('Completed adding noise in %s minutes' % ((time.time() - start_time) / 60), args)
     return mock_ifu
@@ -96,13 +131,17 @@ def add_noise(mock_ifu, instrument, args):
 # ---------------------------------------------------------------------
 def get_noise_in_voxel(data, wavelength, target_SNR, args):
     '''
-    Function to compute the noise to add to a single voxel, given the data (flux) in photon counts, wavelength and target SNR
+    Function to compute the noise to add to a single voxel or an array of voxels, given the data (flux) in photon counts, wavelength and target SNR
+    Voxels with undefined (NaN) flux get NaN noise
     :return: initial data + randomly generated noise
     '''
     absolute_noise = data / target_SNR
-    random_noise = np.random.poisson(lam=absolute_noise ** 2, size=np.shape(data)) - absolute_noise ** 2
+    random_noise = np.full(np.shape(data), np.nan)
+    finite = np.isfinite(absolute_noise)
+    random_noise[finite] = np.random.poisson(lam=np.asarray(absolute_noise)[finite] ** 2) - np.asarray(absolute_noise)[finite] ** 2
+    if np.ndim(data) == 0: random_noise = float(random_noise)
 
-    if args.debug: myprint('Deb250: data = ' + str(data) + ' electrons; absolute_noise = ' + str(absolute_noise) + '; random noise = ' + str(random_noise) + ' electrons', args)
+    if args.debug: myprint('Deb250: total data = ' + str(np.nansum(data)) + ' electrons; total absolute_noise = ' + str(np.nansum(absolute_noise)) + '; total random noise = ' + str(np.nansum(random_noise)) + ' electrons', args)
 
     return absolute_noise, random_noise
 # -----------------------------------------------------------------------
@@ -110,8 +110,8 @@ if __name__ == '__main__':
             thisboxrad = z_boxrad_dict[output] if args.fullbox else args.galrad
             file = output_dir.replace(args.halo, halo) + 'txtfiles/' + output + '_df_boxrad_%.2Fkpc.txt' % (thisboxrad)
 
-            if os.path.exists(file):
-                df = pd.read_table(file, delim_whitespace=True, comment='#')
+            if df_file_exists(file):
+                df = read_df_file(file, args)
             else:
                 myprint('Cannot find ' + file + '; skipping halo ' + halo + ' snapshot ' + output + '..' , args)
                 continue
@@ -497,6 +497,44 @@ def rebin(array, dimensions=None, scale=None):
     if array.sum() > 0: assert (array.sum() < result.sum() * (1 + allowError)) & (array.sum() > result.sum() * (1 - allowError))
     return result
 
+# --------------------------------------------------------------------------
+def get_rebin_weights(old_len, new_len):
+    '''
+    Function to compute the weights with which rebin() distributes each old pixel along one axis among the new pixels
+    Since rebin() treats the two axes independently, rebin(array, (m, n)) = W0 @ array @ W1.T, where W0 = get_rebin_weights(array.shape[0], m) and W1 = get_rebin_weights(array.shape[1], n)
+    :return: 2D array of shape (new_len, old_len)
+    '''
+    weights = np.zeros((new_len, old_len))
+    for j in range(old_len):
+        J, dj = divmod(j * new_len, old_len)
+        J1, dj1 = divmod(j + 1, old_len / float(new_len))
+        if (J1 - J == 0) | ((J1 - J == 1) & (dj1 == 0)): dy = 1
+        else: dy = 1 - dj1
+        J_ = np.min([new_len - 1, J + 1]) # prevent it from allocating outside the array
+        weights[J, j] += dy
+        weights[J_, j] += 1 - dy
+
+    return weights
+
+# --------------------------------------------------------------------------
+def rebin_cube(cube, dimensions, slab_size=None):
+    '''
+    Function to spatially rebin every wavelength slice of a 3D (x, y, wavelength) cube to the new (x, y) dimensions all at once, conserving flux
+    in the same way as rebin() does slice by slice; optionally in slabs of slab_size wavelength slices at a time to limit memory usage
+    :return: 3D array
+    '''
+    if np.shape(cube)[:2] == tuple(dimensions): return cube  # no rebinning actually needed
+    weights_x = get_rebin_weights(np.shape(cube)[0], dimensions[0])
+    weights_y = get_rebin_weights(np.shape(cube)[1], dimensions[1])
+    if slab_size is None: slab_size = np.shape(cube)[2]
+
+    result = np.zeros((dimensions[0], dimensions[1], np.shape(cube)[2]))
+    for start in range(0, np.shape(cube)[2], slab_size):
+        slab = np.tensordot(weights_x, cube[:, :, start : start + slab_size], axes=(1, 0)) # rebinning along x
+        result[:, :, start : start + slab_size] = np.einsum('Jj,ijk->iJk', weights_y, slab) # rebinning along y
+
+    return result
+
 # --------------------------------------------------------------------------
 def get_KD02_metallicity(photgrid):
     '''
@@ -579,6 +617,66 @@ def get_measured_cube_filename(parentfile):
     '''
     return os.path.split(parentfile)[0] + '/measured_cube_' + os.path.split(parentfile)[1]
 
+# -------------------------------------------------------------------------------------------------
+def get_columnar_dirname(filename):
+    '''
+    Function to derive the name of the directory holding the binary columnar version of a given dataframe txt file
+    '''
+    return os.path.splitext(filename)[0] + '_columns/'
+
+# -------------------------------------------------------------------------------------------------
+def df_file_exists(filename):
+    '''
+    Function to check whether a given dataframe exists on disk, either as the binary columnar version or as the txt file
+    '''
+    return os.path.exists(get_columnar_dirname(filename) + 'columns.txt') or os.path.exists(filename)
+
+# -------------------------------------------------------------------------------------------------
+def write_columnar_df(df, filename, sort_by='rad'):
+    '''
+    Function to write a dataframe to disk as one binary .npy file per column, in the directory corresponding to the given txt filename
+    The rows are sorted by the column sort_by (if present), so that a radial cut can later be read as a contiguous chunk of every column
+    '''
+    dirname = get_columnar_dirname(filename)
+    if os.path.exists(dirname): shutil.rmtree(dirname)
+    Path(dirname).mkdir(parents=True, exist_ok=True)  # creating the directory structure, if doesn't exist already
+
+    if sort_by in df: df = df.sort_values(sort_by, kind='stable')
+    for column in df.columns: np.save(dirname + column + '.npy', np.ascontiguousarray(df[column].values))
+    with open(dirname + 'columns.txt', 'w') as f: f.write('\n'.join(df.columns) + '\n') # written last, so an incomplete directory is never read
+
+# -------------------------------------------------------------------------------------------------
+def read_columnar_df(filename, columns=None, rad_max=None):
+    '''
+    Function to read a dataframe written by write_columnar_df(), memory-mapping each column and reading in only the requested columns
+    (default all) and only the rows with 'rad' <= rad_max (if rad_max is given and the dataframe has a 'rad' column)
+    :return: dataframe
+    '''
+    dirname = get_columnar_dirname(filename)
+    all_columns = open(dirname + 'columns.txt', 'r').read().split()
+    if columns is not None: all_columns = [item for item in all_columns if item in columns]
+
+    nrows = None
+    if rad_max is not None and os.path.exists(dirname + 'rad.npy'):
+        rad = np.load(dirname + 'rad.npy', mmap_mode='r')
+        nrows = np.searchsorted(rad, rad_max, side='right') # the rows are sorted by radius, so the radial cut is the first nrows rows
+
+    df = pd.DataFrame({column: np.array(np.load(dirname + column + '.npy', mmap_mode='r')[:nrows]) for column in all_columns})
+    return df
+
+# -------------------------------------------------------------------------------------------------
+def read_df_file(filename, args, columns=None, rad_max=None):
+    '''
+    Function to read a dataframe from disk, from the binary columnar version if it exists, otherwise from the txt file,
+    in which case the columnar version is written so that subsequent reads are faster
+    :return: dataframe
+    '''
+    if not os.path.exists(get_columnar_dirname(filename) + 'columns.txt'):
+        myprint('Converting ' + filename + ' to binary columnar format, once and for all..', args)
+        df = pd.read_table(filename, delim_whitespace=True, comment='#')
+        write_columnar_df(df, filename)
+    return read_columnar_df(filename, columns=columns, rad_max=rad_max)
+
 # ------------------------------------------------------------------
 def saveplot(fig, args, plot_suffix, outputdir=None):
     '''
@@ -976,6 +1074,8 @@ def parse_args(haloname, RDname, fast=False):
     parser.add_argument('--printoutfile', metavar='printoutfile', type=str, action='store', default='./logfile.out', help='file to write all print statements to; default is ./logfile.out')
     parser.add_argument('--instrument', metavar='instrument', type=str, action='store', default='dummy', help='which instrument to simulate?; default is dummy')
     parser.add_argument('--debug', dest='debug', action='store_true', default=False, help='run in debug mode (lots of print checks)?, default is no')
+    parser.add_argument('--hii_block_size', metavar='hii_block_size', type=int, action='store', default=1000, help='no. of HII regions whose spectra are computed together as one 2D array; default is 1000')
+    parser.add_argument('--ncpus', metavar='ncpus', type=int, action='store', default=1, help='no. of worker processes to compute blocks of HII region spectra in parallel; default is 1 (no parallelisation)')
 
     # ------- args added for make_mock_datacube.py ------------------------------
     parser.add_argument('--obs_spec_res', metavar='obs_spec_res', type=float, action='store', default=30., help='observed spectral resolution of the instrument, in km/s; default is 60 km/s')
@@ -983,6 +1083,7 @@ def parse_args(haloname, RDname, fast=False):
     parser.add_argument('--pix_per_beam', metavar='pix_per_beam', type=int, action='store', default=6, help='number of pixels to sample the resolution element (PSF) by; default is 6"')
     parser.add_argument('--kernel', metavar='kernel', type=str, action='store', default='gauss', help='which kernel to simulate for seeing, gauss or moff?; default is gauss')
     parser.add_argument('--ker_size_factor', metavar='ker_size_factor', type=int, action='store', default=5, help='factor to multiply kernel sigma by to get kernel size, e.g. if PSF sigma=5 pixel and ker_size_factor=5, kernel size=25 pixel; default is 5"')
+    parser.add_argument('--cube_slab_size', metavar='cube_slab_size', type=int, action='store', default=200, help='no. of wavelength slices to spatially rebin and convolve at once, to limit memory usage; default is 200')
     parser.add_argument('--moff_beta', metavar='moff_beta', type=float, action='store', default=4.7, help='beta (power index) in moffat kernel; default is 4.7"')
     parser.add_argument('--snr', metavar='snr', type=float, action='store', default=0, help='target SNR of the datacube; default is 0, i.e. noiseless"')
     parser.add_argument('--tel_radius', metavar='tel_radius', type=float, action='store', default=1, help='radius of telescope, in metres; default is 1 m')
@@ -17,14 +17,14 @@ def read_absorber_catalog(filename, format='astropy'):
     ab = Table.read(filename, format='ascii.basic')
     
     #assign colors to phases using FOGGIE utilities 
-    ab['phase'] = categorize_by_temp(np.log10(ab['temperature']))
+    ab['phase'] = np.asarray(categorize_by_temp(np.log10(ab['temperature']))).astype(bytes)
     colors = []
     for p in ab['phase']:   
         colors.append( new_phase_color_key[str.encode(p)] ) 
 
     ab['temp_colors'] = colors   
 
-    ab['metal'] = categorize_by_metals(ab['metallicity'])
+    ab['metal'] = np.asarray(categorize_by_metals(ab['metallicity'])).astype(bytes)
     metals = []
     for p in ab['metal']:   
         metals.append( new_metals_color_key[str.encode(p)] ) 
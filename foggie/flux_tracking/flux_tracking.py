@@ -14,6 +14,8 @@ utils/get_run_loc_etc.py
 utils/yt_fields.py
 utils/foggie_load.py
 utils/analysis_utils.py
+utils/shell_binning.py
+utils/snapshot_scheduler.py
 """
 
 # Import everything as needed
@@ -29,10 +31,8 @@ import glob
 import sys
 from astropy.table import Table
 from astropy.io import ascii
-import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
-import shutil
 import ast
 import trident
 
@@ -45,6 +45,9 @@ from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
 from foggie.utils.analysis_utils import *
+from foggie.utils.shell_binning import *
+from foggie.utils.snapshot_scheduler import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot, prefetch_snapshot
 
 def parse_args():
     '''Parse command line arguments. Returns args object.
@@ -198,6 +201,10 @@ def parse_args():
                         help='Do you want to append a string onto the names of the saved files? Default is no.')
     parser.set_defaults(save_suffix="")
 
+    parser.add_argument('--skip_existing', dest='skip_existing', action='store_true',
+                        help='Do you want to skip any snapshots that already have saved flux tables? Default is no.')
+    parser.set_defaults(skip_existing=False)
+
 
     args = parser.parse_args()
     return args
@@ -330,11 +337,9 @@ def calc_fluxes_simple(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_su
 
     # Set up table of everything we want
     fluxes = []
-    flux_filename = ''
     if ('mass' in flux_types):
         fluxes.append('mass_flux')
         fluxes.append('metal_flux')
-        flux_filename += '_mass'
     if ('energy' in flux_types):
         fluxes.append('thermal_energy_flux')
         fluxes.append('kinetic_energy_flux')
@@ -343,10 +348,8 @@ def calc_fluxes_simple(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_su
         fluxes.append('potential_energy_flux')
         fluxes.append('bernoulli_energy_flux')
         fluxes.append('cooling_energy_flux')
-        flux_filename += '_energy'
     if ('entropy' in flux_types):
         fluxes.append('entropy_flux')
-        flux_filename += '_entropy'
     if ('O_ion_mass' in flux_types):
         fluxes.append('O_mass_flux')
         fluxes.append('OI_mass_flux')
@@ -358,12 +361,10 @@ def calc_fluxes_simple(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_su
         fluxes.append('OVII_mass_flux')
         fluxes.append('OVIII_mass_flux')
         fluxes.append('OIX_mass_flux')
-        flux_filename += '_Oion'
     if ('angular_momentum' in flux_types):
         fluxes.append('angular_momentum_x_flux')
         fluxes.append('angular_momentum_y_flux')
         fluxes.append('angular_momentum_z_flux')
-        flux_filename += '_angmom'
 
     if (surface_args[0][0]=='cylinder'):
         table = make_table_simple(fluxes, ['cylinder', surface_args[0][7]])
@@ -638,7 +639,7 @@ def calc_fluxes_simple(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_su
     table = set_table_units(table)
 
     # Save to file
-    table.write(tablename + flux_filename + save_suffix + '_simple.hdf5', path='all_data', serialize_meta=True, overwrite=True)
+    table.write(flux_table_names(tablename, save_suffix, flux_types, simple=True)['table'], path='all_data', serialize_meta=True, overwrite=True)
 
     return "Fluxes have been calculated for snapshot " + snap + "!"
 
@@ -663,11 +664,9 @@ def calc_fluxes(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_suffix, s
 
     # Set up table of everything we want
     fluxes = []
-    flux_filename = ''
     if ('mass' in flux_types):
         fluxes.append('mass_flux')
         fluxes.append('metal_flux')
-        flux_filename += '_mass'
     if ('energy' in flux_types):
         fluxes.append('thermal_energy_flux')
         fluxes.append('kinetic_energy_flux')
@@ -676,10 +675,8 @@ def calc_fluxes(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_suffix, s
         fluxes.append('potential_energy_flux')
         fluxes.append('bernoulli_energy_flux')
         fluxes.append('cooling_energy_flux')
-        flux_filename += '_energy'
     if ('entropy' in flux_types):
         fluxes.append('entropy_flux')
-        flux_filename += '_entropy'
     if ('O_ion_mass' in flux_types):
         fluxes.append('O_mass_flux')
         fluxes.append('OI_mass_flux')
@@ -691,19 +688,16 @@ def calc_fluxes(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_suffix, s
         fluxes.append('OVII_mass_flux')
         fluxes.append('OVIII_mass_flux')
         fluxes.append('OIX_mass_flux')
-        flux_filename += '_Oion'
     if ('angular_momentum' in flux_types):
         fluxes.append('angular_momentum_x_flux')
         fluxes.append('angular_momentum_y_flux')
         fluxes.append('angular_momentum_z_flux')
-        flux_filename += '_angmom'
 
     # Define list of ways to chunk up the shape over radius or height
-    edges = False
+    edges = has_edge_tables(surface_args)
     if (surface_args[0][0]=='cylinder'):
         table = make_table(fluxes, ['cylinder', surface_args[0][7]])
         table_edge = make_table(fluxes, ['cylinder', surface_args[0][7]], edge=True)
-        edges = True
         if (sat):
             table_sat = make_table(fluxes, ['cylinder', surface_args[0][7]], edge=True)
         bottom_edge = surface_args[0][1]
@@ -735,9 +729,8 @@ def calc_fluxes(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_suffix, s
         outer_radius = surface_args[0][2]
         num_steps = surface_args[0][3]
         table = make_table(fluxes, ['sphere', 0])
-        if (surface_args[0][0]=='frustum') or (surface_args[0][0]=='ellipse'):
+        if (edges):
             table_edge = make_table(fluxes, ['sphere', 0], edge=True)
-            edges = True
         if (sat):
             table_sat = make_table(fluxes, ['sphere', 0], edge=True)
         if (args.units_kpc):
@@ -1057,111 +1050,87 @@ def calc_fluxes(ds, snap, zsnap, dt, refine_width_kpc, tablename, save_suffix, s
 
     if (args.temp_cut): temps = [0.,4.,5.,6.,12.]
     else: temps = [0.]
-
-    # Loop over chunks and compute fluxes to add to tables
-    for r in range(len(chunks)-1):
-        if (r%10==0): print("Computing chunk " + str(r) + "/" + str(len(chunks)) + \
-                            " for snapshot " + snap)
-
-        inner = chunks[r]
-        outer = chunks[r+1]
-        row = [zsnap, inner]
-        if (edges): row_edge = [zsnap, inner, outer]
-        if (sat): row_sat = [zsnap, inner, outer]
-
-        temp_up = temperature_shapes[(radius_shapes < inner) & (new_radius_shapes > inner)]
-        temp_down = temperature_shapes[(radius_shapes > inner) & (new_radius_shapes < inner)]
-        temp_r = temperature_shapes[(radius_shapes > inner) & (radius_shapes < outer)]
-        if (edges):
-            temp_in = temperature_in_shapes[(new_radius_in_shapes > inner) & (new_radius_in_shapes < outer)]
-            temp_out = temperature_out_shapes[(radius_out_shapes > inner) & (radius_out_shapes < outer)]
-        if (sat):
-            temp_in_sat = temperature_in_sat[(new_radius_in_sat > inner) & (new_radius_in_sat < outer)]
-            temp_out_sat = temperature_out_sat[(radius_out_sat > inner) & (radius_out_sat < outer)]
-
-        for i in range(len(fields)):
+    n_temps = len(temps)-1
+
+    # Bin every cell once by radius, advected radius, and temperature, then compute the fluxes for all
+    # chunks, fields, and temperatures at once
+    print('Computing fluxes for ' + str(len(chunks)-1) + ' chunks for snapshot ' + snap)
+    chunk_edges = np.array(chunks, dtype=float)
+    chunk_inner = chunk_edges[:-1]
+    temp_bins_shapes = open_bin_index(temperature_shapes, temps)
+    flux_up, flux_down = crossing_sums(radius_shapes, new_radius_shapes, chunk_inner, fields_shapes, \
+      groups=temp_bins_shapes, n_groups=n_temps)
+    sums_r = shell_sums(radius_shapes, chunk_edges, fields_shapes, groups=temp_bins_shapes, n_groups=n_temps)
+    if (edges):
+        sums_in = shell_sums(new_radius_in_shapes, chunk_edges, fields_in_shapes, \
+          groups=open_bin_index(temperature_in_shapes, temps), n_groups=n_temps)
+        sums_out = shell_sums(radius_out_shapes, chunk_edges, fields_out_shapes, \
+          groups=open_bin_index(temperature_out_shapes, temps), n_groups=n_temps)
+    if (sat):
+        sums_in_sat = shell_sums(new_radius_in_sat, chunk_edges, fields_in_sat, \
+          groups=open_bin_index(temperature_in_sat, temps), n_groups=n_temps)
+        sums_out_sat = shell_sums(radius_out_sat, chunk_edges, fields_out_sat, \
+          groups=open_bin_index(temperature_out_sat, temps), n_groups=n_temps)
+
+    # Assemble the table columns in the same order as make_table
+    columns = [np.full(len(chunk_inner), zsnap), chunk_inner]
+    if (edges): columns_edge = [np.full(len(chunk_inner), zsnap), chunk_inner, chunk_edges[1:]]
+    if (sat): columns_sat = [np.full(len(chunk_inner), zsnap), chunk_inner, chunk_edges[1:]]
+    for i in range(len(fields)):
+        for k in range(len(temps)):
             if (fluxes[i]=='cooling_energy_flux'):
-                iter = [0]
-                field_r = fields_shapes[i][(radius_shapes > inner) & (radius_shapes < outer)]
+                columns.append(-sums_r[i,k])
             else:
-                iter = [0,1,2]
-                field_up = fields_shapes[i][(radius_shapes < inner) & (new_radius_shapes > inner)]
-                field_down = fields_shapes[i][(radius_shapes > inner) & (new_radius_shapes < inner)]
+                columns += [flux_up[i,k]/dt - flux_down[i,k]/dt, -flux_down[i,k]/dt, flux_up[i,k]/dt]
                 if (edges):
-                    field_in = fields_in_shapes[i][(new_radius_in_shapes > inner) & (new_radius_in_shapes < outer)]
-                    field_out = fields_out_shapes[i][(radius_out_shapes > inner) & (radius_out_shapes < outer)]
+                    columns_edge += [sums_in[i,k]/dt - sums_out[i,k]/dt, sums_in[i,k]/dt, -sums_out[i,k]/dt]
                 if (sat):
-                    field_in_sat = fields_in_sat[i][(new_radius_in_sat > inner) & (new_radius_in_sat < outer)]
-                    field_out_sat = fields_out_sat[i][(radius_out_sat > inner) & (radius_out_sat < outer)]
-
-            for k in range(len(temps)):
-                if (k==0):
-                    if (fluxes[i]=='cooling_energy_flux'):
-                        field_r_t = field_r
-                    else:
-                        field_up_t = field_up
-                        field_down_t = field_down
-                        if (edges):
-                            field_in_t = field_in
-                            field_out_t = field_out
-                        if (sat):
-                            field_in_sat_t = field_in_sat
-                            field_out_sat_t = field_out_sat
-                else:
-                    if (fluxes[i]=='cooling_energy_flux'):
-                        field_r_t = field_r[(temp_r > temps[k-1]) & (temp_r < temps[k])]
-                    else:
-                        field_up_t = field_up[(temp_up > temps[k-1]) & (temp_up < temps[k])]
-                        field_down_t = field_down[(temp_down > temps[k-1]) & (temp_down < temps[k])]
-                        if (edges):
-                            field_in_t = field_in[(temp_in > temps[k-1]) & (temp_in < temps[k])]
-                            field_out_t = field_out[(temp_out > temps[k-1]) & (temp_out < temps[k])]
-                        if (sat):
-                            field_in_sat_t = field_in_sat[(temp_in_sat > temps[k-1]) & (temp_in_sat < temps[k])]
-                            field_out_sat_t = field_out_sat[(temp_out_sat > temps[k-1]) & (temp_out_sat < temps[k])]
-                for j in iter:
-                    if (j==0):
-                        if (fluxes[i]=='cooling_energy_flux'):
-                            row.append(-np.sum(field_r_t))
-                        else:
-                            row.append(np.sum(field_up_t)/dt - np.sum(field_down_t)/dt)
-                            if (edges):
-                                row_edge.append(np.sum(field_in_t)/dt - np.sum(field_out_t)/dt)
-                            if (sat):
-                                row_sat.append(np.sum(field_in_sat_t)/dt - np.sum(field_out_sat_t)/dt)
-                    if (j==1):
-                        row.append(-np.sum(field_down_t)/dt)
-                        if (edges):
-                            row_edge.append(np.sum(field_in_t)/dt)
-                        if (sat):
-                            row_sat.append(np.sum(field_in_sat_t)/dt)
-                    if (j==2):
-                        row.append(np.sum(field_up_t)/dt)
-                        if (edges):
-                            row_edge.append(-np.sum(field_out_t)/dt)
-                        if (sat):
-                            row_sat.append(-np.sum(field_out_sat_t)/dt)
-
-
-        table.add_row(row)
-        if (edges): table_edge.add_row(row_edge)
-        if (sat): table_sat.add_row(row_sat)
+                    columns_sat += [sums_in_sat[i,k]/dt - sums_out_sat[i,k]/dt, sums_in_sat[i,k]/dt, -sums_out_sat[i,k]/dt]
+    table = Table(columns, names=table.colnames)
+    if (edges): table_edge = Table(columns_edge, names=table_edge.colnames)
+    if (sat): table_sat = Table(columns_sat, names=table_sat.colnames)
 
     table = set_table_units(table)
     if (edges): table_edge = set_table_units(table_edge)
     if (sat): table_sat = set_table_units(table_sat)
 
     # Save to file
-    if (sat):
-        table.write(tablename + '_nosat' + flux_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-        if (edges): table_edge.write(tablename + '_nosat_edge' + flux_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-        table_sat.write(tablename + '_sat_edge' + flux_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-    else:
-        table.write(tablename + flux_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-        if (edges): table_edge.write(tablename + '_edge' + flux_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
+    table_names = flux_table_names(tablename, save_suffix, flux_types, sat=bool(sat), edges=edges)
+    table.write(table_names['table'], path='all_data', serialize_meta=True, overwrite=True)
+    if (edges): table_edge.write(table_names['edge'], path='all_data', serialize_meta=True, overwrite=True)
+    if (sat): table_sat.write(table_names['sat'], path='all_data', serialize_meta=True, overwrite=True)
 
     return "Fluxes have been calculated for snapshot " + snap + "!"
 
+def has_edge_tables(surface_args):
+    '''Returns True if calc_fluxes makes tables of the fluxes through the edges of the shape given by
+    'surface_args' (cylinders, frustums and ellipses), and False otherwise.'''
+
+    return (surface_args[0][0]=='cylinder') or (surface_args[0][0]=='frustum') or (surface_args[0][0]=='ellipse')
+
+def flux_table_names(tablename, save_suffix, flux_types, simple=False, sat=False, edges=False):
+    '''Returns a dictionary of the names of the files that calc_fluxes (or calc_fluxes_simple, if
+    'simple' is True) writes for the table name 'tablename' with 'save_suffix' appended and the list
+    of flux types 'flux_types'. The key 'table' is always there, 'edge' is there if 'edges' is True,
+    and 'sat' is there if satellites are removed ('sat' is True). Both the calc_fluxes functions and
+    --skip_existing use this, so they always agree on the file names.'''
+
+    flux_filename = ''
+    for flux_type, name in [['mass', '_mass'], ['energy', '_energy'], ['entropy', '_entropy'], \
+                            ['O_ion_mass', '_Oion'], ['angular_momentum', '_angmom']]:
+        if (flux_type in flux_types): flux_filename += name
+
+    if (simple):
+        return {'table': tablename + flux_filename + save_suffix + '_simple.hdf5'}
+    if (sat):
+        table_names = {'table': tablename + '_nosat' + flux_filename + save_suffix + '.hdf5', \
+                       'sat': tablename + '_sat_edge' + flux_filename + save_suffix + '.hdf5'}
+        if (edges): table_names['edge'] = tablename + '_nosat_edge' + flux_filename + save_suffix + '.hdf5'
+    else:
+        table_names = {'table': tablename + flux_filename + save_suffix + '.hdf5'}
+        if (edges): table_names['edge'] = tablename + '_edge' + flux_filename + save_suffix + '.hdf5'
+    return table_names
+
 def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablename, save_suffix, surface_args, flux_types, sat_dir, sat_radius, masses_dir):
     '''This function loads a specified snapshot 'snap' located in the 'run_dir' within the
     'foggie_dir', the halo track 'track', the name of the halo_c_v file, the name of the snapshot,
@@ -1170,11 +1139,8 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     does the calculation on the loaded snapshot.'''
 
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
 
     # Load the snapshot depending on if disk minor axis is needed
     disk = False
@@ -1236,10 +1202,9 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
           surface_args, flux_types, Menc_profile, sat=sat, sat_radius=sat_radius,inverse=args.inverse, \
           disk=disk, Rvir=Rvir, halo_center_kpc2=halo_center_kpc2)
 
-    # Delete output from temp directory if on pleiades
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
     print(message)
     print(str(datetime.datetime.now()))
 
@@ -1296,42 +1261,34 @@ if __name__ == "__main__":
             print('The flux type   %s   has not been implemented. Ask Cassi to add it.' % (flux_types[i]))
             sys.exit()
 
+    # Skip snapshots that already have all the output tables for these arguments if --skip_existing is specified
+    def skip_snap(snap):
+        table_names = flux_table_names(prefix + snap + '_fluxes', save_suffix, flux_types, simple=args.simple, \
+          sat=(sat_radius!=0.), edges=has_edge_tables(surfaces))
+        return (args.skip_existing) and (all([os.path.exists(table_names[key]) for key in table_names]))
+
+    # Stage the next snapshot to local disk in the background while the current one is analyzed
+    def prefetch_snap(snap):
+        if (staging_enabled(args.system)): prefetch_snapshot(foggie_dir + run_dir + snap)
+
     # Loop over outputs, for either single-processor or parallel processor computing
     if (args.nproc==1):
         for i in range(len(outs)):
             snap = outs[i]
+            if (skip_snap(snap)): continue
+            if (i+1 < len(outs)): prefetch_snap(outs[i+1])
             # Make the output table name for this snapshot
             tablename = prefix + snap + '_fluxes'
             # Do the actual calculation
             load_and_calculate(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
               tablename, save_suffix, surfaces, flux_types, sat_dir, sat_radius, masses_dir)
     else:
-        # Split into a number of groupings equal to the number of processors
-        # and run one process per processor
-        for i in range(len(outs)//args.nproc):
-            threads = []
-            for j in range(args.nproc):
-                snap = outs[args.nproc*i+j]
-                tablename = prefix + snap + '_fluxes'
-                threads.append(multi.Process(target=load_and_calculate, \
-			       args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                     tablename, save_suffix, surfaces, flux_types, sat_dir, sat_radius, masses_dir)))
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-        # For any leftover snapshots, run one per processor
-        threads = []
-        for j in range(len(outs)%args.nproc):
-            snap = outs[-(j+1)]
-            tablename = prefix + snap + '_fluxes'
-            threads.append(multi.Process(target=load_and_calculate, \
-			   args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                 tablename, save_suffix, surfaces, flux_types, sat_dir, sat_radius, masses_dir)))
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+        # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+        run_snapshots(load_and_calculate, outs, nproc=args.nproc, \
+          args_for=lambda snap: (args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
+            prefix + snap + '_fluxes', save_suffix, surfaces, flux_types, sat_dir, sat_radius, masses_dir), \
+          snap_dir=lambda snap: foggie_dir + run_dir + snap, \
+          skip=skip_snap, prefetch=prefetch_snap, log_file=prefix + 'fluxes_log' + save_suffix + '.txt')
 
     print(str(datetime.datetime.now()))
     print("All snapshots finished!")
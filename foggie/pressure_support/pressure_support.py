@@ -15,6 +15,8 @@ utils/get_run_loc_etc.py
 utils/yt_fields.py
 utils/foggie_load.py
 utils/analysis_utils.py
+utils/snapshot_scheduler.py
+utils/smoothing.py
 """
 
 # Import everything as needed
@@ -30,25 +32,22 @@ import glob
 import sys
 from astropy.table import Table
 from astropy.io import ascii
-import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 from scipy.interpolate import RegularGridInterpolator
 import shutil
 import ast
 import matplotlib.pyplot as plt
-from scipy.ndimage import gaussian_filter
 from scipy.ndimage import rotate
 from scipy.ndimage import uniform_filter1d
 import scipy.ndimage as ndimage
 from scipy.interpolate import LinearNDInterpolator
 from scipy.interpolate import NearestNDInterpolator
 from astropy.convolution import Gaussian1DKernel
-from astropy.convolution import Gaussian2DKernel
 from astropy.convolution import CustomKernel
 from astropy.convolution import interpolate_replace_nans
-from astropy.convolution import convolve_fft
 import copy
+from functools import partial
 import matplotlib.colors as colors
 import trident
 
@@ -61,6 +60,9 @@ from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
 from foggie.utils.analysis_utils import *
+from foggie.utils.snapshot_scheduler import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
+from foggie.utils.smoothing import *
 
 # These imports for datashader plots
 import datashader as dshader
@@ -159,6 +161,17 @@ def parse_args():
                         'This option only has meaning for running things on multiple snapshots.')
     parser.set_defaults(nproc=1)
 
+    parser.add_argument('--smooth_threads', metavar='smooth_threads', type=int, action='store', \
+                        help='How many threads do you want to use for smoothing gridded fields? Default is 1.\n' + \
+                        'If running multiple snapshots with --nproc, keep nproc*smooth_threads at or below the\n' + \
+                        'number of cores.')
+    parser.set_defaults(smooth_threads=1)
+
+    parser.add_argument('--smooth_tile', metavar='smooth_tile', type=int, action='store', \
+                        help='Do you want to smooth gridded fields in cubic tiles of this many cells on a side\n' + \
+                        'to save memory? Default is no tiling.')
+    parser.set_defaults(smooth_tile=None)
+
     parser.add_argument('--pdf_R', metavar='pdf_R', type=str, action='store', \
                         help='If plotting velocity PDFs, what radius do you want? Default is 50 kpc.')
     parser.set_defaults(pdf_R='50.')
@@ -239,6 +252,12 @@ def parse_args():
                         'run time and reduce weight on IO file system. Default is no.')
     parser.set_defaults(copy_to_tmp=False)
 
+    parser.add_argument('--skip_existing', dest='skip_existing', action='store_true', \
+                        help='Do you want to skip any snapshots that have already finished this plot for these\n' + \
+                        'arguments? Snapshots are marked as finished in save_dir/.done/ once all\n' + \
+                        'of their plots are saved. Default is no.')
+    parser.set_defaults(skip_existing=False)
+
     args = parser.parse_args()
     return args
 
@@ -270,33 +289,12 @@ def triple_gauss(x, mu1, sig1, A1, mu2, sig2, A2, mu3, sig3, A3):
     return func1 + func2 + func3
 
 def Gaussian_convolve_3D(masked_arr, smooth_scale):
-    '''Performs a 3D Gaussian convolution by doing a 2D convolution along each slice in each direction.
-    Very slow for large arrays, but at least faster than a 3D convolution with astropy's convolve function
-    (which can handle masked values whereas scipy's cannot).
-
-    Requires:
-    from astropy.convolution import Gaussian2DKernel
-    from astropy.convolution import convolve_fft
-    '''
-
-    kernel_2d = Gaussian2DKernel(smooth_scale/2./np.sqrt(2.))       # Need sqrt(2) because each axis will be convolved twice
-
-    smooth_arr_1 = []
-    for j in range(len(masked_arr[:,0,0])):
-        smooth_arr_1.append(convolve_fft(masked_arr[j,:,:], kernel_2d, preserve_nan=True, allow_huge=True))
-    smooth_arr_1 = np.array(smooth_arr_1)
-    smooth_arr_2 = []
-    for j in range(len(masked_arr[0,:,0])):
-        smooth_arr_2.append(convolve_fft(smooth_arr_1[:,j,:], kernel_2d, preserve_nan=True, allow_huge=True))
-    smooth_arr_2 = np.array(smooth_arr_2)
-    smooth_arr_2 = np.transpose(smooth_arr_2, axes=(1,0,2))
-    smooth_arr = []
-    for j in range(len(masked_arr[0,0,:])):
-        smooth_arr.append(convolve_fft(smooth_arr_2[:,:,j], kernel_2d, preserve_nan=True, allow_huge=True))
-    smooth_arr = np.array(smooth_arr)
-    smooth_arr = np.transpose(smooth_arr, axes=(1,2,0))
-
-    return smooth_arr
+    '''Performs a 3D Gaussian convolution of 'masked_arr' that ignores (and preserves) NaN values, where
+    'smooth_scale' is the full width of the kernel in cells. This is now a separable 1D convolution along
+    each axis, see utils/smoothing.py.'''
+
+    return gaussian_smooth_3D(masked_arr, smooth_scale/2., preserve_nan=True, \
+      nthreads=args.smooth_threads, tile_size=args.smooth_tile)
 
 def weighted_quantile(values, weights, quantiles):
     """ Very close to numpy.percentile, but supports weights.
@@ -435,6 +433,13 @@ def create_foggie_cmap(cmin, cmax, cfunc, color_key, log=False):
     cmap = tf.spread(tf.shade(agg, color_key=color_key), px=2, shape='square')
     return cmap
 
+def plot_and_mark_done(plot_function, snap):
+    '''Makes the plot of the snapshot 'snap' with 'plot_function', then marks the snapshot as done for
+    the plot chosen with --plot and the current arguments so --skip_existing can skip it later.'''
+
+    plot_function(snap)
+    mark_done(save_dir, snap, plot_task)
+
 def velocity_PDF(snap):
     '''Plots PDFs of the three velocity components in a given radius bin for a given snapshot.'''
 
@@ -552,15 +557,13 @@ def pressures_vs_radius(snap):
 
     if (not args.load_stats):
         if (args.system=='pleiades_cassi'):
-            print('Copying directory to /tmp')
+            # Make a dummy directory with the snap name so the script later knows the process running
+            # this snapshot failed if the directory is still there
             snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+            os.makedirs(snap_dir)
             if (args.copy_to_tmp):
-                shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-                snap_name = snap_dir + '/' + snap
+                snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
             else:
-                # Make a dummy directory with the snap name so the script later knows the process running
-                # this snapshot failed if the directory is still there
-                os.makedirs(snap_dir)
                 snap_name = foggie_dir + run_dir + snap + '/' + snap
         else:
             snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -655,10 +658,10 @@ def pressures_vs_radius(snap):
             vx_masked = vx
             vy_masked = vy
             vz_masked = vz
-        smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-        smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-        smooth_vz = gaussian_filter(vz_masked, smooth_scale)
-        smooth_den = gaussian_filter(den_masked, smooth_scale)
+        smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_den = gaussian_smooth_3D(den_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
         sig_x = (vx_masked - smooth_vx)**2.
         sig_y = (vy_masked - smooth_vy)**2.
         sig_z = (vz_masked - smooth_vz)**2.
@@ -672,7 +675,7 @@ def pressures_vs_radius(snap):
             vr_masked[disk_mask] = vr_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
         else:
             vr_masked = vr
-        vr_masked = gaussian_filter(vr_masked, smooth_scale)
+        vr_masked = gaussian_smooth_3D(vr_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
         dvr = np.gradient(vr_masked, dx_cm)
         delta_vr = dvr[0]*dx_cm*x_hat + dvr[1]*dx_cm*y_hat + dvr[2]*dx_cm*z_hat
         ram_pressure = smooth_den*(delta_vr)**2.
@@ -804,8 +807,8 @@ def pressures_vs_radius(snap):
         print("Stats have been calculated and saved to file for snapshot " + snap + "!")
         # Delete output from temp directory if on pleiades
         if (args.system=='pleiades_cassi'):
-            print('Deleting directory from /tmp')
             shutil.rmtree(snap_dir)
+            if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
     plot_colors = ['r', 'g', 'm']
     plot_labels = ['Thermal', 'Turbulent', 'Ram']
@@ -1078,15 +1081,13 @@ def forces_vs_radius(snap):
 
     if (not args.load_stats):
         if (args.system=='pleiades_cassi'):
-            print('Copying directory to /tmp')
+            # Make a dummy directory with the snap name so the script later knows the process running
+            # this snapshot failed if the directory is still there
             snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+            os.makedirs(snap_dir)
             if (args.copy_to_tmp):
-                shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-                snap_name = snap_dir + '/' + snap
+                snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
             else:
-                # Make a dummy directory with the snap name so the script later knows the process running
-                # this snapshot failed if the directory is still there
-                os.makedirs(snap_dir)
                 snap_name = foggie_dir + run_dir + snap + '/' + snap
         else:
             snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -1175,10 +1176,10 @@ def forces_vs_radius(snap):
             vx_masked = vx
             vy_masked = vy
             vz_masked = vz
-        smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-        smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-        smooth_vz = gaussian_filter(vz_masked, smooth_scale)
-        smooth_den = gaussian_filter(den_masked, smooth_scale)
+        smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_den = gaussian_smooth_3D(den_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
         sig_x = (vx_masked - smooth_vx)**2.
         sig_y = (vy_masked - smooth_vy)**2.
         sig_z = (vz_masked - smooth_vz)**2.
@@ -1195,7 +1196,7 @@ def forces_vs_radius(snap):
             vr_masked[disk_mask] = vr_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
         else:
             vr_masked = vr
-        vr_masked = gaussian_filter(vr_masked, smooth_scale)
+        vr_masked = gaussian_smooth_3D(vr_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
         dvr = np.gradient(vr_masked, dx_cm)
         delta_vr = dvr[0]*dx_cm*x_hat + dvr[1]*dx_cm*y_hat + dvr[2]*dx_cm*z_hat
         ram_pressure = smooth_den*(delta_vr)**2.
@@ -1216,8 +1217,8 @@ def forces_vs_radius(snap):
         else:
             vtheta_masked = vtheta
             vphi_masked = vphi
-        smooth_vtheta = gaussian_filter(vtheta_masked, smooth_scale)
-        smooth_vphi = gaussian_filter(vphi_masked, smooth_scale)
+        smooth_vtheta = gaussian_smooth_3D(vtheta_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+        smooth_vphi = gaussian_smooth_3D(vphi_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
         rot_force = (smooth_vtheta**2. + smooth_vphi**2.)/r
         grav_force = -G*Menc_profile(r/(1000*cmtopc))*gtoMsun/r**2.
         tot_force = thermal_force + turb_force + rot_force + ram_force + grav_force
@@ -1402,8 +1403,8 @@ def forces_vs_radius(snap):
         print("Stats have been calculated and saved to file for snapshot " + snap + "!")
         # Delete output or dummy directory from temp directory if on pleiades
         if (args.system=='pleiades_cassi'):
-            print('Deleting directory from /tmp')
             shutil.rmtree(snap_dir)
+            if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 
     plot_colors = ['r', 'g', 'm', 'b', 'gold', 'k']
@@ -2176,15 +2177,13 @@ def force_rays(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -2271,10 +2270,10 @@ def force_rays(snap):
     vx_masked[disk_mask] = vx_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
     vy_masked[disk_mask] = vy_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
     vz_masked[disk_mask] = vz_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-    smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-    smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-    smooth_vz = gaussian_filter(vz_masked, smooth_scale)
-    smooth_den = gaussian_filter(den_masked, smooth_scale)
+    smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_den = gaussian_smooth_3D(den_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
     sig_x = (vx_masked - smooth_vx)**2.
     sig_y = (vy_masked - smooth_vy)**2.
     sig_z = (vz_masked - smooth_vz)**2.
@@ -2288,7 +2287,7 @@ def force_rays(snap):
     vr_interp_func = NearestNDInterpolator(list(zip(x_edges,y_edges,z_edges)), vr_edges)
     vr_masked = np.copy(vr)
     vr_masked[disk_mask] = vr_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-    vr_masked = gaussian_filter(vr_masked, smooth_scale)
+    vr_masked = gaussian_smooth_3D(vr_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
     dvr = np.gradient(vr_masked, dx_cm)
     delta_vr = dvr[0]*dx_cm*x_hat + dvr[1]*dx_cm*y_hat + dvr[2]*dx_cm*z_hat
     ram_pressure = smooth_den*(delta_vr)**2.
@@ -2305,8 +2304,8 @@ def force_rays(snap):
     vphi_masked = np.copy(vphi)
     vtheta_masked[disk_mask] = vtheta_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
     vphi_masked[disk_mask] = vphi_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-    smooth_vtheta = gaussian_filter(vtheta_masked, smooth_scale)
-    smooth_vphi = gaussian_filter(vphi_masked, smooth_scale)
+    smooth_vtheta = gaussian_smooth_3D(vtheta_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vphi = gaussian_smooth_3D(vphi_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
     rot_force = (smooth_vtheta**2. + smooth_vphi**2.)/r
     grav_force = -G*Menc_profile(r/(1000*cmtopc))*gtoMsun/r**2.
     tot_force = thermal_force + turb_force + rot_force + ram_force + grav_force
@@ -2454,8 +2453,8 @@ def force_rays(snap):
 
     # Delete output or dummy directory from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def support_vs_radius(snap):
     '''Plots the ratio of different types of force (thermal, turbulent, rotational, ram)
@@ -2616,12 +2615,9 @@ def pressure_vs_r_rv_shaded(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    # Copy output to temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -2794,10 +2790,9 @@ def pressure_vs_r_rv_shaded(snap):
             os.system('rm ' + save_dir + snap + '_' + ptypes[i] + '_pressure_vs_' + file_xaxis + '_' + args.shader_color + '-colored' + regions[j] + save_suffix + '_intermediate.png')
             plt.close()
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def force_vs_r_rv_shaded(snap):
     '''Plots a datashader plot of radial forces vs radius or radial velocity, color-coded by the field specified
@@ -2809,12 +2804,9 @@ def force_vs_r_rv_shaded(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    # Copy output to temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -3050,10 +3042,9 @@ def force_vs_r_rv_shaded(snap):
             os.system('rm ' + save_dir + snap + '_' + ftypes[i] + '_force_mid_vs_' + file_xaxis + '_' + args.shader_color + '-colored' + regions[j] + save_suffix + '.png')
             plt.close()
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def support_vs_r_rv_shaded(snap):
     '''Plots a datashader plot of pressure support vs radius, color-coded by the field specified
@@ -3065,11 +3056,8 @@ def support_vs_r_rv_shaded(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -3284,10 +3272,9 @@ def support_vs_r_rv_shaded(snap):
             os.system('rm ' + save_dir + snap + '_' + ftypes[i] + '_support_vs_' + file_xaxis + '_' + args.shader_color + '-colored' + regions[j] + save_suffix + '_intermediate.png')
             plt.close()
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def pressure_slice(snap):
     '''Plots a slice of pressure through the center of the halo. The option --pressure_type indicates
@@ -3299,15 +3286,13 @@ def pressure_slice(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -3362,7 +3347,7 @@ def pressure_slice(snap):
     den_interp_func = NearestNDInterpolator(list(zip(x_edges,y_edges,z_edges)), den_edges)
     den_masked = np.copy(density)
     den_masked[disk_mask] = den_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-    smooth_den = gaussian_filter(den_masked, smooth_scale)
+    smooth_den = gaussian_smooth_3D(den_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
 
     for i in range(len(ptypes)):
         if (ptypes[i]=='thermal'):
@@ -3397,14 +3382,14 @@ def pressure_slice(snap):
             vy_masked[disk_mask] = vy_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             vz_masked[disk_mask] = vz_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             # Smooth resulting velocity field -- without contamination from ISM regions
-            smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-            smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-            smooth_vz = gaussian_filter(vz_masked, smooth_scale)
+            smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+            smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+            smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             sig_x = (vx - smooth_vx)**2.
             sig_y = (vy - smooth_vy)**2.
             sig_z = (vz - smooth_vz)**2.
             vdisp = np.sqrt((sig_x + sig_y + sig_z)/3.)
-            smooth_vdisp = gaussian_filter(vdisp, smooth_scale)
+            smooth_vdisp = gaussian_smooth_3D(vdisp, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             turb_pressure = smooth_den*smooth_vdisp**2.
             pressure = turb_pressure
             pressure_label = 'Turbulent'
@@ -3423,7 +3408,7 @@ def pressure_slice(snap):
             vr_masked[disk_mask] = vr_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             dvr = np.gradient(vr_masked, dx_cm)
             delta_vr = dvr[0]*dx_cm*x_hat + dvr[1]*dx_cm*y_hat + dvr[2]*dx_cm*z_hat
-            smooth_delta_vr = gaussian_filter(delta_vr, smooth_scale)
+            smooth_delta_vr = gaussian_smooth_3D(delta_vr, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             ram_pressure = smooth_den*(smooth_delta_vr)**2.
             pressure = ram_pressure
             pressure_label = 'Ram'
@@ -3451,8 +3436,8 @@ def pressure_slice(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def force_slice(snap):
     '''Plots a slice of different force terms through the center of the halo. The option --force_type indicates
@@ -3464,15 +3449,13 @@ def force_slice(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -3537,7 +3520,7 @@ def force_slice(snap):
     den_interp_func = NearestNDInterpolator(list(zip(x_edges,y_edges,z_edges)), den_edges)
     den_masked = np.copy(density)
     den_masked[disk_mask] = den_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-    smooth_den = gaussian_filter(den_masked, smooth_scale)
+    smooth_den = gaussian_smooth_3D(den_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
 
     for i in range(len(ftypes)):
         if (ftypes[i]=='thermal') or ((ftypes[i]=='total') and (args.force_type!='all')):
@@ -3554,7 +3537,7 @@ def force_slice(snap):
             thermal_force = -1./den_masked * dPdr
             if (ftypes[i]=='thermal'):
                 if (args.smoothed):
-                    force = gaussian_filter(thermal_force, smooth_scale5)
+                    force = gaussian_smooth_3D(thermal_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
                 else:
                     force = thermal_force
                 force_label = 'Thermal Pressure'
@@ -3578,9 +3561,9 @@ def force_slice(snap):
             vy_masked[disk_mask] = vy_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             vz_masked[disk_mask] = vz_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             # Smooth resulting velocity field -- without contamination from ISM regions
-            smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-            smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-            smooth_vz = gaussian_filter(vz_masked, smooth_scale)
+            smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+            smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+            smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             sig_x = (vx - smooth_vx)**2.
             sig_y = (vy - smooth_vy)**2.
             sig_z = (vz - smooth_vz)**2.
@@ -3591,7 +3574,7 @@ def force_slice(snap):
             turb_force = -1./den_masked * dPdr
             if (ftypes[i]=='turbulent'):
                 if (args.smoothed):
-                    force = gaussian_filter(turb_force, smooth_scale5)
+                    force = gaussian_smooth_3D(turb_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
                 else:
                     force = turb_force
                 force_label = 'Turbulent Pressure'
@@ -3606,14 +3589,14 @@ def force_slice(snap):
             vr_masked[disk_mask] = vr_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             dvr = np.gradient(vr_masked, dx_cm)
             delta_vr = dvr[0]*dx_cm*x_hat + dvr[1]*dx_cm*y_hat + dvr[2]*dx_cm*z_hat
-            smooth_delta_vr = gaussian_filter(delta_vr, smooth_scale)
+            smooth_delta_vr = gaussian_smooth_3D(delta_vr, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             ram_pressure = smooth_den*(smooth_delta_vr)**2.
             pres_grad = np.gradient(ram_pressure, dx_cm)
             dPdr = pres_grad[0]*x_hat + pres_grad[1]*y_hat + pres_grad[2]*z_hat
             ram_force = -1./den_masked * dPdr
             if (ftypes[i]=='ram'):
                 if (args.smoothed):
-                    force = gaussian_filter(ram_force, smooth_scale5)
+                    force = gaussian_smooth_3D(ram_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
                 else:
                     force = ram_force
                 force_label = 'Ram Pressure'
@@ -3631,12 +3614,12 @@ def force_slice(snap):
             # Replace removed ISM regions with interpolated values
             vtheta_masked[disk_mask] = vtheta_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             vphi_masked[disk_mask] = vphi_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
-            smooth_vtheta = gaussian_filter(vtheta_masked, smooth_scale)
-            smooth_vphi = gaussian_filter(vphi_masked, smooth_scale)
+            smooth_vtheta = gaussian_smooth_3D(vtheta_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+            smooth_vphi = gaussian_smooth_3D(vphi_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             rot_force = (smooth_vtheta**2. + smooth_vphi**2.)/r
             if (ftypes[i]=='rotation'):
                 if (args.smoothed):
-                    force = gaussian_filter(rot_force, smooth_scale5)
+                    force = gaussian_smooth_3D(rot_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
                 else:
                     force = rot_force
                 force_label = 'Rotation'
@@ -3644,14 +3627,14 @@ def force_slice(snap):
             grav_force = -G*Menc_profile(r/(1000*cmtopc))*gtoMsun/r**2.
             if (ftypes[i]=='gravity'):
                 if (args.smoothed):
-                    force = gaussian_filter(grav_force, smooth_scale5)
+                    force = gaussian_smooth_3D(grav_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
                 else:
                     force = grav_force
                 force_label = 'Gravity'
         if (ftypes[i]=='total'):
             tot_force = thermal_force + turb_force + rot_force + ram_force + grav_force
             if (args.smoothed):
-                force = gaussian_filter(tot_force, smooth_scale5)
+                force = gaussian_smooth_3D(tot_force, smooth_scale5, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             else:
                 force = tot_force
             force_label = 'Total'
@@ -3679,8 +3662,8 @@ def force_slice(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def ion_slice(snap):
     '''Plots a slice of an ion mass given by --ion.'''
@@ -3688,15 +3671,13 @@ def ion_slice(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -3760,8 +3741,8 @@ def ion_slice(snap):
 
     # Delete output or dummy directory from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def support_slice(snap):
     '''Plots a slice of the ratio of supporting forces to gravity through the center of the halo,
@@ -3773,11 +3754,8 @@ def support_slice(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -3886,10 +3864,9 @@ def support_slice(snap):
         plt.subplots_adjust(bottom=0.08, top=0.98, left=0.08, right=0.88)
         plt.savefig(save_dir + snap + '_' + ftypes[i] + '_support_slice_x' + save_suffix + '.png')
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def velocity_slice(snap):
     '''Plots slices of radial, theta, and phi velocity fields through the center of the halo. The field,
@@ -3901,15 +3878,13 @@ def velocity_slice(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -3969,7 +3944,7 @@ def velocity_slice(snap):
             # Replace removed ISM regions with interpolated values
             v_masked[disk_mask] = v_interp_func(x[disk_mask], y[disk_mask], z[disk_mask])
             # Smooth resulting velocity field -- without contamination from ISM regions
-            smooth_v = gaussian_filter(v_masked, smooth_scale/6.)
+            smooth_v = gaussian_smooth_3D(v_masked, smooth_scale/6., nthreads=args.smooth_threads, tile_size=args.smooth_tile)
             sig_v = v_masked - smooth_v
             ax1 = fig.add_subplot(3,3,3*i+1)
             ax2 = fig.add_subplot(3,3,3*i+2)
@@ -4009,8 +3984,8 @@ def velocity_slice(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def vorticity_slice(snap):
     '''Plots a slice of velocity vorticity through the center of the halo.'''
@@ -4034,12 +4009,9 @@ def vorticity_direction(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    # Copy output to temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -4085,14 +4057,15 @@ def vorticity_direction(snap):
         plt.subplots_adjust(left=0.095, bottom=0.067, right=0.979, top=0.917, wspace=0.248, hspace=0.286)
         plt.savefig(save_dir + '/' + snap + '_vorticity_direction_r%.1f-%.1fkpc' % (shells[i], shells[i+1]) + save_suffix + '.png')
 
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
+
 def Pk_turbulence(snap):
     '''Plots a turbulent energy power spectrum for the output given in 'snap'.'''
 
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name)
@@ -4167,19 +4140,21 @@ def Pk_turbulence(snap):
 
     plt.savefig(save_dir + snap + '_turbulent_energy_spectrum' + save_suffix + '.pdf')
 
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
+
 def turbulence_compare(snap):
     '''Computes the turbulent pressure several different ways and compares them in a single plot.'''
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
             snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -4255,10 +4230,10 @@ def turbulence_compare(snap):
         vy_masked = vy
         vz_masked = vz
         density_masked = density
-    smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-    smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-    smooth_vz = gaussian_filter(vz_masked, smooth_scale)
-    smooth_den = gaussian_filter(density_masked, smooth_scale)
+    smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_den = gaussian_smooth_3D(density_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
     sig_x = (vx_masked - smooth_vx)**2.
     sig_y = (vy_masked - smooth_vy)**2.
     sig_z = (vz_masked - smooth_vz)**2.
@@ -4383,8 +4358,8 @@ def turbulence_compare(snap):
 
     # Delete output or dummy directory from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def turbulence_visualization(snap):
     '''Opens a napari viewer to view turbulence in 3D.'''
@@ -4491,10 +4466,10 @@ def turbulence_visualization(snap):
     thermal_force[thermal_force < 0.] = thermal_neg'''
 
     print('Smoothing fields', str(datetime.datetime.now()))
-    '''smooth_vx = gaussian_filter(vx_masked, smooth_scale)
-    smooth_vy = gaussian_filter(vy_masked, smooth_scale)
-    smooth_vz = gaussian_filter(vz_masked, smooth_scale)'''
-    smooth_den = gaussian_filter(density_masked, smooth_scale)
+    '''smooth_vx = gaussian_smooth_3D(vx_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vy = gaussian_smooth_3D(vy_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
+    smooth_vz = gaussian_smooth_3D(vz_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)'''
+    smooth_den = gaussian_smooth_3D(density_masked, smooth_scale, nthreads=args.smooth_threads, tile_size=args.smooth_tile)
     '''print('Calculating velocity dispersions', str(datetime.datetime.now()))
     sig_x_masked = (vx_masked - smooth_vx)**2.
     sig_y_masked = (vy_masked - smooth_vy)**2.
@@ -4570,28 +4545,36 @@ if __name__ == "__main__":
     if (len(outs)>1) and ('time' not in args.plot):
         save_dir += 'Movie_frames/'
 
+    # Skip snapshots that are already done for this plot and these arguments if --skip_existing is
+    # specified. Only plots made one snapshot at a time mark snapshots as done.
+    plot_task = task_name(args.plot, args, ignore=['output', 'output_step', 'nproc', 'system', 'pwd', \
+      'copy_to_tmp', 'skip_existing'])
+    if (args.skip_existing):
+        outs = [snap for snap in outs if not (is_done(save_dir, snap, plot_task))]
+
+    target_dir = None
     if (args.plot=='pressure_vs_radius'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                pressures_vs_radius(outs[i])
+                plot_and_mark_done(pressures_vs_radius, outs[i])
         else:
-            target = pressures_vs_radius
+            target = partial(plot_and_mark_done, pressures_vs_radius)
             target_dir = 'pressures_vs_radius'
     elif (args.plot=='pressure_vs_time'):
         pressures_vs_time(outs)
     elif (args.plot=='force_vs_radius'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                forces_vs_radius(outs[i])
+                plot_and_mark_done(forces_vs_radius, outs[i])
         else:
-            target = forces_vs_radius
+            target = partial(plot_and_mark_done, forces_vs_radius)
             target_dir = 'forces_vs_radius'
     elif (args.plot=='force_vs_radius_pres'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                forces_vs_radius_from_med_pressures(outs[i])
+                plot_and_mark_done(forces_vs_radius_from_med_pressures, outs[i])
         else:
-            target = forces_vs_radius_from_med_pressures
+            target = partial(plot_and_mark_done, forces_vs_radius_from_med_pressures)
     elif (args.plot=='force_vs_time'):
         forces_vs_time(outs)
     elif (args.plot=='work_vs_time'):
@@ -4599,97 +4582,97 @@ if __name__ == "__main__":
     elif (args.plot=='support_vs_radius'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                support_vs_radius(outs[i])
+                plot_and_mark_done(support_vs_radius, outs[i])
         else:
-            target = support_vs_radius
+            target = partial(plot_and_mark_done, support_vs_radius)
     elif (args.plot=='velocity_PDF'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                velocity_PDF(outs[i])
+                plot_and_mark_done(velocity_PDF, outs[i])
         else:
-            target = velocity_PDF
+            target = partial(plot_and_mark_done, velocity_PDF)
     elif (args.plot=='pressure_vs_r_shaded') or (args.plot=='pressure_vs_rv_shaded'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                pressure_vs_r_rv_shaded(outs[i])
+                plot_and_mark_done(pressure_vs_r_rv_shaded, outs[i])
         else:
-            target = pressure_vs_r_rv_shaded
+            target = partial(plot_and_mark_done, pressure_vs_r_rv_shaded)
     elif (args.plot=='support_vs_r_shaded') or (args.plot=='support_vs_rv_shaded'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                support_vs_r_rv_shaded(outs[i])
+                plot_and_mark_done(support_vs_r_rv_shaded, outs[i])
         else:
-            target = support_vs_r_rv_shaded
+            target = partial(plot_and_mark_done, support_vs_r_rv_shaded)
     elif (args.plot=='force_vs_r_shaded') or (args.plot=='force_vs_rv_shaded'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                force_vs_r_rv_shaded(outs[i])
+                plot_and_mark_done(force_vs_r_rv_shaded, outs[i])
         else:
-            target = force_vs_r_rv_shaded
+            target = partial(plot_and_mark_done, force_vs_r_rv_shaded)
     elif (args.plot=='pressure_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                pressure_slice(outs[i])
+                plot_and_mark_done(pressure_slice, outs[i])
         else:
-            target = pressure_slice
+            target = partial(plot_and_mark_done, pressure_slice)
             target_dir = 'pressure_slice'
     elif (args.plot=='support_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                support_slice(outs[i])
+                plot_and_mark_done(support_slice, outs[i])
         else:
-            target = support_slice
+            target = partial(plot_and_mark_done, support_slice)
     elif (args.plot=='velocity_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                velocity_slice(outs[i])
+                plot_and_mark_done(velocity_slice, outs[i])
         else:
-            target = velocity_slice
+            target = partial(plot_and_mark_done, velocity_slice)
             target_dir = 'velocity_slice'
     elif (args.plot=='vorticity_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vorticity_slice(outs[i])
+                plot_and_mark_done(vorticity_slice, outs[i])
         else:
-            target = vorticity_slice
+            target = partial(plot_and_mark_done, vorticity_slice)
     elif (args.plot=='force_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                force_slice(outs[i])
+                plot_and_mark_done(force_slice, outs[i])
         else:
-            target = force_slice
+            target = partial(plot_and_mark_done, force_slice)
             target_dir = 'force_slice'
     elif (args.plot=='ion_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                ion_slice(outs[i])
+                plot_and_mark_done(ion_slice, outs[i])
         else:
-            target = ion_slice
+            target = partial(plot_and_mark_done, ion_slice)
             target_dir = 'ion_slice'
     elif (args.plot=='vorticity_direction'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vorticity_direction(outs[i])
+                plot_and_mark_done(vorticity_direction, outs[i])
         else:
-            target = vorticity_direction
+            target = partial(plot_and_mark_done, vorticity_direction)
     elif (args.plot=='force_rays'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                force_rays(outs[i])
+                plot_and_mark_done(force_rays, outs[i])
         else:
-            target = force_rays
+            target = partial(plot_and_mark_done, force_rays)
     elif (args.plot=='turbulent_spectrum'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                Pk_turbulence(outs[i])
+                plot_and_mark_done(Pk_turbulence, outs[i])
         else:
-            target = Pk_turbulence
+            target = partial(plot_and_mark_done, Pk_turbulence)
     elif (args.plot=='turbulence_compare'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                turbulence_compare(outs[i])
+                plot_and_mark_done(turbulence_compare, outs[i])
         else:
-            target = turbulence_compare
+            target = partial(plot_and_mark_done, turbulence_compare)
     elif (args.plot=='visualization'):
         for i in range(len(outs)):
             turbulence_visualization(outs[i])
@@ -4697,48 +4680,19 @@ if __name__ == "__main__":
         sys.exit("That plot type hasn't been implemented!")
 
     if (args.nproc!=1):
-        skipped_outs = outs
-        while (len(skipped_outs)>0):
-            skipped_outs = []
-            # Split into a number of groupings equal to the number of processors
-            # and run one process per processor
-            for i in range(len(outs)//args.nproc):
-                threads = []
-                snaps = []
-                for j in range(args.nproc):
-                    snap = outs[args.nproc*i+j]
-                    snaps.append(snap)
-                    threads.append(multi.Process(target=target, args=[snap]))
-                for t in threads:
-                    t.start()
-                for t in threads:
-                    t.join()
-                # Delete leftover outputs from failed processes from tmp directory if on pleiades
-                if (args.system=='pleiades_cassi'):
-                    for s in range(len(snaps)):
-                        if (os.path.exists('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])):
-                            print('Deleting failed %s from /tmp' % (snaps[s]))
-                            skipped_outs.append(snaps[s])
-                            shutil.rmtree('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])
-            # For any leftover snapshots, run one per processor
-            threads = []
-            snaps = []
-            for j in range(len(outs)%args.nproc):
-                snap = outs[-(j+1)]
-                snaps.append(snap)
-                threads.append(multi.Process(target=target, args=[snap]))
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-            # Delete leftover outputs from failed processes from tmp directory if on pleiades
-            if (args.system=='pleiades_cassi'):
-                for s in range(len(snaps)):
-                    if (os.path.exists('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])):
-                        print('Deleting failed %s from /tmp' % (snaps[s]))
-                        skipped_outs.append(snaps[s])
-                        shutil.rmtree('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])
-            outs = skipped_outs
+        # Snapshots that fail on pleiades leave their copy behind in the tmp directory
+        def tmp_dir(snap):
+            return '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        def failed_snap(snap):
+            return (args.system=='pleiades_cassi') and (target_dir!=None) and (os.path.exists(tmp_dir(snap)))
+        # Delete leftover outputs from failed processes from tmp directory so they can be retried
+        def clean_tmp(snap):
+            if (failed_snap(snap)):
+                print('Deleting failed %s from /tmp' % (snap))
+                shutil.rmtree(tmp_dir(snap))
+        # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+        run_snapshots(target, outs, nproc=args.nproc, snap_dir=lambda snap: foggie_dir + run_dir + snap, \
+          failed=failed_snap, cleanup=clean_tmp, retries=3, log_file=save_dir + args.plot + '_log' + save_suffix + '.txt')
 
     '''if (args.nproc!=1):
         # Split into a number of groupings equal to the number of processors
@@ -13,6 +13,8 @@ utils/get_halo_center.py
 utils/get_proper_box_size.py
 utils/get_run_loc_etc.py
 utils/yt_fields.py
+utils/shell_stats.py
+utils/snapshot_scheduler.py
 """
 
 # Import everything as needed
@@ -28,12 +30,10 @@ import glob
 import sys
 from astropy.table import Table
 from astropy.io import ascii
-import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 from scipy.optimize import curve_fit
 import scipy.special as sse
-import shutil
 import ast
 import trident
 import matplotlib.pyplot as plt
@@ -47,6 +47,9 @@ from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
 from foggie.utils.analysis_utils import *
+from foggie.utils.shell_stats import *
+from foggie.utils.snapshot_scheduler import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot, prefetch_snapshot
 
 def parse_args():
     '''Parse command line arguments. Returns args object.
@@ -206,6 +209,10 @@ def parse_args():
                         help='Do you want to append a string onto the names of the saved files? Default is no.')
     parser.set_defaults(save_suffix="")
 
+    parser.add_argument('--skip_existing', dest='skip_existing', action='store_true',
+                        help='Do you want to skip any snapshots that already have saved statistics tables? Default is no.')
+    parser.set_defaults(skip_existing=False)
+
     parser.add_argument('--refined_only', dest='refined_only', action='store_true', \
                         help='Do you want to calculate totals of only those cells refined to at least\n' + \
                         'level 9? This enforces only the refine box is used for volumes that are partially\n' + \
@@ -414,41 +421,31 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
     G = 6.673e-8
 
     stats = []
-    stat_filename = ''
     if ('temperature' in stat_types):
         stats.append('log_temperature')
-        stat_filename += '_temperature'
     if ('pressure' in stat_types):
         stats.append('log_pressure')
-        stat_filename += '_pressure'
     if ('density' in stat_types):
         stats.append('log_density')
-        stat_filename += '_density'
     if ('energy' in stat_types):
         stats.append('thermal_energy')
         stats.append('kinetic_energy')
         stats.append('potential_energy')
         stats.append('total_energy')
         stats.append('virial_energy')
-        stat_filename += '_energy'
     if ('entropy' in stat_types):
         stats.append('log_entropy')
-        stat_filename += '_entropy'
     if ('metallicity' in stat_types):
         stats.append('log_metallicity')
-        stat_filename += '_metallicity'
     if ('velocity' in stat_types):
         stats.append('theta_velocity')
         stats.append('phi_velocity')
         stats.append('tangential_velocity')
         stats.append('radial_velocity')
-        stat_filename += '_velocity'
     if ('grav_pot' in stat_types):
         stats.append('grav_pot')
-        stat_filename += '_grav'
     if ('tcool' in stat_types):
         stats.append('tcool')
-        stat_filename += '_tcool'
 
     # Define list of ways to chunk up the shape over radius or height
     if (shape_args[0][0]=='cylinder'):
@@ -668,8 +665,8 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             fields[i] = fields[i][(rad_vel>0.5*vff) & (rad_vel < vesc)]
         rad_vel = rad_vel[(rad_vel>0.5*vff) & (rad_vel < vesc)]
 
+    looper = region_loops(args.region_filter)
     if (args.region_filter=='velocity'):
-        looper = ['low_v','mid_v','high_v']
         radius_orig = radius
         rad_vel_orig = rad_vel
         temperature_orig = temperature
@@ -680,7 +677,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
         for i in range(len(fields)):
             fields_orig.append(fields[i])
     elif (args.region_filter=='metallicity'):
-        looper = ['low_Z','mid_Z','high_Z']
         radius_orig = radius
         rad_vel_orig = rad_vel
         temperature_orig = temperature
@@ -689,8 +685,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
         fields_orig = []
         for i in range(len(fields)):
             fields_orig.append(fields[i])
-    else:
-        looper = ['none']
     if (args.temp_cut): temps = [0.,4.,5.,6.,12.]
     else: temps = [0.]
 
@@ -703,7 +697,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][rad_vel_orig < 0.5*vff_orig])
             rad_vel = rad_vel_orig[rad_vel_orig < 0.5*vff_orig]
-            stat_filename_reg = stat_filename + '_low-v'
         if (loop=='mid_v'):
             radius = radius_orig[(rad_vel_orig>0.5*vff_orig) & (rad_vel_orig < vesc_orig)]
             temperature = temperature_orig[(rad_vel_orig>0.5*vff_orig) & (rad_vel_orig < vesc_orig)]
@@ -712,7 +705,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][(rad_vel_orig>0.5*vff_orig) & (rad_vel_orig < vesc_orig)])
             rad_vel = rad_vel_orig[(rad_vel_orig>0.5*vff_orig) & (rad_vel_orig < vesc_orig)]
-            stat_filename_reg = stat_filename + '_mid-v'
         if (loop=='high_v'):
             radius = radius_orig[rad_vel_orig > vesc_orig]
             temperature = temperature_orig[rad_vel_orig > vesc_orig]
@@ -721,7 +713,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][rad_vel_orig > vesc_orig])
             rad_vel = rad_vel_orig[rad_vel_orig > vesc_orig]
-            stat_filename_reg = stat_filename + '_high-v'
         if (loop=='low_Z'):
             radius = radius_orig[Z_orig < 0.01]
             temperature = temperature_orig[Z_orig < 0.01]
@@ -730,7 +721,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][Z_orig < 0.01])
             rad_vel = rad_vel_orig[Z_orig < 0.01]
-            stat_filename_reg = stat_filename + '_low-Z'
         if (loop=='mid_Z'):
             radius = radius_orig[(Z_orig > 0.01) & (Z_orig < 1.)]
             temperature = temperature_orig[(Z_orig > 0.01) & (Z_orig < 1.)]
@@ -739,7 +729,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][(Z_orig > 0.01) & (Z_orig < 1.)])
             rad_vel = rad_vel_orig[(Z_orig > 0.01) & (Z_orig < 1.)]
-            stat_filename_reg = stat_filename + '_mid-Z'
         if (loop=='high_Z'):
             radius = radius_orig[Z_orig > 1.]
             temperature = temperature_orig[Z_orig > 1.]
@@ -748,9 +737,6 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             for i in range(len(fields_orig)):
                 fields.append(fields_orig[i][Z_orig > 1.])
             rad_vel = rad_vel_orig[Z_orig > 1.]
-            stat_filename_reg = stat_filename + '_high-Z'
-        if (loop=='none'):
-            stat_filename_reg = stat_filename
 
         if (shape_args[0][0]=='cylinder'):
             table = make_table(stats, ['cylinder', shape_args[0][7]])
@@ -761,47 +747,42 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
             if (args.pdf):
                 table_pdf = make_pdf_table(stats, ['sphere', 0])
 
-        # Loop over chunks and compute stats to add to table
+        # Assign every cell to its (chunk, direction, temperature) groups once, then compute the
+        # statistics of every field for all groups at once
+        print('Computing stats for ' + str(len(chunks)-1) + ' chunks for snapshot ' + snap)
+        cell_index, group_index, n_groups = shell_group_index(radius, np.array(chunks, dtype=float), rad_vel, temperature, temps)
+        weights_groups = weights[cell_index]
+        field_stats = []
+        for i in range(len(fields)):
+            if (args.pdf) or (args.vel_fit):
+                field_stats.append(grouped_stats(fields[i][cell_index], weights_groups, group_index, n_groups, \
+                  quantiles=[0.25,0.5,0.75], hist_range=x_ranges[i]))
+            else:
+                field_stats.append(grouped_stats(fields[i][cell_index], weights_groups, group_index, n_groups, \
+                  quantiles=[0.25,0.5,0.75]))
+
+        # Loop over chunks and add the stats to the table
         # Index r is for radial/height chunk, index i is for the property we're computing stats for,
         # index j is for net, in, or out, and index k is for temperature, net, cold, cool, warm, hot
         for r in range(len(chunks)-1):
-            if (r%10==0): print("Computing chunk " + str(r) + "/" + str(len(chunks)) + \
-                                " for snapshot " + snap)
             inner = chunks[r]
             outer = chunks[r+1]
             row = [zsnap, inner, outer]
             if (args.pdf):
                 pdf_array = []
-            bool_r = (radius > inner) & (radius < outer)
-            rad_vel_r = rad_vel[bool_r]
-            temp_r = temperature[bool_r]
-            weights_r = weights[bool_r]
             for i in range(len(fields)):
-                field = fields[i]
-                field_r = field[bool_r]
                 for j in range(3):
-                    if (j==0): bool_vel = np.ones(len(field_r), dtype=bool)
-                    if (j==1): bool_vel = (rad_vel_r < 0.)
-                    if (j==2): bool_vel = (rad_vel_r > 0.)
-                    field_v = field_r[bool_vel]
-                    temp_v = temp_r[bool_vel]
-                    weights_v = weights_r[bool_vel]
                     if (args.vel_fit) and (stats[i]=='tangential_velocity') and (j==0):
                         sig_tan = []
                     for k in range(len(temps)):
-                        if (k==0):
-                            bool_temp = (temp_v > 0.)
-                        else:
-                            bool_temp = (temp_v > temps[k-1]) & (temp_v < temps[k])
-                        field_t = field_v[bool_temp]
-                        weights_t = weights_v[bool_temp]
+                        g = shell_group_id(r, j, k, len(temps))
                         if (args.pdf) and (j==0) and (k==0):
-                            if (len(field_t)>0):
-                                hist, bin_edges = np.histogram(field_t, weights=weights_t, bins=(200), range=x_ranges[i], density=True)
+                            if (field_stats[i]['count'][g]>0):
+                                bin_edges = field_stats[i]['bin_edges']
                                 pdf_array.append(bin_edges[:-1])
                                 pdf_array.append(bin_edges[1:])
-                                pdf_array.append(hist)
-                        if (len(field_t)==0):
+                                pdf_array.append(field_stats[i]['pdf'][g])
+                        if (field_stats[i]['count'][g]==0):
                             row.append(0.)
                             row.append(0.)
                             row.append(0.)
@@ -824,17 +805,19 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
                                     pdf_array.append(np.zeros(200))
                                     pdf_array.append(np.zeros(200))
                         else:
-                            quantiles = weighted_quantile(field_t, weights_t, np.array([0.25,0.5,0.75]))
+                            quantiles = field_stats[i]['quantiles'][g]
                             row.append(quantiles[1])
                             row.append(quantiles[2]-quantiles[0])
-                            avg, std = weighted_avg_and_std(field_t, weights_t)
+                            avg = field_stats[i]['avg'][g]
+                            std = field_stats[i]['std'][g]
                             row.append(avg)
                             row.append(std)
                             if (args.pdf) and (j+k>0):
-                                hist, bins = np.histogram(field_t, weights=weights_t, bins=(200), range=x_ranges[i], density=True)
+                                hist = field_stats[i]['pdf'][g]
                                 pdf_array.append(hist)
                             if (args.vel_fit) and ('velocity' in stats[i]) and (j==0):
-                                hist_vel, bins_vel = np.histogram(field_t, weights=weights_t, bins=(200), range=x_ranges[i], density=True)
+                                hist_vel = field_stats[i]['pdf'][g]
+                                bins_vel = field_stats[i]['bin_edges']
                                 bin_centers = np.diff(bins_vel) + bins_vel[:-1]
                                 if (stats[i]=='radial_velocity') and (args.region_filter!='velocity'):
                                     guesses = [0., sig_tan[k], hist_vel[np.where(bin_centers>=0.)[0][0]]]
@@ -892,7 +875,7 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
                                             row.append(0.)
                                             row.append(0.)
                                 else:
-                                    guesses = [avg, std, np.max(hist)]
+                                    guesses = [avg, std, np.max(hist_vel)]
                                     try:
                                         params, cov = curve_fit(gauss, bin_centers, hist_vel, p0=guesses)
                                         if (stats[i]=='tangential_velocity'): sig_tan.append(params[1])
@@ -917,19 +900,46 @@ def calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_
         if (args.pdf): table_pdf = set_table_units(table_pdf)
 
         # Save to file
-        if (sat_radius!=0.):
-            table.write(tablename + '_nosat' + stat_filename_reg + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-        else:
-            table.write(tablename + stat_filename_reg + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
+        table.write(stat_table_name(tablename, save_suffix, stat_types, sat_radius, region=loop), \
+          path='all_data', serialize_meta=True, overwrite=True)
         if (args.pdf):
-            if (sat_radius!=0.):
-                table_pdf.write(tablename + '_nosat' + stat_filename_reg + '_pdf' + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-            else:
-                table_pdf.write(tablename + stat_filename_reg + '_pdf' + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
+            table_pdf.write(stat_table_name(tablename, save_suffix, stat_types, sat_radius, region=loop, pdf=True), \
+              path='all_data', serialize_meta=True, overwrite=True)
 
     return "Stats have been calculated for snapshot " + snap + "!"
 
 
+def region_loops(region_filter):
+    '''Returns the list of regions that calc_stats splits the gas into for the region filter
+    'region_filter', writing one table for each.'''
+
+    if (region_filter=='velocity'):
+        return ['low_v','mid_v','high_v']
+    elif (region_filter=='metallicity'):
+        return ['low_Z','mid_Z','high_Z']
+    else:
+        return ['none']
+
+def stat_table_name(tablename, save_suffix, stat_types, sat_radius, region='none', pdf=False):
+    '''Returns the name of the file that calc_stats writes for the table name 'tablename' with
+    'save_suffix' appended, the list of statistics types 'stat_types', the satellite radius
+    'sat_radius', and the region 'region' (one of those returned by region_loops). If 'pdf' is True,
+    returns the name of the file the PDFs are written to instead. Both calc_stats and --skip_existing
+    use this, so they always agree on the file names.'''
+
+    stat_filename = ''
+    for stat_type, name in [['temperature', '_temperature'], ['pressure', '_pressure'], ['density', '_density'], \
+                            ['energy', '_energy'], ['entropy', '_entropy'], ['metallicity', '_metallicity'], \
+                            ['velocity', '_velocity'], ['grav_pot', '_grav'], ['tcool', '_tcool']]:
+        if (stat_type in stat_types): stat_filename += name
+    region_names = {'low_v':'_low-v', 'mid_v':'_mid-v', 'high_v':'_high-v', \
+                    'low_Z':'_low-Z', 'mid_Z':'_mid-Z', 'high_Z':'_high-Z', 'none':''}
+    stat_filename += region_names[region]
+
+    if (sat_radius!=0.): tablename = tablename + '_nosat'
+    if (pdf): return tablename + stat_filename + '_pdf' + save_suffix + '.hdf5'
+    return tablename + stat_filename + save_suffix + '.hdf5'
+
 def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablename, save_suffix, shape_args, stat_types, sat_dir, sat_radius, masses_dir):
     '''This function loads a specified snapshot 'snap' located in the 'run_dir' within the
     'foggie_dir', the halo track 'track', the name of the halo_c_v file, the name of the snapshot,
@@ -938,12 +948,9 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     does the calculation on the loaded snapshot.'''
 
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    # Copy output to temp directory if on pleiades
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
 
     # Load the snapshot depending on if disk minor axis is needed
     for i in range(len(shape_args)):
@@ -977,10 +984,9 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     message = calc_stats(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_args, \
       stat_types, sat=sat, sat_radius=sat_radius, Menc_profile=Menc_profile, inverse=args.inverse, disk=disk, weight_field=args.stat_weight, Rvir=Rvir)
 
-    # Delete output from temp directory if on pleiades
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
     print(message)
 
@@ -1036,41 +1042,37 @@ if __name__ == "__main__":
             print('The property   %s   has not been implemented. Ask Cassi to add it.' % (stat_types[i]))
             sys.exit()
 
+    # Skip snapshots that already have all the output tables for these arguments if --skip_existing is specified
+    def skip_snap(snap):
+        table_names = []
+        for region in region_loops(args.region_filter):
+            table_names.append(stat_table_name(prefix + snap + '_stats', save_suffix, stat_types, sat_radius, region=region))
+            if (args.pdf):
+                table_names.append(stat_table_name(prefix + snap + '_stats', save_suffix, stat_types, sat_radius, \
+                  region=region, pdf=True))
+        return (args.skip_existing) and (all([os.path.exists(table_name) for table_name in table_names]))
+
+    # Stage the next snapshot to local disk in the background while the current one is analyzed
+    def prefetch_snap(snap):
+        if (staging_enabled(args.system)): prefetch_snapshot(foggie_dir + run_dir + snap)
+
     # Loop over outputs, for either single-processor or parallel processor computing
     if (args.nproc==1):
         for i in range(len(outs)):
             snap = outs[i]
+            if (skip_snap(snap)): continue
+            if (i+1 < len(outs)): prefetch_snap(outs[i+1])
             # Make the output table name for this snapshot
             tablename = prefix + snap + '_stats'
             # Do the actual calculation
             load_and_calculate(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
               tablename, save_suffix, shapes, stat_types, sat_dir, sat_radius, masses_dir)
     else:
-        # Split into a number of groupings equal to the number of processors
-        # and run one process per processor
-        for i in range(len(outs)//args.nproc):
-            threads = []
-            for j in range(args.nproc):
-                snap = outs[args.nproc*i+j]
-                tablename = prefix + snap + '_stats'
-                threads.append(multi.Process(target=load_and_calculate, \
-			       args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                     tablename, save_suffix, shapes, stat_types, sat_dir, sat_radius, masses_dir)))
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-        # For any leftover snapshots, run one per processor
-        threads = []
-        for j in range(len(outs)%args.nproc):
-            snap = outs[-(j+1)]
-            tablename = prefix + snap + '_stats'
-            threads.append(multi.Process(target=load_and_calculate, \
-			   args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                 tablename, save_suffix, shapes, stat_types, sat_dir, sat_radius, masses_dir)))
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+        # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+        run_snapshots(load_and_calculate, outs, nproc=args.nproc, \
+          args_for=lambda snap: (args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
+            prefix + snap + '_stats', save_suffix, shapes, stat_types, sat_dir, sat_radius, masses_dir), \
+          snap_dir=lambda snap: foggie_dir + run_dir + snap, \
+          skip=skip_snap, prefetch=prefetch_snap, log_file=prefix + 'stats_log' + save_suffix + '.txt')
 
     print("All snapshots finished!")
@@ -14,6 +14,8 @@ utils/get_run_loc_etc.py
 utils/yt_fields.py
 utils/foggie_load.py
 utils/analysis_utils.py
+utils/shell_stats.py
+utils/snapshot_scheduler.py
 """
 
 # Import everything as needed
@@ -29,12 +31,10 @@ import glob
 import sys
 from astropy.table import Table
 from astropy.io import ascii
-import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 from scipy.optimize import curve_fit
 import scipy.special as sse
-import shutil
 import ast
 import trident
 
@@ -47,6 +47,9 @@ from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
 from foggie.utils.analysis_utils import *
+from foggie.utils.shell_stats import *
+from foggie.utils.snapshot_scheduler import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot, prefetch_snapshot
 
 def parse_args():
     '''Parse command line arguments. Returns args object.
@@ -189,6 +192,10 @@ def parse_args():
                         help='Do you want to append a string onto the names of the saved files? Default is no.')
     parser.set_defaults(save_suffix="")
 
+    parser.add_argument('--skip_existing', dest='skip_existing', action='store_true',
+                        help='Do you want to skip any snapshots that already have saved totals tables? Default is no.')
+    parser.set_defaults(skip_existing=False)
+
     parser.add_argument('--refined_only', dest='refined_only', action='store_true', \
                         help='Do you want to calculate totals of only those cells refined to at least\n' + \
                         'level 9? This enforces only the refine box is used for volumes that are partially\n' + \
@@ -263,13 +270,10 @@ def calc_totals(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape
     or the kinetic energies will be calculated relative to the disk directions.'''
 
     totals = []
-    total_filename = ''
     if ('mass' in total_types):
         totals.append('mass')
-        total_filename += '_mass'
     if ('volume' in total_types):
         totals.append('volume')
-        total_filename += '_volume'
     if ('energy' in total_types):
         totals.append('thermal_energy')
         totals.append('kinetic_energy')
@@ -279,7 +283,6 @@ def calc_totals(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape
         totals.append('total_energy')
         totals.append('virial_energy')
         totals.append('cooling_energy_rate')
-        total_filename += '_energy'
 
     # Define list of ways to chunk up the shape over radius or height
     if (shape_args[0][0]=='cylinder'):
@@ -448,60 +451,56 @@ def calc_totals(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape
     if (args.temp_cut_Tvir):
         temps = np.concatenate(([0],np.log10(10**(np.arange(-1.,1.25,0.25))*Tvir),[12]))
     else: temps = [0.]
-    # Index r is for radial/height chunk, index i is for the property we're computing stats for,
-    # index j is for net, in, or out, and index k is for temperature, net, cold, cool, warm, hot
-    for r in range(len(chunks)-1):
-        if (r%10==0): print("Computing chunk " + str(r) + "/" + str(len(chunks)) + \
-                            " for snapshot " + snap)
-        inner = chunks[r]
-        outer = chunks[r+1]
-        row = [zsnap, inner, outer]
-        bool_r = (radius > inner) & (radius < outer)
-        rad_vel_r = rad_vel[bool_r]
-        temp_r = temperature[bool_r]
-        if (args.vel_cut):
-            center = 0.5*(inner + outer)
-            rho = Menc_profile(center)*gtoMsun/((center*1000*cmtopc)**3.) * 3./(4.*np.pi)
-            vff = -(center*1000*cmtopc)/np.sqrt(3.*np.pi/(32.*G*rho))/1e5
-            vesc = np.sqrt(2.*G*Menc_profile(center)*gtoMsun/(center*1000.*cmtopc))/1e5
-            temp_r = temp_r[(rad_vel_r > 0.5*vff)]
-            rad_vel_cut_r = rad_vel_r[(rad_vel_r > 0.5*vff)]
-        else:
-            rad_vel_cut_r = rad_vel_r
+    chunk_edges = np.array(chunks, dtype=float)
+    n_chunks = len(chunk_edges)-1
+    if (args.vel_cut):
+        # Only keep cells with radial velocity above half the free-fall velocity at the center of their chunk
+        center = 0.5*(chunk_edges[:-1] + chunk_edges[1:])
+        rho = Menc_profile(center)*gtoMsun/((center*1000*cmtopc)**3.) * 3./(4.*np.pi)
+        vff = -(center*1000*cmtopc)/np.sqrt(3.*np.pi/(32.*G*rho))/1e5
+        chunk_index = open_bin_index(radius, chunk_edges)
+        bool_vel_cut = (chunk_index >= 0)
+        bool_vel_cut[bool_vel_cut] = rad_vel[bool_vel_cut] > 0.5*vff[chunk_index[bool_vel_cut]]
+        radius = radius[bool_vel_cut]
+        rad_vel = rad_vel[bool_vel_cut]
+        temperature = temperature[bool_vel_cut]
         for i in range(len(fields)):
-            field = fields[i]
-            field_r = field[bool_r]
-            if (args.vel_cut):
-                field_r = field_r[(rad_vel_r > 0.5*vff)]
-            for j in range(3):
-                if (j==0): bool_vel = np.ones(len(field_r), dtype=bool)
-                if (j==1): bool_vel = (rad_vel_cut_r < 0.)
-                if (j==2): bool_vel = (rad_vel_cut_r > 0.)
-                field_v = field_r[bool_vel]
-                temp_v = temp_r[bool_vel]
-                for k in range(len(temps)):
-                    if (k==0):
-                        bool_temp = (temp_v > 0.)
-                    else:
-                        bool_temp = (temp_v > temps[k-1]) & (temp_v < temps[k])
-                    field_t = field_v[bool_temp]
-                    if (len(field_t)==0):
-                        row.append(0.)
-                    else:
-                        row.append(np.sum(field_t))
-        table.add_row(row)
+            fields[i] = fields[i][bool_vel_cut]
+    # Assign every cell to its (chunk, direction, temperature) groups once and sum every field over all groups
+    print('Computing totals for ' + str(n_chunks) + ' chunks for snapshot ' + snap)
+    cell_index, group_index, n_groups = shell_group_index(radius, chunk_edges, rad_vel, temperature, temps)
+    # Index i is for the property we're computing totals for, index j is for net, in, or out,
+    # and index k is for temperature, net, cold, cool, warm, hot
+    columns = [np.full(n_chunks, zsnap), chunk_edges[:-1], chunk_edges[1:]]
+    for i in range(len(fields)):
+        group_totals = grouped_sums(fields[i][cell_index], group_index, n_groups)
+        for j in range(3):
+            for k in range(len(temps)):
+                columns.append(group_totals[shell_group_id(np.arange(n_chunks), j, k, len(temps))])
+    table = Table(columns, names=table.colnames)
 
     table = set_table_units(table)
 
     # Save to file
-    if (sat_radius!=0.):
-        table.write(tablename + '_nosat' + total_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
-    else:
-        table.write(tablename + total_filename + save_suffix + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
+    table.write(total_table_name(tablename, save_suffix, total_types, sat_radius), path='all_data', serialize_meta=True, overwrite=True)
 
     return "Totals have been calculated for snapshot " + snap + "!"
 
 
+def total_table_name(tablename, save_suffix, total_types, sat_radius):
+    '''Returns the name of the file that calc_totals writes for the table name 'tablename' with
+    'save_suffix' appended, the list of total types 'total_types', and the satellite radius 'sat_radius'.
+    Both calc_totals and --skip_existing use this, so they always agree on the file name.'''
+
+    total_filename = ''
+    for total_type in ['mass', 'volume', 'energy']:
+        if (total_type in total_types): total_filename += '_' + total_type
+
+    if (sat_radius!=0.):
+        return tablename + '_nosat' + total_filename + save_suffix + '.hdf5'
+    else:
+        return tablename + total_filename + save_suffix + '.hdf5'
+
 def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablename, save_suffix, shape_args, total_types, sat_dir, sat_radius, masses_dir):
     '''This function loads a specified snapshot 'snap' located in the 'run_dir' within the
     'foggie_dir', the halo track 'track', the name of the halo_c_v file, the name of the snapshot,
@@ -510,12 +509,9 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     does the calculation on the loaded snapshot.'''
 
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    # Copy output to temp directory if on pleiades
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
 
     # Load the snapshot depending on if disk minor axis is needed
     disk = False
@@ -552,10 +548,9 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     message = calc_totals(ds, snap, zsnap, refine_width_kpc, tablename, save_suffix, shape_args, \
       total_types, sat=sat, sat_radius=sat_radius, Menc_profile=Menc_profile, inverse=args.inverse, disk=disk, Rvir=Rvir, Tvir=Tvir)
 
-    # Delete output from temp directory if on pleiades
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
     print(message)
 
@@ -608,41 +603,31 @@ if __name__ == "__main__":
             print('The property   %s   has not been implemented. Ask Cassi to add it.' % (total_types[i]))
             sys.exit()
 
+    # Skip snapshots that already have the output table for these arguments if --skip_existing is specified
+    def skip_snap(snap):
+        return (args.skip_existing) and (os.path.exists(total_table_name(prefix + snap + '_totals', save_suffix, total_types, sat_radius)))
+
+    # Stage the next snapshot to local disk in the background while the current one is analyzed
+    def prefetch_snap(snap):
+        if (staging_enabled(args.system)): prefetch_snapshot(foggie_dir + run_dir + snap)
+
     # Loop over outputs, for either single-processor or parallel processor computing
     if (args.nproc==1):
         for i in range(len(outs)):
             snap = outs[i]
+            if (skip_snap(snap)): continue
+            if (i+1 < len(outs)): prefetch_snap(outs[i+1])
             # Make the output table name for this snapshot
             tablename = prefix + snap + '_totals'
             # Do the actual calculation
             load_and_calculate(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
               tablename, save_suffix, shapes, total_types, sat_dir, sat_radius, masses_dir)
     else:
-        # Split into a number of groupings equal to the number of processors
-        # and run one process per processor
-        for i in range(len(outs)//args.nproc):
-            threads = []
-            for j in range(args.nproc):
-                snap = outs[args.nproc*i+j]
-                tablename = prefix + snap + '_totals'
-                threads.append(multi.Process(target=load_and_calculate, \
-			       args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                     tablename, save_suffix, shapes, total_types, sat_dir, sat_radius, masses_dir)))
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-        # For any leftover snapshots, run one per processor
-        threads = []
-        for j in range(len(outs)%args.nproc):
-            snap = outs[-(j+1)]
-            tablename = prefix + snap + '_totals'
-            threads.append(multi.Process(target=load_and_calculate, \
-			   args=(args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
-                 tablename, save_suffix, shapes, total_types, sat_dir, sat_radius, masses_dir)))
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+        # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+        run_snapshots(load_and_calculate, outs, nproc=args.nproc, \
+          args_for=lambda snap: (args.system, foggie_dir, run_dir, trackname, halo_c_v_name, snap, \
+            prefix + snap + '_totals', save_suffix, shapes, total_types, sat_dir, sat_radius, masses_dir), \
+          snap_dir=lambda snap: foggie_dir + run_dir + snap, \
+          skip=skip_snap, prefetch=prefetch_snap, log_file=prefix + 'totals_log' + save_suffix + '.txt')
 
     print("All snapshots finished!")
@@ -21,7 +21,6 @@ import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 from scipy.interpolate import RegularGridInterpolator
-import shutil
 import ast
 import matplotlib.pyplot as plt
 from scipy.ndimage import uniform_filter
@@ -38,6 +37,7 @@ from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
 from foggie.utils.analysis_utils import *
 
 # These imports for datashader plots
@@ -120,11 +120,8 @@ def parse_args():
 def rendering_rotation(snap):
     '''Loads an output and makes several images of a slowly rotating volume render.'''
 
-    if (args.system=='pleiades_cassi') and (foggie_dir!='/nobackupp18/mpeeples/') and (args.copy_to_tmp):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/') and (args.copy_to_tmp):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name)
@@ -201,6 +198,10 @@ def rendering_rotation(snap):
         sc.save(save_dir + snap + '_' + field_file + "_render_%04i" % frame + save_suffix  + '.png', sigma_clip=2)
         frame += 1
 
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/') and (args.copy_to_tmp):
+        release_snapshot(foggie_dir + run_dir + snap)
+
 def rendering_time(snap):
     '''Makes a volume render of the snapshot in 'snap' of the field 'field_to_render'.'''
 
@@ -17,6 +17,7 @@ from foggie.utils.get_refine_box import get_refine_box
 from foggie.utils.get_halo_center import get_halo_center
 from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils import yt_fields
+from foggie.utils.particle_index import get_particle_index, lookup_particles
 from foggie.satellites.make_satellite_projections import make_projection_plots
 from yt.units import kpc
 
@@ -70,13 +71,12 @@ def parse_args():
     return args
 
 
-def run_tracker(args, anchor_ids, sat, temp_outdir, id_all, x_all, y_all, z_all):
+def run_tracker(args, anchor_ids, sat, temp_outdir, id_all, x_all, y_all, z_all, id_index = None):
     print ('tracking %s %s'%(args.halo, sat))
-    gd_indices = []
     print ('\t', args.halo, sat, 'finding anchor stars..')
-    for a, anchor_id in enumerate(anchor_ids):
-      match = where(id_all == anchor_id)[0]
-      if len(match) > 0: gd_indices.append(int(match))
+    if id_index is None: id_index = get_particle_index(id_all)
+    gd_indices = lookup_particles(id_index, anchor_ids)
+    gd_indices = gd_indices[gd_indices >= 0]
 
     x_anchors =  x_all[gd_indices]
     y_anchors =  y_all[gd_indices]
@@ -192,8 +192,11 @@ if __name__ == '__main__':
         x_all  = all_data['stars', 'particle_position_x'].to('kpc')
         y_all  = all_data['stars', 'particle_position_y'].to('kpc')
         z_all  = all_data['stars', 'particle_position_z'].to('kpc')
+
+        # sorted index of the star IDs, built once per snapshot and shared by all satellites
+        id_index = get_particle_index(id_all, cache_file = temp_outdir + '/' + args.halo + '_' + args.output + '_star_index.npz')
     
-        Parallel(n_jobs = -1)(delayed(run_tracker)(args, anchors[sat]['ids'], sat, temp_outdir, id_all, x_all, y_all, z_all) for sat in anchors.keys())
+        Parallel(n_jobs = -1)(delayed(run_tracker)(args, anchors[sat]['ids'], sat, temp_outdir, id_all, x_all, y_all, z_all, id_index = id_index) for sat in anchors.keys())
 
       else: 
         filter_particles(refine_box)
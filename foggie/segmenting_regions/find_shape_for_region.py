@@ -37,6 +37,7 @@ from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
 
 # These imports for datashader plots
 import datashader as dshader
@@ -394,11 +395,8 @@ if __name__ == "__main__":
         for i in range(len(outs)):
             snap = outs[i]
             snap_name = foggie_dir + run_dir + snap + '/' + snap
-            if (args.system=='pleiades_cassi'):
-                print('Copying directory to /tmp')
-                snap_dir = '/tmp/' + snap
-                shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-                snap_name = snap_dir + '/' + snap
+            if (staging_enabled(args.system)):
+                snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
             ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name)
             print('Filtering dataset')
             box_inflow, box_outflow, box_neither = filter_ds(refine_box)
@@ -421,9 +419,8 @@ if __name__ == "__main__":
                 stacked_radius_outflow += list(radius_outflow)
                 stacked_hist_outflow += list(hist_outflow)
 
-            if (args.system=='pleiades_cassi'):
-                print('Deleting directory from /tmp')
-                shutil.rmtree(snap_dir)
+            if (staging_enabled(args.system)):
+                release_snapshot(foggie_dir + run_dir + snap)
         print('Dataset(s) stacked and filtered. Finding best ellipses')
         if (args.region=='filament') or (args.region=='both'):
             region_params_inflow = find_regions(stacked_theta_inflow, stacked_phi_inflow, stacked_radius_inflow, stacked_hist_inflow, \
@@ -105,135 +105,169 @@ class hilbert_state():
 		j+=1
 		yield vertex, self.descend(j)
 
-class oct_object():
-	def __init__(self, is_leaf, fcoords, fwidth, level, oct_id, child_oct_ids, fields = None):
-		self.is_leaf = is_leaf	#2 x 2 x 2
-		self.fcoords = fcoords  #2 x 2 x 2
-		self.octcen = mean(self.fcoords, axis = 0) #3 x 1
-		self.fwidth = fwidth #2 x 2 x 2
-		self.le = fcoords - 0.5*fwidth #2 x 2 x 2
-		self.re = fcoords + 0.5*fwidth #2 x 2 x 2
-		self.child_oct_ids = child_oct_ids #2 x 2 x 2
-		self.n_refined_visited = 0
-		self.n_leaf = len(where(self.is_leaf == True)[0])
-		self.n_refined = len(where(self.is_leaf == False)[0])
-		self.level = level
-		self.child_level = self.level + 1
-		self.oct_id = int(oct_id)
-		self.fields = fields		
-
-def recursive_generate_oct_list(oct_list, current_oct_id, current_level, mask_arr, fcoords, fwidth, oct_loc, octs_dic):
-	current_oct_id = int(current_oct_id)
-	mask_i = mask_arr[:,:,:, current_oct_id]
-	fcoords_ix, fcoords_iy, fcoords_iz = fcoords[:,:,:, current_oct_id, 0],  fcoords[:,:,:, current_oct_id, 1], fcoords[:,:,:, current_oct_id, 2]
-	fwidth_ix, fwidth_iy, fwidth_iz = fwidth[:,:,:, current_oct_id, 0],  fwidth[:,:,:, current_oct_id, 1], fwidth[:,:,:, current_oct_id, 2]
-
-	flat_mask = mask_i.ravel(order = 'F')
-	flat_fcoords = array(zip(fcoords_ix.ravel(order = 'F').value[()], fcoords_iy.ravel(order = 'F').value[()], fcoords_iz.ravel(order = 'F').value[()]))
-	flat_fwidth = array(zip(fwidth_ix.ravel(order = 'F').value[()], fwidth_iy.ravel(order = 'F').value[()], fwidth_iz.ravel(order = 'F').value[()]))
-	child_level	= current_level	+ 1
-
-	refined_locations = where(flat_mask == False)[0]
-	nrefined = len(refined_locations)
-	child_oct_ids = nan*zeros(8)
-
-	if nrefined > 0:
-		child_oct_ids_temp = oct_loc[str(child_level)][1][oct_loc[str(child_level)][0]:oct_loc[str(child_level)][0]+nrefined]		
-		oct_loc[str(child_level)][0] += nrefined
-		child_oct_ids[refined_locations] = child_oct_ids_temp
-
-
-
-
-
-	#child_oct_locs = nan*zeros(8)
-	#child_oct_locs[refined_locations] = 1+ arange(len(oct_list), len(oct_list)+nrefined)
-
-
-
-
-	fields = octs_dic['Fields'][:,:,:,:, current_oct_id]
-	fields_all = zeros((fields.shape[0], 8))
-	for field_index in range(fields.shape[0]):
-		fields_all[field_index] = fields[field_index,:,:,:].ravel(order = 'F')
-
-	oct_obj = oct_object(flat_mask, flat_fcoords, flat_fwidth, current_level, current_oct_id, child_oct_ids, fields = fields_all)
-	oct_list[current_oct_id] = oct_obj
-	for n, i in enumerate(refined_locations):
-		recursive_generate_oct_list(oct_list, child_oct_ids[i], child_level, mask_arr, fcoords, fwidth, oct_loc, octs_dic)
-
-def add_preamble(oct_list, levels, fwidth, fcoords, LeftEdge, RightEdge, mask_arr):
-	i = 0	
-	oct_id = -1
-	#We are trying to organize the root oct grid into a root grid of parent octs (8 per higher level oct)
-	while True:
-		#The 8 children for each oct will encode the level
-		good = filter(lambda x: x.level == i, oct_list)
-
-		octcens = [[gd.octcen[0], gd.octcen[1], gd.octcen[2], gd.oct_id] for gd in good]
-		octcens = array(octcens)
-
-		print(i, len(good))
-		if len(good) == 1:
-			#We've reached the root single oct (1 x 1 x 1)
-			return oct_list
-		else:
-			i -= 1
-
-		dimens = int( np.ceil( ( (float(len(good)))**(1.0/3.0) )   /2.) )
-                
-		flat_mask = array([False, False, False, False, False, False, False, False])
-		flat_fwidth  = good[0].fwidth*2
-		delx = 2*flat_fwidth[0,0]
-		oct_list_2 = []
-		for ii in arange(dimens):
-			print(ii, dimens)
-			for jj in arange(dimens):
-				for kk in arange(dimens):
-					le_oct = array([ii, jj, kk])*delx
-					re_oct = le_oct+delx
-					good_in = where((octcens[:,0] < re_oct[0]) & (octcens[:,1] < re_oct[1]) & (octcens[:,2] < re_oct[2]) &
-									(octcens[:,0] > le_oct[0]) & (octcens[:,1] > le_oct[1]) & (octcens[:,2] > le_oct[2]))[0]
-					assert(len(good_in) == 8)
-					flat_fcoords = octcens[good_in,0:3]
-					child_ids = octcens[good_in, 3]
-
-					oct_obj = oct_object(flat_mask, flat_fcoords, flat_fwidth, i, oct_id, child_ids)
-					oct_id-=1
-					oct_list_2.append(oct_obj)
-
-		oct_list = concatenate([oct_list_2[::-1], oct_list])
-
-def OctreeDepthFirstHilbert(oct_list, oct_obj, hilbert, grid_structure, output, field_names, debug = False, f  = 'out.out'):
-	current_level = oct_obj.level
-	child_level = oct_obj.child_level
-	fields = oct_obj.fields
-	parent_oct_le = array([min(oct_obj.le[:,0]), min(oct_obj.le[:,1]), min(oct_obj.le[:,2])])
-	save_to_gridstructure(grid_structure,oct_obj.child_level, np.asarray(oct_obj.octcen-oct_obj.fwidth[0,0]), refined = True, leaf = False)
-	#It's the first time visiting this oct, so let's save 
-	#the oct information here in our grid structure dictionary
-	if debug: f.write('\t'*(current_level+6)+'Entering level %i oct (ID: %i): found %i refined cells and %i leaf cells\n'%(current_level, oct_obj.oct_id, oct_obj.n_refined, oct_obj.n_leaf))
-	for (vertex, hilbert_child) in hilbert:
-		vertex_new = vertex*oct_obj.fwidth[0]
-		next_child_le = parent_oct_le + vertex_new
-		i = where((oct_obj.le[:,0] == next_child_le[0]) & (oct_obj.le[:,1] == next_child_le[1]) & (oct_obj.le[:,2] == next_child_le[2]))[0][0]
-		if oct_obj.is_leaf[i]:
-			#This cell is a leaf, save the grid information and the physical properties
-			if debug:  f.write('\t'*(child_level+6)+str(oct_obj.child_level) + '\tFound a leaf in cell %i/%i \t (x,y,z, vol, mass, density) = (%.8f, %.8f, %.8f, %.8f, %.8f, %.8f) \n'%(i, 8, oct_obj.le[i][0], oct_obj.le[i][1], oct_obj.le[i][2], fields[3,i], fields[0,i], fields[0,i]/fields[3,i]))		
-			save_to_gridstructure(grid_structure, current_level, np.asarray(oct_obj.le[i]), refined = False, leaf = True)							
-			for field_index in range(fields.shape[0]):
-				output[field_names[field_index]].append(fields[field_index,i])
-
-		else:
-			#This cell is not a leaf, we'll now advance in to this cell
-			try:	
-				if debug:  f.write('\t'*(child_level+6)+str(child_level) + '\tFound a refinement in cell %i/%i \t (x,y,z) = (%.8f, %.8f, %.8f, %.8f, %.8f, %.8f) \n'%(i, 8, oct_obj.le[i][0], oct_obj.le[i][1], oct_obj.le[i][2], fields[0,i], fields[0,i]/fields[3,i]))
-			except:
-				if debug:  f.write('\t'*(child_level+6)+str(child_level) + '\tFound a refinement in cell %i/%i \t (x,y,z) = (%.8f, %.8f, %.8f) \n'%(i, 8, oct_obj.le[i][0], oct_obj.le[i][1], oct_obj.le[i][2]))
-
-
-			child_oct_obj = oct_list[int(oct_obj.child_oct_ids[i]-oct_list[0].oct_id)]
-			OctreeDepthFirstHilbert(oct_list, child_oct_obj, hilbert_child, grid_structure, output, field_names, debug, f)
+def hilbert_tables():
+    '''
+    Enumerates every state the Hilbert curve can be in when it enters an oct, starting from the
+    default hilbert_state(). Returns 'cell_order' and 'next_state', both of shape (n_states, 8):
+    cell_order[s, j] is the cell (numbered ix + 2*iy + 4*iz) visited j-th in an oct entered in state s,
+    and next_state[s, j] is the state of the curve when it enters that cell.
+    '''
+    def key(h):
+        return (tuple(h.dim), tuple(h.sgn))
+    states = [hilbert_state()]
+    index = {key(states[0]): 0}
+    cell_order, next_state = [], []
+    s = 0
+    while s < len(states):
+        order, nxt = [], []
+        for vertex, child in states[s]:
+            order.append(int(vertex[0] + 2*vertex[1] + 4*vertex[2]))
+            if key(child) not in index:
+                index[key(child)] = len(states)
+                states.append(child)
+            nxt.append(index[key(child)])
+        cell_order.append(order)
+        next_state.append(nxt)
+        s += 1
+    return np.array(cell_order), np.array(next_state)
+
+def build_octree_arrays(levels, is_leaf, fcoords, fwidth):
+    '''
+    Builds the octree as flat arrays. 'levels' (N,) gives the level of each of the N octs in yt's
+    order, and 'is_leaf' (N, 8), 'fcoords' (N, 8, 3) and 'fwidth' (N, 8, 3) give whether each cell is a
+    leaf, its center and its width, with cells numbered ix + 2*iy + 4*iz.
+
+    The children of the refined cells at level L are the octs at level L+1 in yt's order, handed out
+    in order of the parent oct (in yt's order) and then of the cell within it. Above level 0, parent
+    octs with negative levels are added, 2x2x2 octs at a time, until there is a single root oct.
+
+    Returns a dictionary of arrays with one entry per oct (the N yt octs first, then the added ones):
+    'level', 'child' (M, 8) giving the oct index of each cell's child or -1 for leaf cells, 'octcen'
+    and 'width' (M, 3) giving the oct center and cell width, and 'root', the index of the root oct.
+    '''
+    levels = np.asarray(levels).astype('int64')
+    is_leaf = np.asarray(is_leaf).astype('bool')
+    n_octs = len(levels)
+    child = -np.ones((n_octs, 8), dtype='int64')
+    for level in range(levels.max()):
+        parents = np.where(levels == level)[0]
+        children = np.where(levels == level + 1)[0]
+        parent_row, parent_cell = np.nonzero(~is_leaf[parents])
+        assert len(parent_row) == len(children)
+        child[parents[parent_row], parent_cell] = children
+
+    octcen = [np.mean(fcoords, axis = 1)]
+    width = [fwidth[:, 0, :]]
+    all_levels = [levels]
+    all_child = [child]
+
+    # Group the level-0 octs 2x2x2 at a time into parent octs until there is a single root oct
+    current = np.where(levels == 0)[0]
+    current_cen = octcen[0][current]
+    current_width = width[0][current[0]]
+    current_index = np.rint(current_cen/(2.*current_width) - 0.5).astype('int64')
+    next_id = n_octs
+    level = 0
+    while len(current) > 1:
+        level -= 1
+        parent_index, inverse = np.unique(current_index//2, axis = 0, return_inverse = True)
+        inverse = inverse.ravel()
+        assert np.all(np.bincount(inverse) == 8)
+        local = current_index % 2
+        cell = local[:,0] + 2*local[:,1] + 4*local[:,2]
+        n_parents = len(parent_index)
+        parent_child = -np.ones((n_parents, 8), dtype='int64')
+        parent_child[inverse, cell] = current
+        parent_cen = np.zeros((n_parents, 3))
+        np.add.at(parent_cen, inverse, current_cen/8.)
+        current_width = 2.*current_width
+
+        octcen.append(parent_cen)
+        width.append(np.tile(current_width, (n_parents, 1)))
+        all_levels.append(np.full(n_parents, level, dtype='int64'))
+        all_child.append(parent_child)
+        current = next_id + np.arange(n_parents)
+        current_cen = parent_cen
+        current_index = parent_index
+        next_id += n_parents
+
+    return {'level': np.concatenate(all_levels), 'child': np.concatenate(all_child),
+            'octcen': np.concatenate(octcen), 'width': np.concatenate(width), 'root': current[0]}
+
+def octree_depth_first_hilbert(octree, fcoords, fwidth, cell_fields, field_names):
+    '''
+    Orders the octree built by build_octree_arrays depth-first, visiting the cells of each oct in
+    Hilbert order, and writes out the grid structure and leaf-cell fields in that order. Each oct is
+    listed (as refined) when it is entered, followed by its cells; leaf cells are listed with their
+    fields. 'cell_fields' (n_fields, N, 8) gives the fields of the cells of the N yt octs.
+
+    Instead of recursing, the Hilbert state of every oct is found from its parent one level at a time,
+    then the number of entries under every oct is summed from the deepest level up, and finally the
+    position of every entry in the depth-first list is found from its parent's position and the sizes
+    of the cells visited before it.
+
+    Returns 'output' (a dictionary of leaf field arrays) and 'grid_structure'.
+    '''
+    cell_order, next_state = hilbert_tables()
+    level, child, root = octree['level'], octree['child'], octree['root']
+    n_nodes = len(level)
+    all_levels = np.unique(level)
+    nodes_at = [np.where(level == l)[0] for l in all_levels]
+
+    # Hilbert state of every oct, from the root down
+    state = np.zeros(n_nodes, dtype='int64')
+    for nodes in nodes_at:
+        for j in range(8):
+            cells = cell_order[state[nodes], j]
+            children = child[nodes, cells]
+            refined = children >= 0
+            state[children[refined]] = next_state[state[nodes[refined]], j]
+
+    # Number of entries (the oct itself plus everything below it) under every oct, from the bottom up
+    size = np.ones(n_nodes, dtype='int64')
+    for nodes in nodes_at[::-1]:
+        children = child[nodes]
+        size[nodes] = 1 + np.sum(np.where(children >= 0, size[np.maximum(children, 0)], 1), axis = 1)
+
+    # Position of every entry in the depth-first list, from the root down
+    n_entries = size[root]
+    position = np.zeros(n_nodes, dtype='int64')
+    leaf_position, leaf_node, leaf_cell = [], [], []
+    for nodes in nodes_at:
+        running = position[nodes] + 1
+        for j in range(8):
+            cells = cell_order[state[nodes], j]
+            children = child[nodes, cells]
+            refined = children >= 0
+            position[children[refined]] = running[refined]
+            leaf_position.append(running[~refined])
+            leaf_node.append(nodes[~refined])
+            leaf_cell.append(cells[~refined])
+            running = running + np.where(refined, size[np.maximum(children, 0)], 1)
+    leaf_position = np.concatenate(leaf_position)
+    leaf_node = np.concatenate(leaf_node)
+    leaf_cell = np.concatenate(leaf_cell)
+    order = np.argsort(leaf_position)
+    leaf_position, leaf_node, leaf_cell = leaf_position[order], leaf_node[order], leaf_cell[order]
+
+    grid_structure = {}
+    grid_structure['refined'] = np.zeros(n_entries, dtype='bool')
+    grid_structure['level'] = np.zeros(n_entries, dtype='int64')
+    grid_structure['coords'] = np.zeros((n_entries, 3))
+    grid_structure['refined'][position] = True
+    grid_structure['level'][position] = level + 1
+    grid_structure['coords'][position] = octree['octcen'] - octree['width'][:,0:1]
+    grid_structure['level'][leaf_position] = level[leaf_node]
+    grid_structure['coords'][leaf_position] = fcoords[leaf_node, leaf_cell] - 0.5*fwidth[leaf_node, leaf_cell]
+    grid_structure['level_index'] = []
+    grid_structure['nleafs'] = float(len(leaf_position))
+    grid_structure['nrefined'] = float(n_nodes)
+
+    output = {}
+    for field_index, field in enumerate(field_names):
+        output[field] = cell_fields[field_index, leaf_node, leaf_cell]
+
+    return output, grid_structure
 
 def export_to_sunrise(ds, fn, star_particle_type, fc, fwidth, nocts_wide=None, \
                       debug=False,ad=None,max_level=None, grid_structure_fn = 'grid_structure.npy', no_gas_p = False, form='VELA', **kwargs):
@@ -317,9 +351,9 @@ def export_to_sunrise(ds, fn, star_particle_type, fc, fwidth, nocts_wide=None, \
         elif form=='VELA':
                 output, grid_structure, nrefined, nleafs = prepare_octree(ds,ile,fle=fle,fre=fre, ad=ad,start_level=super_level, debug=debug)
                 
-                output_array = zeros((len(output[output.keys()[0]]), len(output.keys())))
+                output_array = zeros((len(output[list(output.keys())[0]]), len(output.keys())))
                 for i in arange(len(output_array[0])):
-                        output_array[:,i] = output[output.keys()[i]]
+                        output_array[:,i] = output[list(output.keys())[i]]
                 #grid_structure['level']+=6
                 refined = grid_structure['refined']
 
@@ -536,90 +570,23 @@ def prepare_octree(ds, ile, fle=[0.,0.,0.], fre=[1.,1.,1.], ad=None, start_level
                 mask_arr = mask_arr[:,:,:,:]'''
 
                 levels = octn._ires[:,:,:, :]
-                icoords = octn._icoords[:,:,:, :]
                 fcoords = octn._fcoords[:,:,:, :]
                 fwidth = octn._fwidth[:,:,:, :]
-                mask_arr = mask_arr[:,:,:,:]
-
-
-                LeftEdge  = (fcoords[0,0,0,:,:]      - fwidth[0,0,0,:,:]*0.5)
-                RightEdge = (fcoords[-1,-1,-1,:,:]   + fwidth[-1,-1,-1,:,:]*0.5)
-
-
-
-                output = {}
-                for field in fields:
-                        output[field] = []
-
-
-
-
-                #RCS commented out fill_octree_arrays, replaced with the code above
-                octs_dic = {}
-                total_octs = ad.index.total_octs
-                octs_dic['LeftEdge'] = LeftEdge[:,:]
-                octs_dic['dx']       = fwidth[0,0,0,:,0]
-                octs_dic['Level']    = levels[0,0,0,:]
-
-                octs_dic['Fields']    = np.array([ad[f] for f in fields])
-
 
-                #Location of all octrees, at a given level, and a counter
+                #Flatten the 2 x 2 x 2 cells of every oct, numbering cells ix + 2*iy + 4*iz
+                is_leaf = np.transpose(mask_arr, (3,2,1,0)).reshape(total_octs, 8)
+                fcoords = np.transpose(np.asarray(fcoords), (3,2,1,0,4)).reshape(total_octs, 8, 3)
+                fwidth = np.transpose(np.asarray(fwidth), (3,2,1,0,4)).reshape(total_octs, 8, 3)
+                cell_fields = np.array([ad[f] for f in fields])
+                cell_fields = np.transpose(cell_fields.reshape((len(fields), 2, 2, 2, total_octs)), (0,4,3,2,1)).reshape(len(fields), total_octs, 8)
 
-                oct_loc = {}
-                for i in np.arange(max(levels[0,0,0,:])+1):
-                        oct_loc[str(i)] = [0,where(levels[0,0,0,:] == i)[0]]
-                        
-                oct_list = [None for i in arange (total_octs)]
-
-
-                for i in arange(len(oct_loc['0'][1])):
-                        if i%10000 == 0: print(i, len(oct_loc['0'][1]))
-                        current_oct_id = oct_loc['0'][1][oct_loc['0'][0]]
-                        current_level = 0
-                        recursive_generate_oct_list(oct_list, current_oct_id, current_level, mask_arr, fcoords, fwidth, oct_loc, octs_dic)
-                        oct_loc['0'][0]+=1
-
-                #np.save('oct_list_orig.npy', oct_list)
-
-                oct_list = array(oct_list)
-                oct_list_new = add_preamble(oct_list, levels, fwidth, fcoords, LeftEdge, RightEdge, mask_arr)
-
-                #np.save('oct_list.npy', oct_list_new)
-
-                #oct_list_new = np.load('oct_list.npy')
-
-
-
-
-
-                grid_structure                   = {}
-                grid_structure['level']       = []
-                grid_structure['refined']       = []
-                grid_structure['coords']       = []
-                grid_structure['level_index'] = []
-                grid_structure['nleafs']      = 0.
-                grid_structure['nrefined']    = 0.
-
-
-                hs = hilbert_state()
-                oct_obj_init = oct_list_new[0]
-    
-                debug = False    
-
-                outfile = open('debug_hilbert.out', 'w+')
                 a = time.time()
-
-                OctreeDepthFirstHilbert(oct_list_new, oct_obj_init, hs, grid_structure, output, field_names = fields, debug = debug, f = outfile)
+                octree = build_octree_arrays(levels[0,0,0,:], is_leaf, fcoords, fwidth)
+                output, grid_structure = octree_depth_first_hilbert(octree, fcoords, fwidth, cell_fields, fields)
                 b = time.time()
 
-
                 print('DFH: ', int(b-a), 'seconds')
 
-
-                if debug: outfile.close()
-
-
                 return output, grid_structure, grid_structure['nrefined'], grid_structure['nleafs']
 
 def create_fits_file(ds, fn, output, refined, particle_data, fle, fre, no_gas_p = False,form='VELA'):
@@ -667,9 +634,9 @@ def create_fits_file(ds, fn, output, refined, particle_data, fle, fre, no_gas_p
 
     m = 1
     if no_gas_p: m = 0
-    p_gas_zipped = zip(fd['Cellpgascgsx']*m,
-                       fd['Cellpgascgsy']*m,
-                       fd['Cellpgascgsz']*m)
+    p_gas_zipped = np.column_stack((fd['Cellpgascgsx']*m,
+                                    fd['Cellpgascgsy']*m,
+                                    fd['Cellpgascgsz']*m))
 
     col_list.append(pyfits.Column("p_gas", format='3D',
                     array=p_gas_zipped , unit = 'Msun*kpc/yr'))
@@ -827,18 +794,6 @@ def prepare_star_particles(ds,star_type,pos=None,vel=None, age=None, creation_ti
     assert pd_table.data.shape[0]>0
     return pd_table, np.sum(idx)
 
-def save_to_gridstructure(grid_structure, level, fcoords, refined, leaf):
-    '''
-    Function to save grid information
-    '''
-    grid_structure['level'].append(level)
-    grid_structure['refined'].append(refined)
-    grid_structure['coords'].append(fcoords)
-    if leaf:
-        grid_structure['nleafs']+=1
-    if refined:
-        grid_structure['nrefined']+=1
-    return
 
 
 
@@ -14,6 +14,9 @@ utils/get_run_loc_etc.py
 utils/yt_fields.py
 utils/foggie_load.py
 utils/analysis_utils.py
+utils/snapshot_scheduler.py
+utils/structure_function.py
+utils/power_spectrum.py
 """
 
 # Import everything as needed
@@ -29,7 +32,6 @@ import glob
 import sys
 from astropy.table import Table
 from astropy.io import ascii
-import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 from scipy.interpolate import RegularGridInterpolator
@@ -42,8 +44,8 @@ from scipy.ndimage import uniform_filter1d
 import scipy.ndimage as ndimage
 from scipy.interpolate import LinearNDInterpolator
 import copy
+from functools import partial
 import matplotlib.colors as colors
-import random
 
 # These imports are FOGGIE-specific files
 from foggie.utils.consistency import *
@@ -54,6 +56,10 @@ from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
 from foggie.utils.analysis_utils import *
+from foggie.utils.snapshot_scheduler import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
+from foggie.utils.structure_function import *
+from foggie.utils.power_spectrum import *
 
 # These imports for datashader plots
 import datashader as dshader
@@ -132,6 +138,26 @@ def parse_args():
                         'want to plot, use --load_vsf to specify the save_suffix of the file to load from.')
     parser.set_defaults(load_vsf='none')
 
+    parser.add_argument('--vsf_weight', metavar='vsf_weight', type=str, action='store', \
+                        help='If plotting vel_struc_func, do you want to weight pairs of cells by "mass" or "volume"?\n' + \
+                        'Default is none (every pair counts equally).')
+    parser.set_defaults(vsf_weight='none')
+
+    parser.add_argument('--vsf_tree_sep', metavar='vsf_tree_sep', type=float, action='store', \
+                        help='If plotting vel_struc_func, up to what separation in kpc do you want to draw\n' + \
+                        'pairs of cells from a KD-tree instead of at random? Default is 5 kpc.')
+    parser.set_defaults(vsf_tree_sep=5.)
+
+    parser.add_argument('--fft_workers', metavar='fft_workers', type=int, action='store', \
+                        help='If plotting turbulent_spectrum, how many threads do you want each FFT to use?\n' + \
+                        'Default is -1 (all available).')
+    parser.set_defaults(fft_workers=-1)
+
+    parser.add_argument('--memmap_dir', metavar='memmap_dir', type=str, action='store', \
+                        help='If plotting turbulent_spectrum, do you want to keep the gridded fields in\n' + \
+                        'memory-mapped files in this directory instead of in memory? Default is no.')
+    parser.set_defaults(memmap_dir=None)
+
     parser.add_argument('--load_stats', dest='load_stats', action='store_true', \
                         help='If plotting vdisp_vs_radius,\n' + \
                         'do you want to load from file for plotting? This requires the files you need\n' + \
@@ -159,6 +185,12 @@ def parse_args():
                         'run time and reduce weight on IO file system. Default is no.')
     parser.set_defaults(copy_to_tmp=False)
 
+    parser.add_argument('--skip_existing', dest='skip_existing', action='store_true', \
+                        help='Do you want to skip any snapshots that have already finished this plot for these\n' + \
+                        'arguments? Snapshots are marked as finished in save_dir/.done/ once all\n' + \
+                        'of their plots are saved. Default is no.')
+    parser.set_defaults(skip_existing=False)
+
     args = parser.parse_args()
     return args
 
@@ -254,6 +286,13 @@ def make_pdf_table(stat_types):
 
     return table
 
+def plot_and_mark_done(plot_function, snap):
+    '''Makes the plot of the snapshot 'snap' with 'plot_function', then marks the snapshot as done for
+    the plot chosen with --plot and the current arguments so --skip_existing can skip it later.'''
+
+    plot_function(snap)
+    mark_done(save_dir, snap, plot_task)
+
 def velocity_slice(snap):
     '''Plots slices of radial, theta, and phi velocity fields through the center of the halo. The field,
     the smoothed field, and the difference between the field and the smoothed field are all plotted.'''
@@ -263,11 +302,8 @@ def velocity_slice(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    if (args.system=='pleiades_cassi') and (foggie_dir!='/nobackupp18/mpeeples/'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/'):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -330,10 +366,9 @@ def velocity_slice(snap):
         plt.subplots_adjust(bottom=0.15, top=0.97, left=0.04, right=0.97, wspace=0.22)
         plt.savefig(save_dir + snap + '_' + vtypes[i] + '_velocity_slice_x' + save_suffix + '.png')
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi') and (foggie_dir!='/nobackupp18/mpeeples/'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/'):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def vorticity_slice(snap):
     '''Plots a slice of velocity vorticity through the center of the halo.'''
@@ -357,12 +392,9 @@ def vorticity_direction(snap):
     Mvir = rvir_masses['total_mass'][rvir_masses['snapshot']==snap]
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
-    # Copy output to temp directory if on pleiades
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    # Copy output to local scratch disk if staging is on
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -408,14 +440,15 @@ def vorticity_direction(snap):
         plt.subplots_adjust(left=0.095, bottom=0.067, right=0.979, top=0.917, wspace=0.248, hspace=0.286)
         plt.savefig(save_dir + '/' + snap + '_vorticity_direction_r%.1f-%.1fkpc' % (shells[i], shells[i+1]) + save_suffix + '.png')
 
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
+
 def Pk_turbulence(snap):
     '''Plots a turbulent energy power spectrum for the output given in 'snap'.'''
 
-    if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(args.system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name)
@@ -432,29 +465,8 @@ def Pk_turbulence(snap):
     dims = np.array([refine_res, refine_res, refine_res])
     box = ds.covering_grid(level=level, left_edge=left_edge, dims=dims)
 
-    nx, ny, nz = dims
-    nindex_rho = 1./3.
-    Kk = np.zeros((nx//2+1, ny//2+1, nz//2+1))
-
-    for vel in ["vx_corrected", "vy_corrected", "vz_corrected"]:
-        rho = box['density'].v
-        u = box[vel].in_units('cm/s').v
-
-        # do the FFTs -- note that since our data is real, there will be
-        # too much information here.  fftn puts the positive freq terms in
-        # the first half of the axes -- that's what we keep.  Our
-        # normalization has an '8' to account for this clipping to one
-        # octant.
-        ru = np.fft.fftn(rho**nindex_rho * u)[0:nx//2+1, 0:ny//2+1, 0:nz//2+1]
-        ru = 8.0*ru/(nx * ny * nz)
-        k_fft = np.abs(ru)**2
-        Kk += 0.5 * k_fft
-
     # wavenumbers
     L = (right_edge - left_edge).v
-    kx = np.fft.rfftfreq(nx) * nx/L[0]
-    ky = np.fft.rfftfreq(ny) * ny/L[1]
-    kz = np.fft.rfftfreq(nz) * nz/L[2]
 
     # physical limits to the wavenumbers
     kmin = np.min(1./L)
@@ -463,19 +475,14 @@ def Pk_turbulence(snap):
     kbins = np.arange(kmin, kmax, kmin)
     N = len(kbins)
 
-    # bin the Fourier KE into radial kbins
-    kx3d, ky3d, kz3d = np.meshgrid(kx, ky, kz, indexing="ij")
-    k = np.sqrt(kx3d**2 + ky3d**2 + kz3d**2)
-    whichbin = np.digitize(k.flat, kbins)
-    ncount = np.bincount(whichbin)
-    E_spectrum = np.zeros(len(ncount) - 1)
-
-    for n in range(1, len(ncount)):
-        E_spectrum[n - 1] = np.sum(Kk.flat[whichbin == n])
+    # FFT each velocity component, loading it from the covering grid only when it is needed, and bin
+    # the Fourier KE into radial kbins
+    velocities = [lambda vel=vel: box[vel].in_units('cm/s').v for vel in ["vx_corrected", "vy_corrected", "vz_corrected"]]
+    E_spectrum = kinetic_energy_spectrum(box['density'].v, velocities, L, kbins, nindex_rho=1./3., \
+      workers=args.fft_workers, memmap_dir=args.memmap_dir)
 
     k = 0.5 * (kbins[0:N-1] + kbins[1:N])
     l = 1./k
-    E_spectrum = E_spectrum[1:N]
 
     index = np.argmax(E_spectrum)
     kmax = k[index]
@@ -490,6 +497,10 @@ def Pk_turbulence(snap):
 
     plt.savefig(save_dir + snap + '_turbulent_energy_spectrum' + save_suffix + '.pdf')
 
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)):
+        release_snapshot(foggie_dir + run_dir + snap)
+
 def vsf_cubeshift(snap):
     '''I DON'T THINK THIS WORKED PROPERLY. DO NOT USE.
 
@@ -499,11 +510,8 @@ def vsf_cubeshift(snap):
     Rvir = rvir_masses['radius'][rvir_masses['snapshot']==snap][0]
 
     if (args.load_vsf=='none'):
-        if (args.system=='pleiades_cassi') and (foggie_dir!='/nobackupp18/mpeeples/'):
-            print('Copying directory to /tmp')
-            snap_dir = '/tmp/' + snap
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+        if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/'):
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
             snap_name = foggie_dir + run_dir + snap + '/' + snap
         ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -574,10 +582,9 @@ def vsf_cubeshift(snap):
     plt.subplots_adjust(bottom=0.12, top=0.97, left=0.12, right=0.97)
     plt.savefig(save_dir + snap + '_VSF' + save_suffix + '.png')
 
-    # Delete output from temp directory if on pleiades
-    if (args.system=='pleiades_cassi') and (foggie_dir!='/nobackupp18/mpeeples/'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    # Release the staged copy of the output
+    if (staging_enabled(args.system)) and (foggie_dir!='/nobackupp18/mpeeples/'):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def vsf_randompoints(snap):
     '''Calculates and plots the velocity structure function for the snapshot 'snap' by drawing a large
@@ -587,15 +594,13 @@ def vsf_randompoints(snap):
 
     if (args.load_vsf=='none'):
         if (args.system=='pleiades_cassi'):
-            print('Copying directory to /tmp')
+            # Make a dummy directory with the snap name so the script later knows the process running
+            # this snapshot failed if the directory is still there
             snap_dir = '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+            os.makedirs(snap_dir)
             if (args.copy_to_tmp):
-                shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-                snap_name = snap_dir + '/' + snap
+                snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
             else:
-                # Make a dummy directory with the snap name so the script later knows the process running
-                # this snapshot failed if the directory is still there
-                os.makedirs(snap_dir)
                 snap_name = foggie_dir + run_dir + snap + '/' + snap
         else:
             snap_name = foggie_dir + run_dir + snap + '/' + snap
@@ -633,37 +638,31 @@ def vsf_randompoints(snap):
         vz = cgm['vz_corrected'].in_units('km/s').v
         print('Fields loaded')
 
-        # Select random pairs of pixels
-        npairs = int(len(x)/2)
-        ind_A = random.sample(range(len(x)), npairs)
-        ind_B = random.sample(range(len(x)), npairs)
-
-        # Calculate separations and velocity differences
-        sep = np.sqrt((x[ind_A] - x[ind_B])**2. + (y[ind_A] - y[ind_B])**2. + (z[ind_A] - z[ind_B])**2.)
-        vdiff = np.sqrt((vx[ind_A] - vx[ind_B])**2. + (vy[ind_A] - vy[ind_B])**2. + (vz[ind_A] - vz[ind_B])**2.)
+        pos = np.transpose([x, y, z])
+        vel = np.transpose([vx, vy, vz])
+        if (args.vsf_weight=='mass'): weights = cgm['cell_mass'].in_units('Msun').v
+        elif (args.vsf_weight=='volume'): weights = cgm['cell_volume'].in_units('kpc**3').v
+        else: weights = None
+        if (args.region_filter!='none'):
+            labels = np.full(len(x), -1)
+            labels[filter < low] = 0
+            labels[(filter > low) & (filter < high)] = 1
+            labels[filter > high] = 2
+            n_classes = 3
+        else:
+            labels = None
+            n_classes = 0
 
+        # Draw pairs of pixels and find average vdiff in bins of pixel separation, for all pixels and
+        # for each filter class at once
+        sep_bins = np.arange(0.,2.*Rvir+1,1)
+        moments, npairs_bins = vsf_moments(pos, vel, sep_bins, weights=weights, labels=labels, \
+          n_classes=n_classes, orders=[1], tree_max_sep=args.vsf_tree_sep)
+        vsf = moments[0,0]
         if (args.region_filter!='none'):
-            seps_fil = []
-            vdiffs_fil = []
-            for i in range(3):
-                if (i==0): bool = (filter < low)
-                if (i==1): bool = (filter > low) & (filter < high)
-                if (i==2): bool = (filter > high)
-                x_fil = x[bool]
-                y_fil = y[bool]
-                z_fil = z[bool]
-                vx_fil = vx[bool]
-                vy_fil = vy[bool]
-                vz_fil = vz[bool]
-                npairs_fil = int(len(x_fil)/2)
-                ind_A_fil = random.sample(range(len(x_fil)), npairs_fil)
-                ind_B_fil = random.sample(range(len(x_fil)), npairs_fil)
-                sep_fil = np.sqrt((x_fil[ind_A_fil] - x_fil[ind_B_fil])**2. + (y_fil[ind_A_fil] - y_fil[ind_B_fil])**2. + (z_fil[ind_A_fil] - z_fil[ind_B_fil])**2.)
-                vdiff_fil = np.sqrt((vx_fil[ind_A_fil] - vx_fil[ind_B_fil])**2. + (vy_fil[ind_A_fil] - vy_fil[ind_B_fil])**2. + (vz_fil[ind_A_fil] - vz_fil[ind_B_fil])**2.)
-                seps_fil.append(sep_fil)
-                vdiffs_fil.append(vdiff_fil)
-
-        # Find average vdiff in bins of pixel separation and save to file
+            vsf_low, vsf_mid, vsf_high = moments[0,1], moments[0,2], moments[0,3]
+
+        # Save to file
         f = open(save_dir + snap + '_VSF' + save_suffix + '.dat', 'w')
         f.write('# Separation [kpc]   VSF [km/s]')
         if (args.region_filter=='temperature'):
@@ -673,27 +672,9 @@ def vsf_randompoints(snap):
         elif (args.region_filter=='velocity'):
             f.write('   low-v VSF [km/s]   mid-v VSF[km/s]   high-v VSF [km/s]\n')
         else: f.write('\n')
-        sep_bins = np.arange(0.,2.*Rvir+1,1)
-        vsf = np.zeros(len(sep_bins)-1)
-        if (args.region_filter!='none'):
-            vsf_low = np.zeros(len(sep_bins)-1)
-            vsf_mid = np.zeros(len(sep_bins)-1)
-            vsf_high = np.zeros(len(sep_bins)-1)
-            npairs_bins_low = np.zeros(len(sep_bins))
-            npairs_bins_mid = np.zeros(len(sep_bins))
-            npairs_bins_high = np.zeros(len(sep_bins))
-        npairs_bins = np.zeros(len(sep_bins))
         for i in range(len(sep_bins)-1):
-            npairs_bins[i] += len(sep[(sep > sep_bins[i]) & (sep < sep_bins[i+1])])
-            vsf[i] += np.mean(vdiff[(sep > sep_bins[i]) & (sep < sep_bins[i+1])])
             f.write('%.5f              %.5f' % (sep_bins[i], vsf[i]))
             if (args.region_filter!='none'):
-                npairs_bins_low[i] += len(seps_fil[0][(seps_fil[0] > sep_bins[i]) & (seps_fil[0] < sep_bins[i+1])])
-                vsf_low[i] += np.mean(vdiffs_fil[0][(seps_fil[0] > sep_bins[i]) & (seps_fil[0] < sep_bins[i+1])])
-                npairs_bins_mid[i] += len(seps_fil[1][(seps_fil[1] > sep_bins[i]) & (seps_fil[1] < sep_bins[i+1])])
-                vsf_mid[i] += np.mean(vdiffs_fil[1][(seps_fil[1] > sep_bins[i]) & (seps_fil[1] < sep_bins[i+1])])
-                npairs_bins_high[i] += len(seps_fil[2][(seps_fil[2] > sep_bins[i]) & (seps_fil[2] < sep_bins[i+1])])
-                vsf_high[i] += np.mean(vdiffs_fil[2][(seps_fil[2] > sep_bins[i]) & (seps_fil[2] < sep_bins[i+1])])
                 f.write('     %.5f           %.5f          %.5f\n' % (vsf_low[i], vsf_mid[i], vsf_high[i]))
             else:
                 f.write('\n')
@@ -738,8 +719,8 @@ def vsf_randompoints(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def vdisp_vs_radius(snap):
     '''Plots the turbulent velocity dispersion in hot, warm, and cool gas as functions of galactocentric
@@ -754,15 +735,14 @@ def vdisp_vs_radius(snap):
 
     if (not args.load_stats):
         if (args.system=='pleiades_cassi'):
-            print('Copying directory to /tmp')
+            # Make a dummy directory with the snap name so the script later knows the process running
+            # this snapshot failed if the directory is still there
             snap_dir = '/tmp/' + target_dir + '/' + args.halo + '/' + args.run + '/' + snap
+            os.makedirs(snap_dir)
             if (args.copy_to_tmp):
-                shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-                snap_name = snap_dir + '/' + snap
+                snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
             else:
-                # Make a dummy directory with the snap name so the script later knows the process running
-                # this snapshot failed if the directory is still there
-                os.makedirs(snap_dir)
+                snap_name = foggie_dir + run_dir + snap + '/' + snap
         else:
             snap_name = foggie_dir + run_dir + snap + '/' + snap
         ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -925,8 +905,8 @@ def vdisp_vs_radius(snap):
         print("Stats have been calculated and saved to file for snapshot " + snap + "!")
         # Delete output from temp directory if on pleiades
         if (args.system=='pleiades_cassi'):
-            print('Deleting directory from /tmp')
             shutil.rmtree(snap_dir)
+            if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 
     radius_list = 0.5*(stats['inner_radius'] + stats['outer_radius'])
@@ -988,15 +968,14 @@ def vdisp_vs_mass_res(snap):
 
     # Copy output to temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
+            snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -1077,8 +1056,8 @@ def vdisp_vs_mass_res(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def vdisp_vs_spatial_res(snap):
     '''Plots the velocity dispersion as a function of simulation spatial resolution in hot, warm,
@@ -1091,15 +1070,14 @@ def vdisp_vs_spatial_res(snap):
 
     # Copy output to temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
+            snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -1180,8 +1158,8 @@ def vdisp_vs_spatial_res(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 def vdisp_vs_time(snaplist):
     '''Plots the velocity dispersion of hot, warm, and cool gas at 0.3 Rvir as a function of time
@@ -1346,15 +1324,14 @@ def vdisp_slice(snap):
     '''Plots a slice of velocity dispersion.'''
 
     if (args.system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
+        # Make a dummy directory with the snap name so the script later knows the process running
+        # this snapshot failed if the directory is still there
         snap_dir = '/tmp/' + target_dir + '/' + args.halo + '/' + args.run + '/' + snap
+        os.makedirs(snap_dir)
         if (args.copy_to_tmp):
-            shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-            snap_name = snap_dir + '/' + snap
+            snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
         else:
-            # Make a dummy directory with the snap name so the script later knows the process running
-            # this snapshot failed if the directory is still there
-            os.makedirs(snap_dir)
+            snap_name = foggie_dir + run_dir + snap + '/' + snap
     else:
         snap_name = foggie_dir + run_dir + snap + '/' + snap
     ds, refine_box = foggie_load(snap_name, trackname, do_filter_particles=False, halo_c_v_name=halo_c_v_name, gravity=True, masses_dir=masses_dir)
@@ -1473,8 +1450,8 @@ def vdisp_slice(snap):
 
     # Delete output from temp directory if on pleiades
     if (args.system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
         shutil.rmtree(snap_dir)
+        if (args.copy_to_tmp): release_snapshot(foggie_dir + run_dir + snap)
 
 if __name__ == "__main__":
 
@@ -1510,63 +1487,71 @@ if __name__ == "__main__":
     if (args.save_suffix): save_suffix = '_' + args.save_suffix
     else: save_suffix = ''
 
+    # Skip snapshots that are already done for this plot and these arguments if --skip_existing is
+    # specified. Only plots made one snapshot at a time mark snapshots as done.
+    plot_task = task_name(args.plot, args, ignore=['output', 'output_step', 'nproc', 'system', 'pwd', \
+      'copy_to_tmp', 'skip_existing'])
+    if (args.skip_existing):
+        outs = [snap for snap in outs if not (is_done(save_dir, snap, plot_task))]
+
+    target_dir = None
     if (args.plot=='velocity_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                velocity_slice(outs[i])
+                plot_and_mark_done(velocity_slice, outs[i])
         else:
-            target = velocity_slice
+            target = partial(plot_and_mark_done, velocity_slice)
     elif (args.plot=='vdisp_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vdisp_slice(outs[i])
+                plot_and_mark_done(vdisp_slice, outs[i])
         else:
-            target = vdisp_slice
+            target = partial(plot_and_mark_done, vdisp_slice)
             target_dir = 'vdisp_slice'
     elif (args.plot=='vorticity_slice'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vorticity_slice(outs[i])
+                plot_and_mark_done(vorticity_slice, outs[i])
         else:
-            target = vorticity_slice
+            target = partial(plot_and_mark_done, vorticity_slice)
     elif (args.plot=='vorticity_direction'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vorticity_direction(outs[i])
+                plot_and_mark_done(vorticity_direction, outs[i])
         else:
-            target = vorticity_direction
+            target = partial(plot_and_mark_done, vorticity_direction)
     elif (args.plot=='turbulent_spectrum'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                Pk_turbulence(outs[i])
+                plot_and_mark_done(Pk_turbulence, outs[i])
         else:
-            target = Pk_turbulence
+            target = partial(plot_and_mark_done, Pk_turbulence)
     elif (args.plot=='vel_struc_func'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vsf_randompoints(outs[i])
+                plot_and_mark_done(vsf_randompoints, outs[i])
         else:
-            target = vsf_randompoints
+            target = partial(plot_and_mark_done, vsf_randompoints)
             target_dir = 'vsf_randompoints'
     elif (args.plot=='vdisp_vs_radius'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vdisp_vs_radius(outs[i])
+                plot_and_mark_done(vdisp_vs_radius, outs[i])
         else:
-            target = vdisp_vs_radius
+            target = partial(plot_and_mark_done, vdisp_vs_radius)
             target_dir = 'vdisp_vs_radius'
     elif (args.plot=='vdisp_vs_mass_res'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vdisp_vs_mass_res(outs[i])
+                plot_and_mark_done(vdisp_vs_mass_res, outs[i])
         else:
-            target = vdisp_vs_mass_res
+            target = partial(plot_and_mark_done, vdisp_vs_mass_res)
     elif (args.plot=='vdisp_vs_spatial_res'):
         if (args.nproc==1):
             for i in range(len(outs)):
-                vdisp_vs_spatial_res(outs[i])
+                plot_and_mark_done(vdisp_vs_spatial_res, outs[i])
         else:
-            target = vdisp_vs_spatial_res
+            target = partial(plot_and_mark_done, vdisp_vs_spatial_res)
     elif (args.plot=='vdisp_vs_time'):
         vdisp_vs_time(outs)
     elif (args.plot=='vdisp_SFR_xcorr'):
@@ -1575,48 +1560,19 @@ if __name__ == "__main__":
         sys.exit("That plot type hasn't been implemented!")
 
     if (args.nproc!=1):
-        skipped_outs = outs
-        while (len(skipped_outs)>0):
-            skipped_outs = []
-            # Split into a number of groupings equal to the number of processors
-            # and run one process per processor
-            for i in range(len(outs)//args.nproc):
-                threads = []
-                snaps = []
-                for j in range(args.nproc):
-                    snap = outs[args.nproc*i+j]
-                    snaps.append(snap)
-                    threads.append(multi.Process(target=target, args=[snap]))
-                for t in threads:
-                    t.start()
-                for t in threads:
-                    t.join()
-                # Delete leftover outputs from failed processes from tmp directory if on pleiades
-                if (args.system=='pleiades_cassi'):
-                    for s in range(len(snaps)):
-                        if (os.path.exists('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])):
-                            print('Deleting failed %s from /tmp' % (snaps[s]))
-                            skipped_outs.append(snaps[s])
-                            shutil.rmtree('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])
-            # For any leftover snapshots, run one per processor
-            threads = []
-            snaps = []
-            for j in range(len(outs)%args.nproc):
-                snap = outs[-(j+1)]
-                snaps.append(snap)
-                threads.append(multi.Process(target=target, args=[snap]))
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-            # Delete leftover outputs from failed processes from tmp directory if on pleiades
-            if (args.system=='pleiades_cassi'):
-                for s in range(len(snaps)):
-                    if (os.path.exists('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])):
-                        print('Deleting failed %s from /tmp' % (snaps[s]))
-                        skipped_outs.append(snaps[s])
-                        shutil.rmtree('/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snaps[s])
-            outs = skipped_outs
+        # Snapshots that fail on pleiades leave their copy behind in the tmp directory
+        def tmp_dir(snap):
+            return '/tmp/' + args.halo + '/' + args.run + '/' + target_dir + '/' + snap
+        def failed_snap(snap):
+            return (args.system=='pleiades_cassi') and (target_dir!=None) and (os.path.exists(tmp_dir(snap)))
+        # Delete leftover outputs from failed processes from tmp directory so they can be retried
+        def clean_tmp(snap):
+            if (failed_snap(snap)):
+                print('Deleting failed %s from /tmp' % (snap))
+                shutil.rmtree(tmp_dir(snap))
+        # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+        run_snapshots(target, outs, nproc=args.nproc, snap_dir=lambda snap: foggie_dir + run_dir + snap, \
+          failed=failed_snap, cleanup=clean_tmp, retries=3, log_file=save_dir + args.plot + '_log' + save_suffix + '.txt')
 
     print(str(datetime.datetime.now()))
     print("All snapshots finished!")
@@ -199,100 +199,120 @@ def ellipse(center_x, center_y, a, b, rot_angle, x, y):
 
     return A*x**2. + B*x*y + C*y**2. + D*x + E*y + F < 0.
 
-def segment_region(x, y, z, theta, phi, radius, shapes, refine_width_kpc, x_disk=False, y_disk=False, z_disk=False, Rvir=100., units_kpc=False, units_rvir=False):
+# Shapes already parsed by compile_shape in this process, keyed by the repr of the shape
+_compiled_shapes = {}
+
+def _axis_rotation(axis):
+    '''Returns the rotation matrix that converts from the original coordinate system into a basis where
+    the z axis points along 'axis' and the x and y axes are orthogonal to it.'''
+
+    axis = np.array(axis)
+    norm_axis = axis / np.sqrt((axis**2.).sum())
+    # Define other unit vectors orthagonal to the angular momentum vector
+    x_axis = np.random.RandomState(99).randn(3)            # take a random vector
+    x_axis -= x_axis.dot(norm_axis) * norm_axis       # make it orthogonal to L
+    x_axis /= np.linalg.norm(x_axis)            # normalize it
+    y_axis = np.cross(norm_axis, x_axis)           # cross product with L
+    # The columns of this matrix are the new basis vectors in the original coordinates
+    transArr0 = np.array([x_axis, y_axis, norm_axis]).T
+    return np.linalg.inv(transArr0)
+
+def compile_shape(shape):
+    '''Parses one shape from the list returned by identify_shape into a dictionary of everything
+    segment_region needs that does not depend on the snapshot: the rotation matrix of a shape along
+    an arbitrary axis, the angle limits of a frustum, and the radial bins and ellipse parameters read
+    from the file of an ellipse. Each shape is only compiled once per process.'''
+
+    key = repr(shape)
+    if (key in _compiled_shapes): return _compiled_shapes[key]
+
+    compiled = {'type':shape[0], 'inner':shape[1], 'outer':shape[2]}
+    if (shape[0]=='frustum') or (shape[0]=='cylinder'):
+        axis = shape[4]
+        compiled['flip'] = shape[5]
+        if (type(axis)==tuple) or (type(axis)==list):
+            compiled['axis'] = 'vector'
+            compiled['rotation'] = _axis_rotation(axis)
+        else:
+            compiled['axis'] = axis
+    if (shape[0]=='frustum'):
+        op_angle = shape[6]
+        if (shape[5]):
+            compiled['min_theta'] = np.pi-op_angle*np.pi/180.
+            compiled['max_theta'] = np.pi
+        else:
+            compiled['min_theta'] = 0.
+            compiled['max_theta'] = op_angle*np.pi/180.
+    if (shape[0]=='cylinder'):
+        compiled['radius'] = shape[6]
+        if (shape[5]): compiled['mult'] = -1.
+        else: compiled['mult'] = 1.
+    if (shape[0]=='ellipse'):
+        r_inner, r_outer = np.loadtxt(shape[4], unpack=True, usecols=[0,1], ndmin=1)
+        ellipse_params = np.loadtxt(shape[4], usecols=[2,3,4,5,6], ndmin=2)
+        # Radial bins with all-zero parameters have no ellipse
+        has_ellipse = np.any(ellipse_params!=0, axis=1)
+        compiled['r_inner'] = r_inner[has_ellipse]
+        compiled['r_outer'] = r_outer[has_ellipse]
+        compiled['ellipse_params'] = ellipse_params[has_ellipse]
+        # If the bins are sorted and do not overlap, each cell can only be in one of them
+        compiled['disjoint_bins'] = bool(np.all(np.diff(compiled['r_inner']) >= 0) and \
+          np.all(compiled['r_outer'][:-1] <= compiled['r_inner'][1:]))
+
+    _compiled_shapes[key] = compiled
+    return compiled
+
+def segment_region(x, y, z, theta, phi, radius, shapes, refine_width_kpc, x_disk=False, y_disk=False, z_disk=False, Rvir=100., units_kpc=False, units_rvir=False, labels=False):
     '''This function reads in arrays of x, y, z, theta_pos, phi_pos, and radius values and returns a
     boolean list of the same size that is True if a cell is contained within a shape in the list of
     shapes given by 'shapes' and is False otherwise. If disk-relative coordinates are needed for some
-    shapes, they can be passed in with the optional x_disk, y_disk, z_disk.'''
+    shapes, they can be passed in with the optional x_disk, y_disk, z_disk. If labels=True, an integer
+    array of the index in 'shapes' of the first shape that contains each cell (-1 if none do) is
+    returned instead of the boolean list.
+
+    The shapes are compiled once per process by compile_shape, and the direction of every cell is
+    converted to a unit vector only once and shared by all of the frustums.'''
+
+    if (units_kpc):
+        scale = 1.
+    elif (units_rvir):
+        scale = Rvir
+    else:
+        scale = refine_width_kpc
 
-    bool_inshape = np.zeros(len(x), dtype=bool)
+    shape_labels = np.full(len(x), -1, dtype=int)
+    unit = None
 
     for i in range(len(shapes)):
-        if (shapes[i][0]=='sphere'):
-            if (units_kpc):
-                inner_radius = shapes[i][1]
-                outer_radius = shapes[i][2]
-            elif (units_rvir):
-                inner_radius = shapes[i][1]*Rvir
-                outer_radius = shapes[i][2]*Rvir
-            else:
-                inner_radius = shapes[i][1]*refine_width_kpc
-                outer_radius = shapes[i][2]*refine_width_kpc
-            bool_insphere = (radius > inner_radius) & (radius < outer_radius)
-            bool_inshape = bool_inshape | bool_insphere
-        elif (shapes[i][0]=='frustum'):
-            if (units_kpc):
-                inner_radius = shapes[i][1]
-                outer_radius = shapes[i][2]
-            elif (units_rvir):
-                inner_radius = shapes[i][1]*Rvir
-                outer_radius = shapes[i][2]*Rvir
-            else:
-                inner_radius = shapes[i][1]*refine_width_kpc
-                outer_radius = shapes[i][2]*refine_width_kpc
-            op_angle = shapes[i][6]
-            axis = shapes[i][4]
-            flip = shapes[i][5]
-            if (flip):
-                min_theta = np.pi-op_angle*np.pi/180.
-                max_theta = np.pi
-            else:
-                min_theta = 0.
-                max_theta = op_angle*np.pi/180.
+        shape = compile_shape(shapes[i])
+        inner_radius = shape['inner']*scale
+        outer_radius = shape['outer']*scale
+        if (shape['type']=='frustum') and (unit is None):
+            sin_theta = np.sin(theta)
+            unit = [sin_theta*np.cos(phi), sin_theta*np.sin(phi), np.cos(theta)]
+        if (shape['type']=='sphere'):
+            bool_inshape = (radius > inner_radius) & (radius < outer_radius)
+        elif (shape['type']=='frustum'):
+            axis = shape['axis']
             if (axis=='x'):
-                theta_frus = np.arccos(np.sin(theta)*np.cos(phi))
-                phi_frus = np.arctan2(np.cos(theta), np.sin(theta)*np.sin(phi))
+                theta_frus = np.arccos(unit[0])
             if (axis=='y'):
-                theta_frus = np.arccos(np.sin(theta)*np.sin(phi))
-                phi_frus = np.arctan2(np.sin(theta)*np.cos(phi), np.cos(theta))
+                theta_frus = np.arccos(unit[1])
+            if (axis=='z'):
+                theta_frus = theta
             if (axis=='disk minor axis'):
                 theta_frus = np.arccos(z_disk/radius)
-                phi_frus = np.arctan2(y_disk, x_disk)
-            if (type(axis)==tuple) or (type(axis)==list):
-                axis = np.array(axis)
-                norm_axis = axis / np.sqrt((axis**2.).sum())
-                # Define other unit vectors orthagonal to the angular momentum vector
-                np.random.seed(99)
-                x_axis = np.random.randn(3)            # take a random vector
-                x_axis -= x_axis.dot(norm_axis) * norm_axis       # make it orthogonal to L
-                x_axis /= np.linalg.norm(x_axis)            # normalize it
-                y_axis = np.cross(norm_axis, x_axis)           # cross product with L
-                x_vec = np.array(x_axis)
-                y_vec = np.array(y_axis)
-                z_vec = np.array(norm_axis)
-                # Calculate the rotation matrix for converting from original coordinate system
-                # into this new basis
-                xhat = np.array([1,0,0])
-                yhat = np.array([0,1,0])
-                zhat = np.array([0,0,1])
-                transArr0 = np.array([[xhat.dot(x_vec), xhat.dot(y_vec), xhat.dot(z_vec)],
-                                     [yhat.dot(x_vec), yhat.dot(y_vec), yhat.dot(z_vec)],
-                                     [zhat.dot(x_vec), zhat.dot(y_vec), zhat.dot(z_vec)]])
-                rotationArr = np.linalg.inv(transArr0)
-                x_rot = rotationArr[0][0]*np.sin(theta)*np.cos(phi) + rotationArr[0][1]*np.sin(theta)*np.sin(phi) + rotationArr[0][2]*np.cos(theta)
-                y_rot = rotationArr[1][0]*np.sin(theta)*np.cos(phi) + rotationArr[1][1]*np.sin(theta)*np.sin(phi) + rotationArr[1][2]*np.cos(theta)
-                z_rot = rotationArr[2][0]*np.sin(theta)*np.cos(phi) + rotationArr[2][1]*np.sin(theta)*np.sin(phi) + rotationArr[2][2]*np.cos(theta)
-                theta_frus = np.arccos(z_rot)
-                phi_frus = np.arctan2(y_rot, x_rot)
-            bool_infrus = (theta_frus >= min_theta) & (theta_frus <= max_theta) & (radius >= inner_radius) & (radius <= outer_radius)
-            bool_inshape = bool_inshape | bool_infrus
-        elif (shapes[i][0]=='cylinder'):
-            if (units_kpc):
-                bottom_edge = shapes[i][1]
-                top_edge = shapes[i][2]
-                cyl_radius = shapes[i][6]
-            elif (units_rvir):
-                bottom_edge = shapes[i][1]*Rvir
-                top_edge = shapes[i][2]*Rvir
-                cyl_radius = shapes[i][6]*Rvir
-            else:
-                bottom_edge = shapes[i][1]*refine_width_kpc
-                top_edge = shapes[i][2]*refine_width_kpc
-                cyl_radius = shapes[i][6]*refine_width_kpc
-            axis = shapes[i][4]
-            flip = shapes[i][5]
-            if (flip): mult = -1.
-            else: mult = 1.
+            if (axis=='vector'):
+                rotationArr = shape['rotation']
+                theta_frus = np.arccos(rotationArr[2][0]*unit[0] + rotationArr[2][1]*unit[1] + rotationArr[2][2]*unit[2])
+            bool_inshape = (theta_frus >= shape['min_theta']) & (theta_frus <= shape['max_theta']) & \
+              (radius >= inner_radius) & (radius <= outer_radius)
+        elif (shape['type']=='cylinder'):
+            bottom_edge = inner_radius
+            top_edge = outer_radius
+            cyl_radius = shape['radius']*scale
+            axis = shape['axis']
+            mult = shape['mult']
             if (axis=='z'):
                 norm_coord = mult*z
                 rad_coord = np.sqrt(x**2. + y**2.)
@@ -305,62 +325,46 @@ def segment_region(x, y, z, theta, phi, radius, shapes, refine_width_kpc, x_disk
             if (axis=='disk minor axis'):
                 norm_coord = mult*z_disk
                 rad_coord = np.sqrt(x_disk**2. + y_disk**2.)
-            if (type(axis)==tuple) or (type(axis)==list):
-                axis = np.array(axis)
-                norm_axis = axis / np.sqrt((axis**2.).sum())
-                # Define other unit vectors orthagonal to the angular momentum vector
-                np.random.seed(99)
-                x_axis = np.random.randn(3)            # take a random vector
-                x_axis -= x_axis.dot(norm_axis) * norm_axis       # make it orthogonal to L
-                x_axis /= np.linalg.norm(x_axis)            # normalize it
-                y_axis = np.cross(norm_axis, x_axis)           # cross product with L
-                x_vec = np.array(x_axis)
-                y_vec = np.array(y_axis)
-                z_vec = np.array(norm_axis)
-                # Calculate the rotation matrix for converting from original coordinate system
-                # into this new basis
-                xhat = np.array([1,0,0])
-                yhat = np.array([0,1,0])
-                zhat = np.array([0,0,1])
-                transArr0 = np.array([[xhat.dot(x_vec), xhat.dot(y_vec), xhat.dot(z_vec)],
-                                     [yhat.dot(x_vec), yhat.dot(y_vec), yhat.dot(z_vec)],
-                                     [zhat.dot(x_vec), zhat.dot(y_vec), zhat.dot(z_vec)]])
-                rotationArr = np.linalg.inv(transArr0)
+            if (axis=='vector'):
+                rotationArr = shape['rotation']
                 x_rot = rotationArr[0][0]*x + rotationArr[0][1]*y + rotationArr[0][2]*z
                 y_rot = rotationArr[1][0]*x + rotationArr[1][1]*y + rotationArr[1][2]*z
                 z_rot = rotationArr[2][0]*x + rotationArr[2][1]*y + rotationArr[2][2]*z
                 norm_coord = mult*z_rot
                 rad_coord = np.sqrt(x_rot**2. + y_rot**2.)
-            bool_incyl = (norm_coord >= bottom_edge) & (norm_coord <= top_edge) & (rad_coord <= cyl_radius)
-            bool_inshape = bool_inshape | bool_incyl
-        elif (shapes[i][0]=='ellipse'):
-            filename = shapes[i][4]
-            if (units_kpc):
-                inner_radius = shapes[i][1]
-                outer_radius = shapes[i][2]
-            elif (units_rvir):
-                inner_radius = shapes[i][1]*Rvir
-                outer_radius = shapes[i][2]*Rvir
-            else:
-                inner_radius = shapes[i][1]*refine_width_kpc
-                outer_radius = shapes[i][2]*refine_width_kpc
-            r_inner, r_outer = np.loadtxt(filename, unpack=True, usecols=[0,1])
-            ellipse_params = np.loadtxt(filename, usecols=[2,3,4,5,6])
+            bool_inshape = (norm_coord >= bottom_edge) & (norm_coord <= top_edge) & (rad_coord <= cyl_radius)
+        elif (shape['type']=='ellipse'):
+            bool_inshape = np.zeros(len(x), dtype=bool)
+            r_inner = shape['r_inner']
+            r_outer = shape['r_outer']
+            params = shape['ellipse_params']
             betw_radii = (radius > inner_radius) & (radius < outer_radius)
-            for r in range(len(r_inner)):
-                if False in (ellipse_params[r]==[0,0,0,0,0]):
-                    in_ellipse = ellipse(ellipse_params[r][0], ellipse_params[r][1], ellipse_params[r][2], \
-                      ellipse_params[r][3], ellipse_params[r][4], theta, phi)
+            if (len(r_inner) > 0) and (shape['disjoint_bins']):
+                # Find the one radial bin each cell could be in, then test only those cells against
+                # the ellipse of their bin
+                r_bin = np.clip(np.digitize(radius, r_inner) - 1, 0, None)
+                candidates = np.where(betw_radii & (radius > r_inner[r_bin]) & (radius < r_outer[r_bin]))[0]
+                p = params[r_bin[candidates]]
+                bool_inshape[candidates] = ellipse(p[:,0], p[:,1], p[:,2], p[:,3], p[:,4], \
+                  theta[candidates], phi[candidates])
+            else:
+                for r in range(len(r_inner)):
+                    in_ellipse = ellipse(params[r][0], params[r][1], params[r][2], params[r][3], params[r][4], theta, phi)
                     radbins = (radius > r_inner[r]) & (radius < r_outer[r])
-                    in_ellipse = in_ellipse & radbins & betw_radii
-                    bool_inshape = bool_inshape | in_ellipse
+                    bool_inshape = bool_inshape | (in_ellipse & radbins & betw_radii)
+        shape_labels[(shape_labels < 0) & bool_inshape] = i
+
+    if (labels):
+        result = shape_labels
+    else:
+        result = shape_labels >= 0
 
     if (shapes[0][0]=='cylinder') and (shapes[0][7]=='radius'):
-        return bool_inshape, rad_coord
+        return result, rad_coord
     elif (shapes[0][0]=='cylinder') and (shapes[0][7]=='height'):
-        return bool_inshape, norm_coord
+        return result, norm_coord
     else:
-        return bool_inshape
+        return result
 
 def filter_ds(box, x_data, y_data, weight_data):
     '''This function filters the yt data object passed in as 'box' into inflow and outflow regions, based on temperature
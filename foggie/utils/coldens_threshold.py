@@ -0,0 +1,67 @@
+"""
+Filename: coldens_threshold.py
+This file contains the threshold solver of the "cloud method" for finding absorbers along a ray: the
+number density above which the cells of the ray hold a given fraction of the total column. It is
+used by:
+-absorber_extraction/salsa/absorber_extractor.py
+-clouds/cloud_utils.py
+
+The cloud method used to lower a cut from 0.999 of the maximum in steps of 0.001, summing the cells
+above the cut on every step, until the cells above it held the requested fraction. Here the number
+densities are sorted once and the fraction above every possible cut is read off a cumulative sum, so
+the threshold is found without re-scanning the ray. With the default step of 0.001 the threshold is
+the same quantized value the stepped search gave; with step=None it is the exact number density of
+the last cell needed to reach the fraction.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+def _stepped_cuts(step):
+    '''Returns the cuts (as fractions of the maximum) tried by the stepped search, accumulated by
+    repeated subtraction exactly as the search did, down to just below zero.'''
+
+    cuts = [1. - step]
+    while (cuts[-1] >= -step):
+        cuts.append(cuts[-1] - step)
+    return np.array(cuts)
+
+def coldens_fraction_threshold(density, coldens_fraction, step=0.001):
+    '''Returns the threshold number density such that the cells of 'density' above it hold at least the
+    fraction 'coldens_fraction' of the summed number density. 'density' can be a masked array, in which
+    case only the unmasked cells are used, and the threshold keeps the units of 'density'.
+
+    If 'step' is given, the threshold is a multiple of 'step' times the maximum, matching the stepped
+    search: the first cut c = 1-step, 1-2*step, ... for which the cells with density > c*max hold the
+    fraction, lowered by one more step. If 'step' is None, the threshold is the density of the last
+    cell (in decreasing order of density) needed to reach the fraction, so the cells with density >=
+    threshold hold the fraction.'''
+
+    if (np.ma.isMaskedArray(density)): density = density.compressed()
+    values = np.asarray(density, dtype=float).ravel()
+    order = np.argsort(values)
+    sorted_values = values[order]
+
+    if (step is None):
+        # Running sum of the cells from the densest down. The total is taken from the same running sum
+        # (not np.sum, which rounds differently) so that a fraction of 1 is always reached.
+        running = np.cumsum(sorted_values[::-1])
+        k = min(np.searchsorted(running, coldens_fraction*running[-1], side='left'), len(values)-1)
+        return density[order[len(values)-1-k]]
+
+    cuts = _stepped_cuts(step)
+    # The stepped search starts with a ratio of 'step', so it does not step at all for small fractions
+    if not (step < coldens_fraction):
+        return cuts[0]*np.max(density)
+    # Sum of the cells with density > cut*max for every cut, from a running sum of the densest cells
+    above_sum = np.concatenate([np.cumsum(sorted_values[::-1])[::-1], [0.]])
+    first_above = np.searchsorted(sorted_values, cuts*sorted_values[-1], side='right')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # above_sum[0] is the total, summed the same way, so the ratio is exactly 1 once every cell is above the cut
+        ratio = above_sum[first_above]/above_sum[0]
+    # The search stops at the first cut whose ratio is not below the fraction (including NaN)
+    done = np.flatnonzero(~(ratio < coldens_fraction))
+    k = done[0] if (len(done) > 0) else len(cuts)-2
+    # The last step can take the cut below zero, but a negative threshold would count every cell
+    return max(cuts[k+1], 0.)*np.max(density)
@@ -0,0 +1,305 @@
+'''
+the colormaps, palettes and color keys that go with the labels and limits
+in consistency_constants.py. Building these needs matplotlib, seaborn and
+cmyt, so consistency.py only imports this module the first time one of
+them is asked for.
+'''
+
+import matplotlib as mpl
+import seaborn as sns
+import collections
+from matplotlib.colors import to_hex
+import numpy as np
+
+from foggie.utils.consistency_constants import *
+
+################################## continuous colormaps
+
+# these are useful for the refinement levels maps
+discrete_cmap = mpl.colors.ListedColormap(
+    ['#565656', '#4daf4a', '#d73027', "#984ea3",
+     '#ffe34d', '#4575b4', 'darkorange'])
+discrete_cmap_rainbow = mpl.colors.ListedColormap(
+    ['#4daf4a', "#ffe34d", 'darkorange', "#d73027",
+     '#984ea3', '#4575b4', '#565656'])
+
+density_color_map = sns.blend_palette(
+    ("black", "#4575b4", "#4daf4a", "#ffe34d", "darkorange"), as_cmap=True)
+
+metal_color_map = sns.blend_palette(
+    ("black", "#4575b4", "#984ea3", "#984ea3", "#d73027",
+     "darkorange", "#ffe34d"), as_cmap=True)
+old_metal_color_map = sns.blend_palette(
+    ("black", "#984ea3", "#4575b4", "#4daf4a",
+     "#ffe34d", "darkorange"), as_cmap=True)
+
+temperature_color_map = sns.blend_palette(
+    ("black", "#d73027", "darkorange", "#ffe34d"), as_cmap=True)
+
+h1_color_map = sns.blend_palette(("white", "#ababab", "#565656", "black",
+                                  "#4575b4", "#984ea3", "#d73027",
+                                  "darkorange", "#ffe34d"), as_cmap=True)
+
+old_o6_color_map = sns.blend_palette(("white", "black", "#4daf4a",
+                                      "#4575b4", "#984ea3", "#d73027",
+                                      "darkorange"), as_cmap=True)
+
+# electron column density maps
+e_color_map = sns.blend_palette(("white", "#FFA07A", "#FF6347", "#9370DB", "#663399"), as_cmap=True)
+
+################################# discrete colormaps
+
+############# ionization fraction
+# I'm commenting this out because it produces a figure for no reason and doesn't appear to be
+# used by any other files currently in the foggie repo. -Cassi
+#ion_frac_color_key = sns.palplot(sns.blend_palette(("grey","#ff6600"), n_colors=10),size=1.5)
+# Just in case this is needed, this might work instead without producing a figure:
+ion_frac_color_key = sns.blend_palette(("grey","#ff6600"), n_colors=10)
+
+
+############# temperature
+temp_colors = sns.blend_palette(
+    ('salmon', "#984ea3", "#4daf4a", "#ffe34d", 'darkorange'), n_colors=17)
+temperature_discrete_cmap = mpl.colors.ListedColormap(temp_colors)
+new_phase_color_key = collections.OrderedDict()
+for i in np.arange(np.size(phase_color_labels)):
+    new_phase_color_key[phase_color_labels[i]] = to_hex(temp_colors[i])
+logT_colors_mw = sns.blend_palette(('salmon', "#984ea3", "#4daf4a",
+                                    '#ffe34d', 'darkorange'),
+                                    n_colors=len(logT_color_labels_mw))
+logT_colors_mw_smooth = sns.blend_palette(('salmon', "#984ea3", "#4daf4a",
+                                    '#ffe34d', 'darkorange'),
+                                    as_cmap=True)
+logT_discrete_cmap_mw = mpl.colors.ListedColormap(logT_colors_mw)
+logT_color_key_mw = collections.OrderedDict()
+for i in np.arange(np.size(logT_color_labels_mw)):
+    logT_color_key_mw[logT_color_labels_mw[i]] = to_hex(logT_colors_mw[i])
+logT_colors_mw_fine = sns.blend_palette(('salmon', "#984ea3", "#4daf4a",
+                                         '#ffe34d', 'darkorange'),
+                                         n_colors=len(logT_color_labels_mw_fine))
+logT_discrete_cmap_mw_fine = mpl.colors.ListedColormap(logT_colors_mw_fine)
+
+############# metals
+metallicity_colors = sns.blend_palette(("black", "#4575b4", "#984ea3", "#984ea3", "#d73027",
+     "darkorange", "#ffe34d"), n_colors=21)
+metal_smooth_cmap = sns.blend_palette(("black", "#4575b4", "#984ea3", "#984ea3", "#d73027",
+     "darkorange", "#ffe34d"), as_cmap=True)
+metal_discrete_cmap = mpl.colors.ListedColormap(metallicity_colors)
+new_metals_color_key = collections.OrderedDict()
+for i in np.arange(np.size(metal_color_labels)):
+    new_metals_color_key[metal_color_labels[i]] = to_hex(metallicity_colors[i])
+
+metal_labels = new_metals_color_key.keys()
+metal_colors_mw = sns.blend_palette(("black", "#4575b4", "#984ea3",
+                                     "#984ea3", "#d73027", "darkorange",
+                                     "#ffe34d"), n_colors=6)
+metal_discrete_cmap_mw = mpl.colors.ListedColormap(metal_colors_mw)
+metal_color_key_mw = collections.OrderedDict()
+for i in np.arange(np.size(metal_color_labels_mw)):
+    metal_color_key_mw[metal_color_labels_mw[i]] = to_hex(metal_colors_mw[i])
+
+
+############# H I
+hi_colors =  sns.blend_palette(("white", "#ababab", "#565656", "black",
+                                  "#4575b4", "#984ea3", "#d73027",
+                                  "darkorange", "#ffe34d"), n_colors=26)
+hi_color_key = {b'free': to_hex(hi_colors[0]),
+                        b'free1': to_hex(hi_colors[1]),
+                        b'free2': to_hex(hi_colors[2]),
+                        b'free3': to_hex(hi_colors[3]),
+                        b'poor': to_hex(hi_colors[4]),
+                        b'poor1': to_hex(hi_colors[5]),
+                        b'poor2': to_hex(hi_colors[6]),
+                        b'poor3': to_hex(hi_colors[7]),
+                        b'low': to_hex(hi_colors[8]),  # blue
+                        b'low1': to_hex(hi_colors[9]),
+                        b'low2': to_hex(hi_colors[10]),
+                        b'low3': to_hex(hi_colors[11]),
+                        b'solar': to_hex(hi_colors[12]),
+                        b'solar1': to_hex(hi_colors[13]),
+                        b'solar2': to_hex(hi_colors[14]),
+                        b'solar3': to_hex(hi_colors[15]),
+                        b'high': to_hex(hi_colors[16]),
+                        b'high1': to_hex(hi_colors[17]),
+                        b'high2': to_hex(hi_colors[18]),
+                        b'high3': to_hex(hi_colors[19]),
+                        b'high4': to_hex(hi_colors[20]),
+                        b'moar': to_hex(hi_colors[21]),
+                        b'moar1': to_hex(hi_colors[22]),
+                        b'moar2': to_hex(hi_colors[23]),
+                        b'moar3': to_hex(hi_colors[24]),
+                        b'moar4': to_hex(hi_colors[25])
+                        }
+
+hi_labels = hi_color_key.keys()
+
+############# radius (Yong Zheng)
+radius_colors = sns.blend_palette(('#691F5E', '#4FCEED', '#F76C1D', '#DAD10C'),
+                                   n_colors=len(radius_color_labels))
+radius_discrete_cmap = mpl.colors.ListedColormap(radius_colors)
+radius_color_key = collections.OrderedDict()
+for i, ilabel in enumerate(radius_color_labels):
+    radius_color_key[ilabel] = to_hex(radius_colors[i])
+
+############# velocity (Yong Zheng)
+velocity_colors=sns.blend_palette(('#C1BEB4', '#5FEAF0', '#3C92F9',
+                                   '#F95B3C', '#FCA024', '#EFD96B'),
+                                   n_colors=6)
+velocity_discrete_cmap = mpl.colors.ListedColormap(velocity_colors)
+velocity_color_key = collections.OrderedDict()
+for i, ilabel in enumerate(velocity_color_labels):
+    velocity_color_key[ilabel] = to_hex(velocity_colors[i])
+
+############# outflow velocity (Yong Zheng)
+outflow_cmap = mpl.pyplot.cm.PuRd
+outflow_colors = sns.color_palette("PuRd", len(outflow_color_labels))
+#outflow_colors = sns.blend_palette((outflow_cmap(0.25),
+#                                    outflow_cmap(0.4),
+#                                    outflow_cmap(0.55),
+#                                    outflow_cmap(0.7),
+#                                    outflow_cmap(0.9)),
+#                                    n_colors=len(outflow_color_labels))
+outflow_discrete_cmap = mpl.colors.ListedColormap(outflow_colors)
+outflow_color_key = collections.OrderedDict()
+for i, ilabel in enumerate(outflow_color_labels):
+    outflow_color_key[ilabel] = to_hex(outflow_colors[i])
+
+############# inflow velocity (Yong Zheng)
+inflow_cmap = mpl.pyplot.cm.YlGnBu_r
+inflow_colors = sns.color_palette("YlGnBu_r", len(inflow_color_labels))
+#inflow_colors = sns.blend_palette((inflow_cmap(0.25),
+#                                    inflow_cmap(0.4),
+#                                    inflow_cmap(0.55),
+#                                    inflow_cmap(0.7),
+#                                    inflow_cmap(0.9)),
+#                                    n_colors=len(inflow_color_labels))
+inflow_discrete_cmap = mpl.colors.ListedColormap(inflow_colors)
+inflow_color_key = collections.OrderedDict()
+for i, ilabel in enumerate(inflow_color_labels):
+    inflow_color_key[ilabel] = to_hex(inflow_colors[i])
+
+############# outflow/inflow velocity (Yong Zheng)
+outflow_cmap = mpl.pyplot.cm.Reds
+inflow_cmap = mpl.pyplot.cm.Blues_r
+outflow_inflow_colors = sns.blend_palette((inflow_cmap(0.1), inflow_cmap(0.3),
+                                           inflow_cmap(0.5), inflow_cmap(0.9),
+                                           outflow_cmap(0.1), outflow_cmap(0.3),
+                                           outflow_cmap(0.5), outflow_cmap(0.7),
+                                           outflow_cmap(0.9)),
+                                           n_colors=len(outflow_inflow_color_labels))
+
+outflow_inflow_discrete_cmap = mpl.colors.ListedColormap(outflow_inflow_colors)
+outflow_inflow_color_key = collections.OrderedDict()
+for i, ilabel in enumerate(outflow_inflow_color_labels):
+    outflow_inflow_color_key[ilabel] = to_hex(outflow_inflow_colors[i])
+
+############# density (Cassi)
+den_colors = sns.blend_palette(
+    ("black", "#4575b4", "#4daf4a", "#ffe34d", "darkorange"), n_colors=11)
+density_discrete_cmap = mpl.colors.ListedColormap(den_colors)
+density_color_key = collections.OrderedDict()
+for i in np.arange(np.size(density_color_labels)):
+    density_color_key[density_color_labels[i]] = to_hex(density_discrete_cmap(i))
+
+############# pressure (Cassi)
+pressure_discrete_cmap = mpl.cm.get_cmap(pressure_color_map, 11)
+pressure_color_key = collections.OrderedDict()
+for i in np.arange(np.size(pressure_color_labels)):
+    pressure_color_key[pressure_color_labels[i]] = to_hex(pressure_discrete_cmap(i))
+
+############# azimuthal angle (Cassi)
+# importing cmyt registers its colormaps with matplotlib, which azimuthal_color_map ('cmyt.arbre') needs
+import cmyt
+azimuthal_discrete_cmap = mpl.cm.get_cmap(azimuthal_color_map, 9)
+azimuthal_color_key = collections.OrderedDict()
+for i in np.arange(np.size(azimuthal_color_labels)):
+    azimuthal_color_key[azimuthal_color_labels[i]] = to_hex(azimuthal_discrete_cmap(i))
+
+
+############# HSE (Cassi)
+HSE_discrete_cmap = mpl.cm.get_cmap(HSE_color_map, 13)
+HSE_color_key = collections.OrderedDict()
+for i in np.arange(np.size(HSE_color_labels)):
+    HSE_color_key[HSE_color_labels[i]] = to_hex(HSE_discrete_cmap(i))
+
+
+################################ discrete colormaps for ions, uses ion labels above
+
+############# O VI
+o6_discrete_cmap = mpl.cm.get_cmap(o6_color_map, 13)
+o6_color_key = collections.OrderedDict()
+for i in np.arange(np.size(o6_color_labels)):
+    o6_color_key[o6_color_labels[i]] = to_hex(o6_discrete_cmap(i))
+
+
+############# C IV
+c4_discrete_cmap = mpl.cm.get_cmap(c4_color_map, 17)
+c4_color_key = collections.OrderedDict()
+for i in np.arange(np.size(c4_color_labels)):
+    c4_color_key[c4_color_labels[i]] = to_hex(c4_discrete_cmap(i))
+
+
+############# C III
+c3_discrete_cmap = mpl.cm.get_cmap(c3_color_map, 17)
+c3_color_key = collections.OrderedDict()
+for i in np.arange(np.size(c3_color_labels)):
+    c3_color_key[c3_color_labels[i]] = to_hex(c3_discrete_cmap(i))
+
+
+############# Si II
+si2_discrete_cmap = mpl.cm.get_cmap(si2_color_map, 17)
+si2_color_key = collections.OrderedDict()
+for i in np.arange(np.size(si2_color_labels)):
+    si2_color_key[si2_color_labels[i]] = to_hex(si2_discrete_cmap(i))
+
+
+############# C II
+c2_discrete_cmap = mpl.cm.get_cmap(c2_color_map, 17)
+c2_color_key = collections.OrderedDict()
+for i in np.arange(np.size(c2_color_labels)):
+    c2_color_key[c2_color_labels[i]] = to_hex(c2_discrete_cmap(i))
+
+
+############# O VII
+o7_discrete_cmap = mpl.cm.get_cmap(o7_color_map, 9)
+o7_color_key = collections.OrderedDict()
+for i in np.arange(np.size(o7_color_labels)):
+    o7_color_key[o7_color_labels[i]] = to_hex(o7_discrete_cmap(i))
+
+#############################################################
+
+
+##################################### more dictionaries that depend on other stuf
+colormap_dict = {'phase': new_phase_color_key,
+                 'metal': new_metals_color_key,
+                 'h1': hi_color_key,
+                 'density': density_color_map,
+                 'O_p5_number_density': o6_color_map,
+                 'H_p0_number_density': h1_color_map,
+                 'C_p1_number_density': c2_color_map,
+                 'C_p3_number_density': c4_color_map,
+                 'Mg_p1_number_density': mg2_color_map,
+                 'Si_p1_number_density': si2_color_map,
+                 'Si_p2_number_density': si3_color_map,
+                 'Si_p3_number_density': si4_color_map,
+                 'N_p4_number_density': n5_color_map,
+                 'O_p6_number_density': o7_color_map,
+                 'O_p7_number_density': o8_color_map,
+                 'Ne_p6_number_density': ne7_color_map,
+                 'Ne_p7_number_density': ne8_color_map,
+                 'El_number_density': e_color_map}
+
+
+############# angle categorisation for -180 to 180 deg (Ayan)
+angle_colors_2pi = sns.blend_palette(angle_color_names_2pi, n_colors=len(angle_color_labels_2pi))
+angle_discrete_cmap_2pi = mpl.colors.ListedColormap(angle_colors_2pi)
+angle_color_key_2pi = collections.OrderedDict()
+for i in np.arange(np.size(angle_color_labels_2pi)):
+    angle_color_key_2pi[angle_color_labels_2pi[i]] = to_hex(angle_discrete_cmap_2pi(i))
+
+############# angle categorisation for 0 to 180 deg (Ayan)
+angle_colors_pi = sns.blend_palette(angle_color_names_2pi[int(len(angle_color_names_2pi)/2) : ], n_colors=len(angle_color_labels_pi))
+angle_discrete_cmap_pi = mpl.colors.ListedColormap(angle_colors_pi)
+angle_color_key_pi = collections.OrderedDict()
+for i in np.arange(np.size(angle_color_labels_pi)):
+    angle_color_key_pi[angle_color_labels_pi[i]] = to_hex(angle_discrete_cmap_pi(i))
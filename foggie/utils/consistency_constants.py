@@ -0,0 +1,701 @@
+'''
+the light half of consistency.py: constants, field filters, label names,
+units and limits, and the functions that sort values into the labeled
+categories. Nothing here needs matplotlib or seaborn, so this loads fast;
+the colormaps and color keys are in consistency_colors.py.
+'''
+
+import astropy.units as u
+import numpy as np
+
+c = 299792.458 * u.Unit('km/s')
+c_kms = 299792.458
+
+default_width = 85.  # kpc in projection
+
+core_width = 20. # width of slice to use in show_velphase
+
+##################################### dictionaries for plots
+
+axes_label_dict = {'density': 'log Density [g / cm$^3$]',
+                    'Dark_Matter_Density': 'log DM Density [g / cm$^3$]',
+                    'temperature': 'log Temperature [K]',
+                    'cell_mass': r'log Cell Mass [M$_{\odot}$]',
+                    'cell_size': 'Cell Size [physical pc]',
+                    'x': '$x$ coordinate [physical kpc]',
+                    'y': '$y$ coordinate [physical kpc]',
+                    'z': '$z$ coordinate [physical kpc]',
+                    'col_dens': 'Column Density [cm$^{-2}$]',
+                    'position_x': '$x$ coordinate [physical kpc]',
+                    'position_y': '$y$ coordinate [physical kpc]',
+                    'position_z': '$z$ coordinate [physical kpc]',
+                    'radius': 'Radius [physical kpc]',
+                    'mach_number': 'Mach Number',
+                    'x_velocity': 'X velocity [km s$^{-1}$]',
+                    'y_velocity': 'Y velocity [km s$^{-1}$]',
+                    'z_velocity': 'Z velocity [km s$^{-1}$]',
+                    'x-velocity': 'X velocity [km s$^{-1}$]',
+                    'y-velocity': 'Y velocity [km s$^{-1}$]',
+                    'z-velocity': 'Z velocity [km s$^{-1}$]',
+                    'vx_corrected': 'X velocity [km s$^{-1}$]',
+                    'vy_corrected': 'Y velocity [km s$^{-1}$]',
+                    'vy_corrected': 'Z velocity [km s$^{-1}$]',
+                    'radial_velocity': 'Radial Velocity [km s$^{-1}$]',
+                    'radial_velocity_corrected': 'Radial Velocity [km s$^{-1}$]',
+                    'tangential_velocity_corrected': 'Tangential Velocity [km s$^{-1}$]',
+                    'theta_velocity_corrected': 'Theta Velocity [km s$^{-1}$]',
+                    'phi_velocity_corrected': 'Phi Velocity [km s$^{-1}$]',
+                    'radius_corrected': 'Radius [physical kpc]',
+                    'relative_velocity': 'Relative Velocity [km s$^{-1}$]',
+                    'velocity_spherical_radius': 'Radial Velocity [km s$^{-1}$]',
+                    'metallicity': r'log Z/Z$_{\odot}$',
+                    'pressure': 'log P [g cm$^{-1}$ s$^{-2}$ ]',
+                    'entropy': 'log Entropy [cm$^2$ erg]',
+                    'cooling_time': 'log Cooling Time [yr]',
+                    'H_p0_ion_fraction': 'log [H I Ionization Fraction]',
+                    'H_p0_number_density': 'log [H I Number Density]',
+                    'H_p0_column_density': 'log [H I Cell Column Density]',
+                    'O_p0_ion_fraction': 'O I Ionization Fraction',
+                    'O_p0_number_density': 'log [O I Number Density]',
+                    'O_p0_column_density': 'log [O I Cell Column Density]',
+                    'O_p1_ion_fraction': 'O II Ionization Fraction',
+                    'O_p1_number_density': 'log [O II Number Density]',
+                    'O_p1_column_density': 'log [O II Cell Column Density]',
+                    'O_p2_ion_fraction': 'O III Ionization Fraction',
+                    'O_p2_number_density': 'log [O III Number Density]',
+                    'O_p2_column_density': 'log [O III Cell Column Density]',
+                    'O_p3_ion_fraction': 'O IV Ionization Fraction',
+                    'O_p3_number_density': 'log [O IV Number Density]',
+                    'O_p3_column_density': 'log [O IV Cell Column Density]',
+                    'O_p4_ion_fraction': 'O V Ionization Fraction',
+                    'O_p4_number_density': 'log [O V Number Density]',
+                    'O_p4_column_density': 'log [O V Cell Column Density]',
+                    'O_p5_ion_fraction': 'O VI Ionization Fraction',
+                    'O_p5_number_density': 'log [O VI Number Density]',
+                    'O_p5_column_density': 'log [O VI Cell Column Density]',
+                    'O_p6_ion_fraction': 'O VII Ionization Fraction',
+                    'O_p6_number_density': 'log [O VII Number Density]',
+                    'O_p6_column_density': 'log [O VII Cell Column Density]',
+                    'O_p7_ion_fraction': 'O VIII Ionization Fraction',
+                    'O_p7_number_density': 'log [O VIII Number Density]',
+                    'O_p7_column_density': 'log [O VIII Cell Column Density]',
+                    'C_p3_ion_fraction': 'C IV Ionization Fraction',
+                    'C_p3_number_density': 'log [C IV Number Density]',
+                    'Si_p3_ion_fraction': 'Si IV Ionization Fraction',
+                    'Si_p3_number_density': 'log [Si IV Number Density]',
+                    'N_p4_number_denstiy': 'log [N V Number Density]'
+                   }
+
+# this is a dictionary of fields where we prefer to plot or
+# visualize them in the log rather than the original yt / enzo field.
+# Try "if field_name in logfields: field_name = log10(field_name)"
+logfields = ('Dark_Matter_Density', 'density', 'temperature',
+             'entropy', 'pressure', 'cooling_time',
+             'H_p0_number_density', 'H_p0_column_density',
+             'O_p0_number_density', 'O_p0_column_density',
+             'O_p1_number_density', 'O_p1_column_density',
+             'O_p2_number_density', 'O_p2_column_density',
+             'O_p3_number_density', 'O_p3_column_density',
+             'O_p4_number_density', 'O_p4_column_density',
+             'O_p5_number_density', 'O_p5_column_density',
+             'O_p6_number_density', 'O_p6_column_density',
+             'O_p7_number_density', 'O_p7_column_density',
+             'C_p0_number_density', 'C_p0_column_density',
+             'C_p1_number_density', 'C_p1_column_density',
+             'C_p2_number_density', 'C_p2_column_density',
+             'C_p3_number_density', 'C_p3_column_density',
+             'Si_p0_number_density', 'Si_p0_column_density',
+             'Si_p1_number_density', 'Si_p1_column_density',
+             'Si_p2_number_density', 'Si_p2_column_density',
+             'Si_p3_number_density', 'Si_p3_column_density',
+             'Mg_p1_number_density', 'Mg_p1_column_density',
+             'metallicity', 'cell_mass', 'cell_size')
+
+species_dict = {'CIII': 'C_p2_number_density',
+                'CIV': 'C_p3_number_density',
+                'HI': 'H_p0_number_density',
+                'MgII': 'Mg_p1_number_density',
+                'OVI': 'O_p5_number_density',
+                'SiII': "Si_p1_number_density",
+                'SiIII': "Si_p2_number_density",
+                'SiIV': "Si_p3_number_density",
+                'NeVIII': 'Ne_p7_number_density',
+                'FeXIV': 'Fe_p13_number_density',
+                'NV': 'N_p4_number_density',
+                'AlII': 'Al_p1_number_density',
+                'CII': 'C_p1_number_density',
+                'OVII': 'O_p6_number_density',
+                'OVIII': 'O_p7_number_density',
+                'NeVII': 'Ne_p6_number_density',
+                'NeVIII': 'Ne_p7_number_density',
+                'MgX': 'Mg_p9_number_density',
+                'Electron': 'El_number_density'}
+
+halo_dict = {   '2392'  :  'Hurricane' ,
+                '2878'  :  'Cyclone' ,
+                '4123'  :  'Blizzard' ,
+                '5016'  :  'Squall' ,
+                '5036'  :  'Maelstrom' ,
+                '8508'  :  'Tempest',
+                '002392'  :  'Hurricane' ,
+                '002878'  :  'Cyclone' ,
+                '004123'  :  'Blizzard' ,
+                '005016'  :  'Squall' ,
+                '005036'  :  'Maelstrom' ,
+                '008508'  :  'Tempest' }
+
+background_color_dict = {'density':'black', \
+                         'H_p0_number_density':'white', \
+                         'C_p1_number_density':'black', \
+                         'C_p2_number_density':'black', \
+                         'C_p3_number_density':'black', \
+                         'Si_p1_number_density':'black',\
+                         'Si_p2_number_density':'black',\
+                         'Si_p3_number_density':'black',\
+                         'Mg_p1_number_density':'black',\
+                         'O_p5_number_density':'black',\
+                         'Ne_p7_number_density':'black'}
+
+###################################### linelists for spectra
+
+linelist_jt = ['H I 1216', 'H I 919', \
+                'Mg II 2796', 'Si II 1260', 'Si III 1206', 'Si IV 1394', \
+                'C II 1335', 'C III 977', 'C IV 1548',\
+                'O VI 1032', 'Ne VIII 770']
+linelist_kodiaq  = ['H I 1216', 'H I 919', \
+                'Si II 1260', 'Si III 1206', 'Si IV 1394',
+                'C II 1335', 'C III 977', 'C IV 1548',
+                 'O VI 1032']
+linelist_long = ['H I 1216', 'H I 1026', 'H I 973',
+               'H I 950', 'H I 919', 'Al II 1671', 'Al III 1855', \
+               'Si II 1260', 'Si III 1206', 'Si IV 1394', \
+               'C II 1335', 'C III 977', 'C IV 1548', \
+               'O VI 1032', 'Ne VIII 770']
+linelist_all = ['H I 1216', 'H I 1026', 'H I 973',
+               'H I 950', 'H I 919', 'Mg II 2796', 'Al II 1671', 'Al III 1855', \
+               'Si II 1260', 'Si III 1206', 'Si IV 1394', \
+               'C II 1335', 'C III 977', 'C IV 1548', \
+               'O VI 1032', 'Ne VIII 770']
+linelist_high = ['H I 1216',  'Si IV 1394', 'C IV 1548', \
+               'O VI 1032', 'Ne VIII 770']
+linelist_short = ['H I 1216', 'Si II 1260', 'O VI 1032']
+
+################################################################
+
+
+################################## min/max values to be used in other code
+
+cgm_temperature_min = 1.5e4  #<---- in some FOGGIE codes this will be used to set a min
+cgm_density_max = 2e-26
+cgm_inner_radius = 10.
+cgm_outer_radius = 200.
+
+#These are strings that can be used to produce yt CutRegions with consistent cuts.
+cgm_field_filter = ("(obj['temperature'] > {} ) | (obj['density'] < {})").format(cgm_temperature_min, cgm_density_max)
+ism_field_filter = ("(obj['temperature'] < {} ) & (obj['density'] > {})").format(cgm_temperature_min, cgm_density_max)
+
+#####################################################################
+
+
+################################## colormap names and min/max limits
+
+density_proj_min = 5e-2  # msun / pc^2
+density_proj_max = 1e4
+density_slc_min = 5e-8  # msun / pc^3
+density_slc_max = 5
+
+dens_phase_min = 10.**-31
+dens_phase_max = 10.**-21
+metal_proj_min = 10.**54
+metal_proj_max = 10.**61
+
+metal_min = 5.e-3
+metal_max = 3.
+metal_density_min = 1.e-5
+metal_density_max = 250.
+
+temperature_max = 5e6
+temperature_min = 1e4
+temperature_max_datashader = 1.e8
+temperature_min_datashader = 1.e2
+
+entropy_color_map = "Spectral_r"
+entropy_min = 1.e-4
+entropy_max = 1.e3
+
+pressure_color_map = "Spectral"
+pressure_min_old = 1.e-16
+pressure_max_old = 1.e-9
+pressure_min = 1.e-2
+pressure_max = 1.e3
+
+HSE_color_map = 'RdYlGn'
+HSE_min = 1.e-3
+HSE_max = 1.e3
+
+azimuthal_color_map = 'cmyt.arbre'
+azimuthal_angle_min = 0
+azimuthal_angle_max = 90
+
+h1_proj_min = 1.e12
+h1_proj_max = 1.e24
+h1_slc_min = 1.e-14
+h1_slc_max = 1.e2
+
+h1_color_map_mw = 'viridis' # same as figure 2 in HI4PI+2016 paper.
+h1_proj_min_mw = 1e13 # for mocky way allsky map, YZ
+h1_proj_max_mw = 1e23 # for mocky way allsky map, YZ, tuned for HI4PI
+
+o6_color_map = "magma"
+o6_min = 1.e11
+o6_max = 1.e15
+no6_min = 1.e-15
+no6_max = 1.e-9
+
+c4_color_map = "inferno"
+c4_min = 1.e11
+c4_max = 1.e16
+nc4_min = 1.e-18
+nc4_max = 1.e-10
+
+mg2_color_map = "plasma"
+mg2_min = 1.e10
+mg2_max = 1.e17
+
+c2_color_map = "plasma"
+c2_min = 1.e10
+c2_max = 1.e17
+nc2_min = 1.e-21
+nc2_max = 1.e-13
+
+c3_color_map = "magma"
+c3_min = 1.e11
+c3_max = 1.e16
+nc3_min = 1.e-20
+nc3_max = 1.e-12
+
+si2_color_map = "plasma"
+si2_min = 1.e10
+si2_max = 1.e17
+nsi2_min = 1.e-22
+nsi2_max = 1.e-14
+
+si3_color_map = "magma"
+si3_min = 1.e11
+si3_max = 1.e16
+
+si4_color_map = "inferno"
+si4_min = 1.e11
+si4_max = 1.e15
+
+n5_color_map = "inferno"
+n5_min = 1.e11
+n5_max = 1.e15
+
+o7_color_map = "magma"
+o7_min = 1.e11
+o7_max = 1.e15
+no7_min = 1.e-12
+no7_max = 1.e-8
+
+o8_color_map = "magma"
+o8_min = 1.e11
+o8_max = 1.e15
+
+ne7_color_map = "magma"
+ne7_min = 1.e11
+ne7_max = 1.e15
+
+ne8_color_map = "magma"
+ne8_min = 1.e11
+ne8_max = 1.e15
+
+fe14_color_map = "inferno"
+fe14_min = 1.e10
+fe14_max = 1.e15
+
+al2_color_map = "plasma"
+al2_min = 1.e10
+al2_max = 1.e17
+
+mg10_color_map = "plasma"
+mg10_min = 1.e11
+mg10_max = 1.e15
+
+# electron column density maps
+e_min = 3.1e18 # in unit of cm-2, equal to 1 pc/cm3 for dispersion measure unit
+e_max = 3.1e20 # in unit of cm-2, equal to 100 pc/cm3
+
+#####################################################################
+
+
+
+################################# discrete categories
+
+def categorize(values, edges, labels, side='right', offset=0):
+    """ map values to category labels with one np.searchsorted over the increasing
+    bin edges: a value gets labels[np.searchsorted(edges, value, side) + offset].
+    With side='right' each bin includes its lower edge, with side='left' its upper edge.
+    Values that fall outside the labels, and NaNs, are left uncategorized (NaN).
+    Returns a pd.Categorical whose categories are all of the labels, in order."""
+    import pandas as pd # not at the top, so that importing this module stays fast
+
+    values = np.asarray(values, dtype=float).ravel()
+    codes = np.searchsorted(edges, values, side=side) + offset
+    codes[(codes < 0) | (codes >= len(labels)) | np.isnan(values)] = -1
+    return pd.Categorical.from_codes(codes, categories=list(labels))
+
+def categorize_linear(values, vmin, vmax, labels):
+    """ categorize into the evenly spaced bins from vmin to vmax used by the density,
+    pressure and ion colormaps: below vmin is labels[0] and above the second-highest
+    edge is labels[-1], but values exactly at vmax are left uncategorized, as they
+    always have been"""
+    n = np.size(labels)
+    edges = vmax - (vmax-vmin)/(n-1.)*np.arange(n)[::-1]
+    values = np.asarray(values, dtype=float)
+    values = np.where(values == vmax, np.nan, values)
+    return categorize(values, edges[:-1], labels)
+
+
+############# ionization fraction
+def categorize_by_fraction(f_ion):
+    """ define the ionization category strings"""
+    # all: > -10, low: > 0.0001 (yellow), med: > 0.01 (orange), high: > 0.1 (red)
+    return categorize(f_ion, [-10., 0.0001, 0.01, 0.1], [b'all', b'low', b'med', b'high'],
+                      side='left', offset=-1)
+
+############# temperature
+phase_color_labels = [b'cold1', b'cold2', b'cold3', b'cool', b'cool1', b'cool2',
+                      b'cool3', b'warm', b'warm1', b'warm2', b'warm3', b'hot',
+                      b'hot1', b'hot2', b'hot3', b'hot4']
+
+def categorize_by_temp(temperature):
+    """ define the temp category strings"""
+    # cold1 is below 4, each label up to hot3 is a bin of [lower edge, upper edge),
+    # and hot4 is 9 and up (added by ayan on 16 July 2021; because otherwise calling
+    # categorize_by_temp() was throwing an error for stuff hotter than 10^9 K)
+    return categorize(temperature, [4., 4.2, 4.4, 4.6, 4.8, 5., 5.2, 5.4, 5.6, 5.8,
+                                    6., 6.2, 6.4, 6.6, 9.], phase_color_labels)
+
+### I'm adding this logT color keys for mocky way. Yong Zheng, 10/10/2019. ##
+### Still using the same temperature color plate ###
+logT_color_labels_mw = [b'<4.0', b'4.0-4.5', b'4.5-5.0', b'5.0-5.5',
+                        b'5.5-6.0', b'6.0-6.5', b'6.5-7.0', b'>7.0']
+
+def categorize_by_logT_mw(logT):
+    """ define the temp category strings"""
+    # logT of exactly 7 falls in neither 6.5-7.0 nor >7.0
+    logT = np.asarray(logT, dtype=float)
+    return categorize(np.where(logT == 7., np.nan, logT),
+                      [4.0, 4.5, 5.0, 5.5, 6.0, 6.5, 7.0], logT_color_labels_mw)
+
+logT_color_labels_mw_fine = [b'<4.0', b'4.0-4.2', b'4.2-4.4', b'4.4-4.6',
+                        b'4.6-4.8', b'4.8-5.0', b'5.0-5.2', b'5.2-5.4',
+                        b'5.4-5.6', b'5.6-5.8', b'5.8-6.0', b'6.0-6.2',
+                        b'6.2-6.4', b'6.4-6.6', b'6.6-6.8', b'6.8-7.0',
+                        b'>7.0']
+
+
+############# metals
+metal_color_labels = [b'free', b'free1', b'free2', b'free3', b'poor',
+                      b'poor1', b'poor2', b'poor3', b'low', b'low1',
+                      b'low2', b'low3', b'solar', b'solar1', b'solar2',
+                      b'solar3', b'high', b'high1', b'high2', b'high3', b'high4']
+
+def categorize_by_metals(metal):
+    """ define the temp category strings"""
+    metal_vals = np.power(10.0, np.linspace(start=np.log10(metal_min),
+                                            stop=np.log10(metal_max), num=21))
+    # make the highest value really high
+    metal_vals[20] = 50. * metal_vals[20]
+    return categorize(metal, metal_vals, metal_color_labels)
+
+def categorize_by_log_metals(metal):
+    """ define the metallicity category strings in log space;
+    this is basically identical to categorize_by_metals() except: he first line where metal_vals is declared in log space instead of linear space AND
+    added by Ayan on 16th July, 2021
+    """
+    metal_vals = np.linspace(start=np.log10(metal_min),
+                                            stop=np.log10(metal_max), num=21)
+    # make the highest value really high
+    metal_vals[20] = 50. * metal_vals[20]
+    return categorize(metal, metal_vals, metal_color_labels)
+
+# I made a simpler category for mocky way, 10/10/2019, Yong Zheng.
+metal_color_labels_mw = [b'<0.01', b'[0.01, 0.1)',
+                         b'[0.1, 0.5)', b'[0.5, 1.0)',
+                         b'[1.0, 2.0)', b'>=2.0']
+
+def categorize_by_metallicity_mw(metal):
+    """
+    define the metallicity category strings for mocky way. Yong Zheng. 10/10/2019.
+    """
+    return categorize(metal, [0.01, 0.1, 0.5, 1.0, 2.0], metal_color_labels_mw)
+
+############# H I
+hi_color_labels = [b'free', b'free1', b'free2', b'free3', b'poor',
+                   b'poor1', b'poor2', b'poor3', b'low', b'low1',
+                   b'low2', b'low3', b'solar', b'solar1', b'solar2',
+                   b'solar3', b'high', b'high1', b'high2', b'high3', b'high4',
+                   b'moar', b'moar1', b'moar2', b'moar3', b'moar4']
+
+def categorize_by_hi(hi):
+    """ define the temp category strings"""
+    hi_vals = np.linspace(start=np.log10(h1_proj_min),stop=np.log10(h1_proj_max), num=26)
+    # make the highest value really high
+    hi_vals[25] = 50. * hi_vals[25]
+    return categorize(hi, hi_vals, hi_color_labels)
+
+
+############# radius (Yong Zheng)
+# radius_df_colname = 'cat_radius' # name of radius in dataframe
+radius_color_labels = [b'0-10', b'10-20', b'20-30', b'30-40',
+                       b'40-50', b'50-60', b'60-70', b'70-80',
+                       b'80-90', b'90-100', b'100-110', b'110-120']
+
+def categorize_by_radius(radius):
+    """ define the radius category strings"""
+    return categorize(radius, np.arange(0, 130, 10), radius_color_labels, offset=-1)
+
+
+############# velocity (Yong Zheng)
+# velocity_df_colname = 'cat_velocity' # this is the name of velocity in dataframe
+velocity_color_labels = [b'<-100', b'[-100, -50]', b'[-50, 0]',
+                         b'[0, 50]', b'[50, 100]', b'>100']
+
+def categorize_by_velocity(velocity):
+    """ define the line of sight velocity category strings"""
+    # same bins as categorize_by_inflow, but 0 itself is not included
+    return categorize(velocity, [-400, -300, -200, -180, -160, -140, -120, -100,
+                                 -80, -60, -40, -20, 0], inflow_color_labels)
+
+
+############# outflow velocity (Yong Zheng)
+# outflow_df_colname = 'cat_vel' # this is the name of velocity in dataframe
+outflow_color_labels = [b'[0, 20)', b'[20, 40)', b'[40, 60)', b'[60, 80)',
+                        b'[80, 100)', b'[100, 120)', b'[120, 140)',
+                        b'[140, 160)', b'[160, 180)', b'[180, 200)',
+                        b'[200, 300)', b'[300, 400)', b'>400']
+
+def categorize_by_outflow(velocity):
+    """ define the line of sight velocity category strings"""
+    # 400 itself falls in neither [300, 400) nor >400
+    vv = np.asarray(velocity, dtype=float)
+    return categorize(np.where(vv == 400, np.nan, vv),
+                      [0, 20, 40, 60, 80, 100, 120, 140, 160, 180, 200, 300, 400],
+                      outflow_color_labels, offset=-1)
+
+
+############# inflow velocity (Yong Zheng)
+# inflow_df_colname = 'cat_inflow' # this is the name of velocity in dataframe
+inflow_color_labels = [b'<-400',
+                       b'[-400, -300)', b'[-300, -200)', b'[-200, -180)',
+                       b'[-180, -160)', b'[-160, -140)', b'[-140, -120)',
+                       b'[-120, -100)', b'[-100, -80)',  b'[-80, -60)',
+                       b'[-60, -40)',   b'[-40, -20)',   b'[-20, 0)']
+
+def categorize_by_inflow(velocity):
+    """ define the line of sight velocity category strings"""
+    # the last bin, [-20, 0), includes 0
+    vv = np.asarray(velocity, dtype=float)
+    return categorize(np.where(vv > 0, np.nan, vv),
+                      [-400, -300, -200, -180, -160, -140, -120, -100, -80, -60, -40, -20],
+                      inflow_color_labels)
+
+
+############# outflow/inflow velocity (Yong Zheng)
+outflow_inflow_color_labels = [b'<-200',  b'[-200, -150)',
+                               b'[-150, -100)', b'[-100, -50)',
+                               b'[-50, 0)', b'[0, 50)', b'[50, 100)',
+                               b'[100, 150)', b'[150, 200)', b'>=200']
+
+def categorize_by_outflow_inflow(velocity):
+    """ define the line of sight velocity category strings"""
+    return categorize(velocity, [-200, -150, -100, -50, 0, 50, 100, 150, 200],
+                      outflow_inflow_color_labels)
+
+############# density (Cassi)
+density_color_labels = [b'low1', b'low2', b'med', b'med1', b'med2',
+                      b'high1', b'high2', b'high3',
+                      b'vhi1', b'vhi2', b'vhi3']
+
+def categorize_by_den(density):
+    """ define the density category strings"""
+    return categorize_linear(density, np.log10(dens_phase_min), np.log10(dens_phase_max), density_color_labels)
+
+############# pressure (Cassi)
+pressure_color_labels = [b'low1', b'low2', b'med', b'med1', b'med2',
+                      b'high1', b'high2', b'high3',
+                      b'vhi1', b'vhi2', b'vhi3']
+
+def categorize_by_pres(pressure):
+    """ define the pressure category strings"""
+    return categorize_linear(pressure, np.log10(pressure_min), np.log10(pressure_max), pressure_color_labels)
+
+############# azimuthal angle (Cassi)
+azimuthal_color_labels = [b'low1', b'low2', b'med', b'med1', b'med2',
+                      b'high1', b'high2', b'high3',
+                      b'vhi1']
+
+def categorize_by_azimuth(azimuth):
+    """ define the azimuthal angle category strings"""
+    return categorize_linear(azimuth, azimuthal_angle_min, azimuthal_angle_max, azimuthal_color_labels)
+
+############# HSE (Cassi)
+HSE_color_labels = [b'low1', b'low2', b'low3', b'med1', b'med2', b'med3',
+                      b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3']
+
+def categorize_by_HSE(HSEdeg):
+    """ define the pressure category strings"""
+    return categorize_linear(HSEdeg, np.log10(HSE_min), np.log10(HSE_max), HSE_color_labels)
+
+
+################################ discrete categories for ions, uses ion labels above
+
+############# O VI
+o6_color_labels = [b'low1', b'low2', b'low3', b'med1', b'med2', b'med3',
+                      b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3']
+
+def categorize_by_o6(no6):
+    """ define the number density category strings"""
+    return categorize_linear(no6, np.log10(no6_min), np.log10(no6_max), o6_color_labels)
+
+############# C IV
+c4_color_labels = [b'low', b'low1', b'low2', b'low3', b'med', b'med1', b'med2', b'med3',
+                      b'high', b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3', b'vhi4']
+
+def categorize_by_c4(nc4):
+    """ define the number density category strings"""
+    return categorize_linear(nc4, np.log10(nc4_min), np.log10(nc4_max), c4_color_labels)
+
+############# C III
+c3_color_labels = [b'low', b'low1', b'low2', b'low3', b'med', b'med1', b'med2', b'med3',
+                      b'high', b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3', b'vhi4']
+
+def categorize_by_c3(nc3):
+    """ define the number density category strings"""
+    return categorize_linear(nc3, np.log10(nc3_min), np.log10(nc3_max), c3_color_labels)
+
+############# Si II
+si2_color_labels = [b'low', b'low1', b'low2', b'low3', b'med', b'med1', b'med2', b'med3',
+                      b'high', b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3', b'vhi4']
+
+def categorize_by_si2(nsi2):
+    """ define the number density category strings"""
+    return categorize_linear(nsi2, np.log10(nsi2_min), np.log10(nsi2_max), si2_color_labels)
+
+############# C II
+c2_color_labels = [b'low', b'low1', b'low2', b'low3', b'med', b'med1', b'med2', b'med3',
+                      b'high', b'high1', b'high2', b'high3', b'vhi',
+                      b'vhi1', b'vhi2', b'vhi3', b'vhi4']
+
+def categorize_by_c2(nc2):
+    """ define the number density category strings"""
+    return categorize_linear(nc2, np.log10(nc2_min), np.log10(nc2_max), c2_color_labels)
+
+############# O VII
+o7_color_labels = [b'low', b'low1', b'med', b'med1',
+                      b'high', b'high1', b'vhi',
+                      b'vhi1', b'vhi2']
+
+def categorize_by_o7(no7):
+    """ define the number density category strings"""
+    return categorize_linear(no7, np.log10(no7_min), np.log10(no7_max), o7_color_labels)
+
+#############################################################
+
+
+##################################### more dictionaries that depend on other stuf
+
+proj_max_dict = {'density': 1e-1,
+                 'H_p0_number_density': h1_proj_max,
+                 'C_p1_number_density': c2_max,
+                 'C_p2_number_density': c3_max,
+                 'C_p3_number_density': c4_max,
+                 'Si_p1_number_density': si2_max,
+                 'Si_p2_number_density': si3_max,
+                 'Si_p3_number_density': si4_max,
+                 'Mg_p1_number_density': mg2_max,
+                 'O_p5_number_density': o6_max,
+                 'N_p4_number_density': n5_max,
+                 'O_p6_number_density': o7_max,
+                 'O_p7_number_density': o8_max,
+                 'Ne_p6_number_density': ne7_max,
+                 'Ne_p7_number_density': ne8_max,
+                 'El_number_density': e_max}
+
+proj_min_dict = {'density':1e-6,
+                 'H_p0_number_density':h1_proj_min,
+                 'C_p1_number_density':c2_min,
+                 'C_p2_number_density':c3_min,
+                 'C_p3_number_density':c4_min,
+                 'Si_p1_number_density':si2_min,
+                 'Si_p2_number_density':si3_min,
+                 'Si_p3_number_density':si4_min,
+                 'Mg_p1_number_density':mg2_min,
+                 'O_p5_number_density':o6_min,
+                 'N_p4_number_density': n5_min,
+                 'O_p6_number_density': o7_min,
+                 'O_p7_number_density': o8_min,
+                 'Ne_p6_number_density': ne7_min,
+                 'Ne_p7_number_density':ne8_min,
+                 'El_number_density': e_min}
+
+################################
+# dictionaries for absorber_extraction scripts
+units_dict={'velocity_los' : 'km/s',
+            'x' : 'code_length',
+            'y' : 'code_length',
+            'z' : 'code_length',
+            'radius' : 'kpc',
+            'radius_corrected' : 'kpc',
+            'density' : 'g/cm**3',
+            'metallicity' : 'Zsun',
+            'temperature' : 'K',
+            'radial_velocity' : 'km/s',
+            'radial_velocity_corrected' : 'km/s',
+            'tangential_velocity_corrected' : 'km/s',
+            'vx_corrected' : 'km/s',
+            'vy_corrected' : 'km/s',
+            'vz_corrected' : 'km/s'}
+
+min_absorber_dict= {'H I': 12.5, 'C IV':13, 'O VI':12.8}
+
+# default fields to include in catalog
+default_spice_fields=['x', 'y', 'z', 'radius_corrected',
+                      'density', 'metallicity', 'temperature',
+                      'radial_velocity_corrected', 'cell_mass',
+                      'tangential_velocity_corrected', 'cell_volume',
+                      'vx_corrected', 'vy_corrected', 'vz_corrected',
+                      'cooling_time', 'pressure', 'entropy', 'HSE']
+
+# lims to use in plots by AbsorberPlotter
+plotter_limits_dict = dict(velocity_los=[-600, 600],
+                           metallicity=[0, 1],
+                           temperature=[1e4, 1e9],
+                           density=[1e-30, 1e-26])
+
+############# angle categorisation for -180 to 180 deg (Ayan)
+angle_color_labels_2pi = [b'-(180-157.5)', b'-(157.5-135)', b'-(135-112.5)', b'-(112.5-90)', b'-(90-67.5)',  b'-(67.5-45)', b'-(45-22.5)', b'-(22.5-0)',
+                      b'(0-22.5)', b'(22.5-45)', b'(45-67.5)', b'(67.5-90)', b'(90-112.5)', b'(112.5-135)', b'(135-157.5)', b'(157.5-180)']
+angle_color_names_2pi = ['sienna', 'teal', 'darkblue', 'olive', 'sienna']
+
+def categorize_by_angle_2pi(angle):
+    """ define the angle category strings for angle ranging from -180 to 180 deg"""
+    n = np.size(angle_color_labels_2pi)
+    edges = 180 - 360/n*np.arange(n)[::-1]
+    return categorize(angle, edges, angle_color_labels_2pi, side='left')
+
+############# angle categorisation for 0 to 180 deg (Ayan)
+angle_color_labels_pi = angle_color_labels_2pi[int(len(angle_color_labels_2pi)/2) : ]
+
+def categorize_by_angle_pi(angle):
+    """ define the angle category strings for angle ranging from 0 to 180 deg"""
+    n = np.size(angle_color_labels_pi)
+    edges = 180 - 180/n*np.arange(n)[::-1]
+    return categorize(angle, edges, angle_color_labels_pi, side='left')
@@ -0,0 +1,64 @@
+"""
+Filename: enclosed_mass.py
+This file contains the engine for enclosed-mass profiles of many species at once, and for finding the
+virial radius from them. It is used by:
+-utils/get_mass_profile.py
+-utils/get_rvir.py
+
+Summing x[r <= R] separately for every radius R re-scans every array once per radius. Instead, each
+species (gas cells, dark matter, stars, ...) is sorted by radius once, all of its mass arrays are
+accumulated with one np.cumsum, and the number of elements inside every radius is found with one
+np.searchsorted, so the enclosed masses at all radii come from one pass over the data. The virial
+radius is then read off the same enclosed total mass as the radius where the mean enclosed density
+is closest to 200 times the critical density, as get_rvir.find_rvir has always defined it.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import astropy.units as u
+from astropy.cosmology import Planck15 as cosmo
+
+def enclosed_sums(radius, values, radii):
+    '''Returns the sums over the elements with 'radius' <= each of the radii in 'radii' of each of the
+    arrays in 'values', as an array of shape (len(values), len(radii)). Every array in 'values' must
+    have the same length as 'radius', which is sorted only once for all of them.'''
+
+    radius = np.asarray(radius, dtype=float)
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    order = np.argsort(radius, kind='stable')
+    n_inside = np.searchsorted(radius[order], radii, side='right')
+    cumulative = np.zeros((len(values), len(radius)+1))
+    cumulative[:, 1:] = np.cumsum(values[:, order], axis=1)
+    return cumulative[:, n_inside]
+
+def enclosed_mass_profiles(species, radii):
+    '''Returns a dictionary of the mass enclosed within each of the radii in 'radii' for every mass
+    field of every species in 'species'. 'species' is a dictionary where each entry is a tuple
+    (radius, masses) of the radius of each element of that species (in the same units as 'radii')
+    and a dictionary of mass arrays for those elements, e.g.
+    species = {'gas': (gas_radius, {'gas_mass': gas_mass, 'gas_metal_mass': gas_metal_mass}),
+               'dm': (dm_radius, {'dm_mass': dm_mass})}
+    The returned dictionary has one array of len(radii) for every key of the mass dictionaries.'''
+
+    radii = np.asarray(radii, dtype=float)
+    enclosed = {}
+    for name in species:
+        radius, masses = species[name]
+        keys = list(masses.keys())
+        if (len(keys)==0): continue
+        sums = enclosed_sums(radius, [masses[key] for key in keys], radii)
+        for i in range(len(keys)):
+            enclosed[keys[i]] = sums[i]
+    return enclosed
+
+def find_virial_index(radii, total_mass, redshift, delta=200.):
+    '''Returns the index into 'radii' (in kpc) where the mean density of the enclosed 'total_mass'
+    (in Msun) is closest to 'delta' times the critical density at 'redshift', along with the mean
+    enclosed density in g/cm^3 at every radius and the critical density in g/cm^3.'''
+
+    mass_g = np.asarray(total_mass, dtype=float)*(1.*u.Msun).to('g').value
+    radius_cm = np.asarray(radii, dtype=float)*(1.*u.kpc).to('cm').value
+    internal_density = mass_g/(4*np.pi*radius_cm**3./3.)
+    rho_crit = cosmo.critical_density(redshift).to('g/cm**3').value
+    return np.argmin(np.abs(internal_density - delta*rho_crit)), internal_density, rho_crit
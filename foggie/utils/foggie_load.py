@@ -6,12 +6,14 @@ from astropy.table import Table
 import os
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
 
-from foggie.utils.consistency import *
+from foggie.utils.consistency_constants import *
 from foggie.utils.get_halo_center import get_halo_center
 from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_utils import filter_particles
+from foggie.utils.halo_context import *
+from foggie.utils.snapshot_staging import stage_snapshot, prefetch_snapshot
 import foggie.utils as futils
 import foggie.utils.get_refine_box as grb
 
@@ -48,7 +50,17 @@ def load_sim(args, **kwargs):
 
 def foggie_load(snap, trackfile, **kwargs):
     """This function loads a specified snapshot named by 'snap', the halo track "trackfile'
-    Based off of a helper function to flux_tracking written by Cassi, adapted for utils by JT."""
+    Based off of a helper function to flux_tracking written by Cassi, adapted for utils by JT.
+    The refine box, disk basis, enclosed mass profile and Rvir (and the halo center and bulk velocity,
+    if this snapshot is not in the halo_c_v catalog) are pulled from the halo context store (see
+    utils/halo_context.py) in 'halo_context_dir' if they have been stored for this snapshot, halo and
+    run, and anything that has to be calculated is written back to it. The default 'halo_context_dir'
+    is halo_context/ next to 'halo_c_v_name'. Set use_halo_context=False to ignore the store entirely.
+    Set stage_to_scratch=True to load the snapshot from a copy staged on local disk in 'staging_dir'
+    (see utils/snapshot_staging.py); the source directory is stored as ds.staged_from, to pass to
+    release_snapshot when done. Set prefetch_next to the name of the next snapshot to start staging
+    it in the background. If the halo center has to be calculated, center_method is passed on to
+    get_halo_center ('density', the default, or 'shrinking_sphere')."""
     find_halo_center = kwargs.get('find_halo_center', True)
     halo_c_v_name = kwargs.get('halo_c_v_name', 'halo_c_v')
     disk_relative = kwargs.get('disk_relative', False)
@@ -57,45 +69,73 @@ def foggie_load(snap, trackfile, **kwargs):
     region = kwargs.get('region', 'refine_box')
     gravity = kwargs.get('gravity', False)
     masses_dir = kwargs.get('masses_dir', '')
+    use_halo_context = kwargs.get('use_halo_context', True)
+    halo_context_dir = kwargs.get('halo_context_dir', halo_context_dir_from_halo_c_v(halo_c_v_name))
+    stage_to_scratch = kwargs.get('stage_to_scratch', False)
+    staging_dir = kwargs.get('staging_dir', None)
+    prefetch_next = kwargs.get('prefetch_next', None)
+    center_method = kwargs.get('center_method', 'density')
+
+    if (stage_to_scratch):
+        staged_from = os.path.dirname(os.path.abspath(snap))
+        snap = os.path.join(stage_snapshot(staged_from, staging_dir=staging_dir), os.path.basename(snap))
+    if (prefetch_next is not None):
+        prefetch_snapshot(os.path.dirname(os.path.abspath(prefetch_next)), staging_dir=staging_dir)
 
     print ('Opening snapshot ' + snap)
     ds = yt.load(snap)
+    if (stage_to_scratch): ds.staged_from = staged_from
 
-    track = Table.read(trackfile, format='ascii')
-    track.sort('col1')
+    if (use_halo_context):
+        halo_context_dir = halo_context_subdir(halo_context_dir, halo_c_v_name, trackfile)
+        context = read_halo_context(halo_context_dir, snap)
+    else:
+        context = {}
+    new_context = {}
+
+    track = read_track(trackfile)
 
     # Get the refined box in physical units
     zsnap = ds.get_parameter('CosmologyCurrentRedshift')
     proper_box_size = get_proper_box_size(ds)
-    refine_box, refine_box_center, refine_width_code = grb.get_refine_box(ds, zsnap, track)
+    if ('refine_box_edges' in context):
+        x_left, y_left, z_left, x_right, y_right, z_right = context['refine_box_edges']
+        refine_box_center = [0.5*(x_left+x_right), 0.5*(y_left+y_right), 0.5*(z_left+z_right)]
+        refine_box = ds.r[x_left:x_right, y_left:y_right, z_left:z_right]
+        refine_width_code = np.abs(x_right - x_left)
+    else:
+        refine_box, refine_box_center, refine_width_code = grb.get_refine_box(ds, zsnap, track)
+        new_context['refine_box_edges'] = np.concatenate([refine_box.left_edge.in_units('code_length').v, \
+                                                          refine_box.right_edge.in_units('code_length').v])
     refine_width = refine_width_code * proper_box_size
     refine_width_kpc = YTArray([refine_width], 'kpc')
 
     # Get halo center
     if (find_halo_center):
+        calc_hc = True
         if (os.path.exists(halo_c_v_name)):
-            halo_c_v = Table.read(halo_c_v_name, format='ascii')
-            if (snap[-6:] in halo_c_v['col3']):
+            halo_c_v = read_halo_c_v(halo_c_v_name)
+            if (snap[-6:] in halo_c_v):
                 print("Pulling halo center from catalog file")
-                halo_ind = np.where(halo_c_v['col3']==snap[-6:])[0][0]
-                halo_center_kpc = ds.arr([float(halo_c_v['col4'][halo_ind]), \
-                                          float(halo_c_v['col5'][halo_ind]), \
-                                          float(halo_c_v['col6'][halo_ind])], 'kpc')
-                halo_velocity_kms = ds.arr([float(halo_c_v['col7'][halo_ind]), \
-                                            float(halo_c_v['col8'][halo_ind]), \
-                                            float(halo_c_v['col9'][halo_ind])], 'km/s')
+                halo_center_kpc = ds.arr(halo_c_v[snap[-6:]][0], 'kpc')
+                halo_velocity_kms = ds.arr(halo_c_v[snap[-6:]][1], 'km/s')
                 ds.halo_center_kpc = halo_center_kpc
                 ds.halo_center_code = halo_center_kpc.in_units('code_length')
                 ds.halo_velocity_kms = halo_velocity_kms
                 calc_hc = False
             else:
-                print('This snapshot is not in the halo_c_v file, calculating halo center...')
-                calc_hc = True
+                print('This snapshot is not in the halo_c_v file')
         else:
-            print("This halo_c_v file doesn't exist, calculating halo center...")
-            calc_hc = True
+            print("This halo_c_v file doesn't exist")
+        if (calc_hc) and ('halo_center_kpc' in context) and ('halo_velocity_kms' in context):
+            print("Pulling halo center from halo context file")
+            ds.halo_center_kpc = ds.arr(context['halo_center_kpc'], 'kpc')
+            ds.halo_center_code = ds.halo_center_kpc.in_units('code_length')
+            ds.halo_velocity_kms = ds.arr(context['halo_velocity_kms'], 'km/s')
+            calc_hc = False
         if (calc_hc):
-            halo_center, halo_velocity = get_halo_center(ds, refine_box_center)
+            print('Calculating halo center...')
+            halo_center, halo_velocity = get_halo_center(ds, refine_box_center, method=center_method)
             # Define the halo center in kpc and the halo velocity in km/s
             halo_center_kpc = ds.arr(np.array(halo_center)*proper_box_size, 'kpc')
             sphere_region = ds.sphere(halo_center_kpc, (10., 'kpc') )
@@ -103,6 +143,8 @@ def foggie_load(snap, trackfile, **kwargs):
             ds.halo_center_code = halo_center
             ds.halo_center_kpc = halo_center_kpc
             ds.halo_velocity_kms = bulk_velocity
+            new_context['halo_center_kpc'] = ds.halo_center_kpc.in_units('kpc').v
+            new_context['halo_velocity_kms'] = ds.halo_velocity_kms.in_units('km/s').v
     else:
         print("Not finding halo center")
         ds.halo_center_kpc = ds.arr([np.nan, np.nan, np.nan], 'kpc')
@@ -230,18 +272,24 @@ def foggie_load(snap, trackfile, **kwargs):
 
     # Option to define velocities and coordinates relative to the angular momentum vector of the disk
     if (disk_relative):
-        # Calculate angular momentum vector using sphere centered on halo center
-        sphere = ds.sphere(ds.halo_center_kpc, (15., 'kpc'))
-        print('using particle type ', particle_type_for_angmom, ' to derive angular momentum')
-        L = sphere.quantities.angular_momentum_vector(use_gas=False, use_particles=True, particle_type=particle_type_for_angmom)
-        print('found angular momentum vector')
-        norm_L = L / np.sqrt((L**2).sum())
-        # Define other unit vectors orthagonal to the angular momentum vector
-        np.random.seed(99)
-        x = np.random.randn(3)            # take a random vector
-        x -= x.dot(norm_L) * norm_L       # make it orthogonal to L
-        x /= np.linalg.norm(x)            # normalize it
-        y = np.cross(norm_L, x)           # cross product with L
+        disk_basis_key = 'disk_basis_' + particle_type_for_angmom
+        if (disk_basis_key in context):
+            print('Pulling disk angular momentum basis from halo context file')
+            x, y, norm_L = context[disk_basis_key]
+        else:
+            # Calculate angular momentum vector using sphere centered on halo center
+            sphere = ds.sphere(ds.halo_center_kpc, (15., 'kpc'))
+            print('using particle type ', particle_type_for_angmom, ' to derive angular momentum')
+            L = sphere.quantities.angular_momentum_vector(use_gas=False, use_particles=True, particle_type=particle_type_for_angmom)
+            print('found angular momentum vector')
+            norm_L = L / np.sqrt((L**2).sum())
+            # Define other unit vectors orthagonal to the angular momentum vector
+            np.random.seed(99)
+            x = np.random.randn(3)            # take a random vector
+            x -= x.dot(norm_L) * norm_L       # make it orthogonal to L
+            x /= np.linalg.norm(x)            # normalize it
+            y = np.cross(norm_L, x)           # cross product with L
+            new_context[disk_basis_key] = np.array([np.array(x), np.array(y), np.array(norm_L)])
         x_vec = ds.arr(x)
         y_vec = ds.arr(y)
         L_vec = ds.arr(norm_L)
@@ -287,12 +335,29 @@ def foggie_load(snap, trackfile, **kwargs):
 
     if (gravity):
         # Interpolate enclosed mass function to get tff
-        if (zsnap > 2.):
-            masses = Table.read(masses_dir + 'masses_z-gtr-2.hdf5', path='all_data')
+        if ('Menc_radius' in context) and ('Menc_mass' in context):
+            print('Pulling enclosed mass profile from halo context file')
+            Menc_radius = context['Menc_radius']
+            Menc_mass = context['Menc_mass']
         else:
-            masses = Table.read(masses_dir + 'masses_z-less-2.hdf5', path='all_data')
-        snap_ind = masses['snapshot']==snap[-6:]
-        ds.Menc_profile = IUS(np.concatenate(([0],masses['radius'][snap_ind])), np.concatenate(([0],masses['total_mass'][snap_ind])))
+            if (zsnap > 2.):
+                masses = Table.read(masses_dir + 'masses_z-gtr-2.hdf5', path='all_data')
+            else:
+                masses = Table.read(masses_dir + 'masses_z-less-2.hdf5', path='all_data')
+            snap_ind = masses['snapshot']==snap[-6:]
+            Menc_radius = np.array(masses['radius'][snap_ind])
+            Menc_mass = np.array(masses['total_mass'][snap_ind])
+            new_context['Menc_radius'] = Menc_radius
+            new_context['Menc_mass'] = Menc_mass
+        ds.Menc_profile = IUS(np.concatenate(([0],Menc_radius)), np.concatenate(([0],Menc_mass)))
+        if ('Rvir' in context):
+            ds.Rvir = float(context['Rvir'])
+        elif (os.path.exists(masses_dir + 'rvir_masses.hdf5')):
+            rvir_masses = Table.read(masses_dir + 'rvir_masses.hdf5', path='all_data')
+            rvir_ind = rvir_masses['snapshot']==snap[-6:]
+            if (np.any(rvir_ind)):
+                ds.Rvir = float(rvir_masses['radius'][rvir_ind][0])
+                new_context['Rvir'] = ds.Rvir
         ds.add_field(('gas', 'tff'), function=t_ff, units='yr', display_name='Free fall time', take_log=True, \
                     force_override=True, sampling_type='cell')
         ds.add_field(('gas', 'vff'), function=v_ff, units='km/s', display_name='Free fall velocity', take_log=False, \
@@ -307,6 +372,9 @@ def foggie_load(snap, trackfile, **kwargs):
         ds.add_field(('gas','HSE'), function=hse_ratio, units='', \
                      display_name='HSE Parameter', force_override=True, sampling_type='cell')
 
+    if (use_halo_context) and (len(new_context) > 0):
+        write_halo_context(halo_context_dir, snap, redshift=zsnap, **new_context)
+
     if (region=='refine_box'):
         region = refine_box
     elif (region=='cgm'):
@@ -13,8 +13,7 @@ import pandas as pd
 import numpy as np
 import glob, os
 import argparse
-from foggie.utils.consistency import phase_color_labels, metal_labels, \
-    categorize_by_temp, categorize_by_metals
+from foggie.utils.consistency import categorize_by_temp, categorize_by_metals
 from astropy.table import Table
 
 CORE_WIDTH = 20.
@@ -260,7 +259,7 @@ def ds_to_df(ds, ray_start, ray_end):
     temp = np.log10(all_data['temperature'].ndarray_view())
     metallicity = all_data['metallicity'].ndarray_view()
 
-    # creates the phase_label as a set of nonsense strings.
+    # categorical labels that already carry every phase and metal category
     phase_label = categorize_by_temp(temp)
     metal_label = categorize_by_metals(metallicity)
 
@@ -275,20 +274,4 @@ def ds_to_df(ds, ray_start, ray_end):
                        'temp': temp, 'dens': dens, 'phase_label': phase_label,
                        'metal_label': metal_label})
 
-    df.phase_label = df.phase_label.astype('category')
-    df.metal_label = df.metal_label.astype('category')
-
-    # this is awful, but have to add categories that don't exist to use later.
-    existing_categories = df.phase_label.unique()
-    for label in phase_color_labels:
-        if (not (label in existing_categories)):
-            df.phase_label = df.phase_label.cat.add_categories([
-                                                               label])
-
-    existing_categories = df.metal_label.unique()
-    for label in metal_labels:
-        if (not (label in existing_categories)):
-            df.metal_label = df.metal_label.cat.add_categories([
-                                                               label])
-
     return df
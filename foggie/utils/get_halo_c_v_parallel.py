@@ -9,21 +9,29 @@ center and halo velocity every time new analysis code is run.
 
 This code is very similar to Cassi's get_halo_info_parallel.py, except it only finds the halo's
 center and velocity and nothing else.
+
+The catalog is built incrementally: snapshots that are already in the halo_c_v catalog are skipped,
+the rest are run on a work queue (see utils/snapshot_scheduler.py), and each snapshot's row is
+appended to the catalog under a file lock as soon as it is done, so a crash only loses the
+snapshots that were running and keeping the catalog of a running simulation current only costs the
+new outputs. With --seed, the center search of each snapshot starts from the center of the nearest
+snapshot already in the catalog, moved forward with the halo velocity, and only searches a small
+sphere around it; if the densest cell found is near the edge of that sphere, the full search
+around the halo track is done instead.
 """
 
 import yt
 from yt.units import *
 from yt import YTArray
 from astropy.table import Table
-from astropy.io import ascii
-import multiprocessing as mp
 import argparse
-import shutil
+import fcntl
 
 from foggie.utils.get_refine_box import get_refine_box
 from foggie.utils.get_halo_center import get_halo_center
 from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
+from foggie.utils.snapshot_scheduler import run_snapshots
 import numpy as np
 import glob
 import os
@@ -70,86 +78,134 @@ def parse_args():
                         'code will run one output per processor')
     parser.set_defaults(nproc=4)
 
+    parser.add_argument('--catalog', metavar='catalog', type=str, action='store', \
+                        help='Which halo_c_v catalog to add the new snapshots to? Default is the ' + \
+                        'halo_c_v file in halo_infos for this halo and run')
+    parser.set_defaults(catalog='')
+
+    parser.add_argument('--seed', dest='seed', action='store_true', \
+                        help='Start the center search of each snapshot from the center of the nearest ' + \
+                        'snapshot already in the catalog? Default is no, search around the halo track')
+    parser.set_defaults(seed=False)
+
+    parser.add_argument('--seed_radius', metavar='seed_radius', type=float, action='store', \
+                        help='Radius in kpc of the sphere searched around a seeded center. Default is 10')
+    parser.set_defaults(seed_radius=10.)
+
+    parser.add_argument('--center_method', metavar='center_method', type=str, action='store', \
+                        help='How to find the halo center? Options are density (the densest dark matter ' + \
+                        'cell, default) or shrinking_sphere (iterative center of mass of the particles)')
+    parser.set_defaults(center_method='density')
+
 
     args = parser.parse_args()
     return args
 
-def loop_over_halos(system, nproc, run_dir, trackname, output_dir, outs):
+catalog_names = ('redshift', 'name', 'xc', 'yc', 'zc', 'xv', 'yv', 'zv')
+
+def read_catalog(catalog):
+    '''Returns a dictionary mapping snapshot name to (redshift, center, velocity) for every row of the
+    halo_c_v catalog 'catalog', where center is in physical kpc and velocity is in km/s, or an empty
+    dictionary if the catalog does not exist yet.'''
+
+    rows = {}
+    if not (os.path.exists(catalog)): return rows
+    with open(catalog) as f:
+        for line in f:
+            fields = [field.strip() for field in line.strip().strip('|').split('|')]
+            if (len(fields)!=len(catalog_names)): continue
+            try:
+                values = [float(field) for field in fields[:1] + fields[2:]]
+            except ValueError:
+                continue        # header line
+            rows[fields[1]] = (values[0], np.array(values[1:4]), np.array(values[4:7]))
+    return rows
+
+def append_to_catalog(catalog, row):
+    '''Appends 'row' (redshift, name, xc, yc, zc, xv, yv, zv) to the halo_c_v catalog 'catalog' as one
+    line, writing the header first if the catalog is new. The catalog is locked while writing so
+    that rows from parallel processes never interleave.'''
+
+    line = '| ' + ' | '.join([repr(float(row[0])), str(row[1])] + [repr(float(value)) for value in row[2:]]) + ' |\n'
+    with open(catalog, 'a+b') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0, os.SEEK_END)
+        if (f.tell()==0):
+            line = '| ' + ' | '.join(catalog_names) + ' |\n' + line
+        else:
+            # Existing catalogs may not end with a newline
+            f.seek(-1, os.SEEK_END)
+            if (f.read(1)!=b'\n'): line = '\n' + line
+        f.write(line.encode())
+        f.flush()
+        os.fsync(f.fileno())
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+def loop_over_halos(system, nproc, run_dir, trackname, catalog, outs, seed=False, seed_radius=10., center_method='density'):
     '''
     This sets up the parallel processing for finding the halo centers of all datasets in 'outs'.
     It also takes the number of processors to use, 'nproc', the directory where the snapshots
-    can be found, 'run_dir', the file name of the halo track file, 'trackname', and the directory where
-    the new halo_v_c file should be placed, 'output_dir'.
+    can be found, 'run_dir', the file name of the halo track file, 'trackname', and the halo_c_v
+    catalog the new snapshots should be added to, 'catalog'. Snapshots already in the catalog are
+    skipped. If 'seed' is True, each center search starts from the nearest snapshot already in the
+    catalog and only searches a sphere of radius 'seed_radius' kpc. 'center_method' is passed on to
+    get_halo_center.
     '''
     print("opening track: " + trackname)
     track = Table.read(trackname, format='ascii')
     track.sort('col1')
 
-    t = Table(dtype=('f8','S6', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8'),
-            names=('redshift', 'name', 'xc', 'yc', 'zc', 'xv', 'yv', 'zv'))
-
-    print('Computing centers and velocities for ' + str(len(outs)) + ' snaps ' + \
-          'from ' + outs[0] + ' to ' + outs[-1])
-    # Split into a number of groupings equal to the number of processors
-    # and run one process per processor
-    rows = []
-    for i in range(len(outs)//nproc):
-        threads = []
-        queue = mp.Queue()
-        for j in range(nproc):
-            snap = run_dir + outs[nproc*i+j] + '/' + outs[nproc*i+j]
-            thr = mp.Process(target=get_halo_info, \
-               args=(system, snap, track, queue))
-            threads.append(thr)
-            thr.start()
-        for thr in threads:
-            row = queue.get()
-            rows.append(row)
-        for thr in threads:
-            thr.join()
-    # For any leftover snapshots, run one per processor
-    threads = []
-    queue = mp.Queue()
-    for j in range(len(outs)%nproc):
-        snap = run_dir + outs[-(j+1)] + '/' + outs[-(j+1)]
-        thr = mp.Process(target=get_halo_info, \
-           args=(system, snap, track, queue))
-        threads.append(thr)
-        thr.start()
-    for thr in threads:
-        row = queue.get()
-        rows.append(row)
-    for thr in threads:
-        thr.join()
-
-    for row in rows:
-        t.add_row(row)
-
-    t.sort('redshift')
-    t.reverse()
-    ascii.write(t, output_dir + 'halo_c_v_' + outs[0] + '_' + outs[-1], format='fixed_width', overwrite=True)
-
-def get_halo_info(system, snap, track, t):
+    done = read_catalog(catalog)
+    print('Computing centers and velocities for ' + str(len([snap for snap in outs if snap not in done])) + \
+          ' new snaps from ' + outs[0] + ' to ' + outs[-1] + ', adding them to ' + catalog)
+    # Run one snapshot per processor, starting the next snapshot as soon as any processor is free
+    run_snapshots(get_halo_info, outs, nproc=nproc, \
+      args_for=lambda snap: (system, run_dir + snap + '/' + snap, track, catalog, seed, seed_radius, center_method), \
+      skip=lambda snap: snap in done)
+
+def seed_center(ds, zsnap, catalog, max_dt=50.):
+    '''Returns the center in physical kpc predicted for the snapshot 'ds' at redshift 'zsnap' from the
+    snapshot in the halo_c_v catalog 'catalog' nearest to it in redshift, by moving that snapshot's
+    center with the expansion of the universe and the halo velocity, or None if no snapshot in the
+    catalog is within 'max_dt' Myr.'''
+
+    rows = read_catalog(catalog)
+    if (ds.parameter_filename[-6:] in rows): del rows[ds.parameter_filename[-6:]]
+    if (len(rows)==0): return None
+    nearest = min(rows.keys(), key=lambda name: abs(rows[name][0] - zsnap))
+    redshift, center, velocity = rows[nearest]
+    dt = ds.cosmology.t_from_z(zsnap) - ds.cosmology.t_from_z(redshift)
+    if (abs(dt.in_units('Myr')) > max_dt): return None
+    print('Seeding center of ' + ds.parameter_filename[-6:] + ' from ' + nearest)
+    # Physical positions grow with the scale factor, and the halo moves with its peculiar velocity
+    return ds.arr(center*(1.+redshift)/(1.+zsnap), 'kpc') + (ds.arr(velocity, 'km/s')*dt).in_units('kpc')
+
+def get_halo_info(system, snap, track, catalog, seed=False, seed_radius=10., center_method='density'):
     '''
     This finds the halo center and halo velocity for a snapshot 'snap', using the halo track 'track',
-    and saves it to the multiprocessing queue 't'.
+    and appends it to the halo_c_v catalog 'catalog'. If 'seed' is True, the search starts from the
+    center predicted from the nearest snapshot already in the catalog (see seed_center) and only
+    covers 'seed_radius' kpc around it. 'center_method' is passed on to get_halo_center.
     '''
 
-    '''if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap[-6:]
-        shutil.copytree(snap[:-7], snap_dir)
-        snap_name = snap_dir + '/' + snap[-6:]
-    else: snap_name = snap'''
-    snap_name = snap
-
     print('Loading ' + snap[-6:])
-    ds = yt.load(snap_name)
+    ds = yt.load(snap)
 
     zsnap = ds.get_parameter('CosmologyCurrentRedshift')
     proper_box_size = get_proper_box_size(ds)
     refine_box, refine_box_center, refine_width = get_refine_box(ds, zsnap, track)
-    center, velocity = get_halo_center(ds, refine_box_center)
+    center = None
+    if (seed):
+        guess_kpc = seed_center(ds, zsnap, catalog)
+        if (guess_kpc is not None):
+            center, velocity = get_halo_center(ds, guess_kpc, radius=seed_radius, method=center_method)
+            offset = ds.arr(np.array(center)*proper_box_size, 'kpc') - guess_kpc
+            # The densest cell is on the edge of the small sphere, so the real center may be outside it
+            if (np.sqrt(np.sum(offset**2.)) > 0.8*ds.quan(seed_radius, 'kpc')):
+                print('Seeded center of ' + snap[-6:] + ' is near the edge of the search sphere, searching around the track')
+                center = None
+    if (center is None):
+        center, velocity = get_halo_center(ds, refine_box_center, method=center_method)
     halo_center_kpc = ds.arr(np.array(center)*proper_box_size, 'kpc')
     sphere_region = ds.sphere(halo_center_kpc, (10., 'kpc') )
     halo_velocity_kms = sphere_region.quantities['BulkVelocity']().in_units('km/s')
@@ -157,11 +213,8 @@ def get_halo_info(system, snap, track, t):
     row = [zsnap, ds.parameter_filename[-6:],
             halo_center_kpc[0], halo_center_kpc[1], halo_center_kpc[2],
             halo_velocity_kms[0], halo_velocity_kms[1], halo_velocity_kms[2]]
+    append_to_catalog(catalog, row)
     print(snap[-6:] + ' done')
-    t.put(row)
-    '''if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)'''
 
     ds.index.clear_all_data()
 
@@ -174,8 +227,11 @@ if __name__ == "__main__":
     warnings.filterwarnings('ignore', category=DeprecationWarning)
 
     foggie_dir, output_dir, run_dir, code_path, trackname, haloname, spectra_dir, infofile = get_run_loc_etc(args)
-    output_dir = output_dir + 'halo_centers/' + 'halo_00' + args.halo + '/' + args.run + '/'
-    if not (os.path.exists(output_dir)): os.system('mkdir -p ' + output_dir)
+    if (args.catalog==''):
+        catalog = code_path + 'halo_infos/00' + args.halo + '/' + args.run + '/halo_c_v'
+    else:
+        catalog = args.catalog
+    if not (os.path.exists(os.path.dirname(catalog))): os.system('mkdir -p ' + os.path.dirname(catalog))
     run_dir = foggie_dir + run_dir
 
     # Build output list
@@ -225,7 +281,7 @@ if __name__ == "__main__":
             outs.append(output_type + pad + str(i))
     else: outs = [args.output]
 
-    loop_over_halos(args.system, args.nproc, run_dir, trackname, output_dir, outs)
+    loop_over_halos(args.system, args.nproc, run_dir, trackname, catalog, outs, seed=args.seed, seed_radius=args.seed_radius, center_method=args.center_method)
 
     warnings.filterwarnings('default', category=FutureWarning)
     warnings.filterwarnings('default', category=DeprecationWarning)
@@ -1,17 +1,144 @@
 """
 Obtains center position for a halo, and the x,y,z velocity components.
+
+There are two ways of finding the center. The default, method='density', takes the cell with the
+highest dark matter density within a sphere around the center guess. method='shrinking_sphere'
+reads the positions, masses and velocities of the dark matter (and optionally star) particles in
+the sphere once, then repeatedly takes the center of mass of the particles inside a sphere and
+shrinks the sphere around it, keeping only the particles still inside so every step is cheaper than
+the last. This is not limited to the cell size and is not thrown off by a single dense cell. The
+halo velocity is the mass-weighted mean velocity of the particles near the final center, and the
+center and velocity are returned in both code and physical units from the same read.
 """
 from __future__ import print_function
+import time
 import numpy as np
 
+def shrinking_sphere_center(ds, center_guess, **kwargs):
+    """
+    Finds the halo center with the shrinking-sphere algorithm on particles within 'radius' kpc of
+    'center_guess', which is either a YTArray or a position in code units. Optional arguments are:
+    radius          -- radius of the starting sphere in kpc. Default is 50
+    particle_types  -- particle types to use. Default is ['dm'], add 'stars' to include stars
+    shrink_factor   -- the sphere radius is multiplied by this at each step. Default is 0.7
+    min_radius      -- stop once the sphere is smaller than this many kpc. Default is 0.5
+    min_particles   -- stop before the sphere holds fewer than this many particles. Default is 100
+    tolerance       -- stop once the center moves less than this many kpc in a step. Default is 0,
+                       i.e. always shrink down to min_radius
+    max_particles   -- if given, a random subset of at most this many particles is used for the
+                       iterations, trading precision for speed. Default is to use all of them
+    velocity_radius -- the velocity is the mean of the particles within this many kpc of the center.
+                       Default is 5
+    timing          -- print how long the read and the iterations took? Default is no
+    Returns a dictionary with the center ('center_code', 'center_kpc') and velocity ('velocity_code',
+    'velocity_kms') as YTArrays, the final sphere radius in kpc ('radius_kpc'), the number of
+    particles inside it around the final center ('n_particles', counting only the subset if
+    max_particles is given), the number of steps ('n_iterations'), and the time in seconds spent
+    reading particles ('read_time') and iterating ('find_time'). If the starting sphere already
+    holds fewer than min_particles particles, no step is taken and a warning is printed.
+    """
+
+    radius = kwargs.get('radius', 50.)
+    particle_types = kwargs.get('particle_types', ['dm'])
+    shrink_factor = kwargs.get('shrink_factor', 0.7)
+    min_radius = kwargs.get('min_radius', 0.5)
+    min_particles = kwargs.get('min_particles', 100)
+    tolerance = kwargs.get('tolerance', 0.)
+    max_particles = kwargs.get('max_particles', None)
+    velocity_radius = kwargs.get('velocity_radius', 5.)
+    timing = kwargs.get('timing', False)
+
+    from foggie.utils.foggie_utils import filter_particles
+
+    if (hasattr(center_guess, 'units')):
+        center = np.array(center_guess.in_units('kpc').v, dtype=float)
+    else:
+        center = ds.arr(center_guess, 'code_length').in_units('kpc').v
+
+    # Read every particle field that is needed exactly once, in physical units
+    start = time.time()
+    sphere = ds.sphere(ds.arr(center, 'kpc'), (radius, 'kpc'))
+    filter_particles(sphere, filter_particle_types=particle_types)
+    pos = []
+    vel = []
+    mass = []
+    for ptype in particle_types:
+        pos.append(np.array([sphere[ptype, 'particle_position_' + axis].in_units('kpc').v for axis in ['x', 'y', 'z']]).T)
+        vel.append(np.array([sphere[ptype, 'particle_velocity_' + axis].in_units('km/s').v for axis in ['x', 'y', 'z']]).T)
+        mass.append(sphere[ptype, 'particle_mass'].in_units('Msun').v)
+    pos = np.concatenate(pos).reshape(-1, 3)
+    vel = np.concatenate(vel).reshape(-1, 3)
+    mass = np.concatenate(mass)
+    read_time = time.time() - start
+
+    start = time.time()
+    if (max_particles is not None) and (len(mass) > max_particles):
+        subset = np.random.RandomState(0).choice(len(mass), max_particles, replace=False)
+        sub_pos = pos[subset]
+        sub_mass = mass[subset]
+    else:
+        sub_pos = pos
+        sub_mass = mass
+    n_iterations = 0
+    final_radius = radius
+    while (radius >= min_radius):
+        inside = np.sum((sub_pos - center)**2., axis=1) < radius**2.
+        if (np.count_nonzero(inside) < min_particles): break
+        sub_pos = sub_pos[inside]
+        sub_mass = sub_mass[inside]
+        new_center = np.sum(sub_pos*sub_mass[:,np.newaxis], axis=0)/np.sum(sub_mass)
+        shift = np.sqrt(np.sum((new_center - center)**2.))
+        center = new_center
+        final_radius = radius
+        n_iterations += 1
+        if (shift < tolerance): break
+        radius *= shrink_factor
+    if (n_iterations==0):
+        print('Warning: shrinking_sphere_center took no steps, the starting sphere of %.2f kpc holds %d particles ' % \
+              (radius, len(sub_mass)) + '(min_particles=%d, min_radius=%.2f kpc), returning the center guess' % \
+              (min_particles, min_radius))
+    n_particles = np.count_nonzero(np.sum((sub_pos - center)**2., axis=1) < final_radius**2.)
+
+    near = np.sum((pos - center)**2., axis=1) < velocity_radius**2.
+    if (np.count_nonzero(near) > 0):
+        velocity = np.sum(vel[near]*mass[near][:,np.newaxis], axis=0)/np.sum(mass[near])
+    else:
+        velocity = np.array([np.nan, np.nan, np.nan])
+    find_time = time.time() - start
+
+    if (timing):
+        print('shrinking_sphere_center: read %d particles in %.2f s, %d steps in %.3f s' % \
+              (len(mass), read_time, n_iterations, find_time))
+
+    center_kpc = ds.arr(center, 'kpc')
+    velocity_kms = ds.arr(velocity, 'km/s')
+    return {'center_code':center_kpc.in_units('code_length'), 'center_kpc':center_kpc,
+            'velocity_code':velocity_kms.in_units('code_velocity'), 'velocity_kms':velocity_kms,
+            'radius_kpc':final_radius, 'n_particles':n_particles, 'n_iterations':n_iterations,
+            'read_time':read_time, 'find_time':find_time}
+
 def get_halo_center(ds, center_guess, **kwargs):
     """
     Inputs are a dataset, and the center_guess.
     Outputs center and velocity tuples composed of x,y,z coordinates.
+    Set method='shrinking_sphere' to find the center from particles instead of the densest cell,
+    any other keyword arguments are passed on to shrinking_sphere_center.
     """
 
     radius = kwargs.get('radius', 50.)  # search radius in kpc
     units = kwargs.get('units', 'code')
+    method = kwargs.get('method', 'density')
+
+    if (method=='shrinking_sphere'):
+        result = shrinking_sphere_center(ds, center_guess, **kwargs)
+        if (units == 'physical'):
+            halo_center, velocity = result['center_kpc'], result['velocity_kms']
+        else:
+            halo_center, velocity = result['center_code'], result['velocity_code']
+        halo_center = [float(halo_center[i]) for i in range(3)]
+        velocity = [velocity[i] for i in range(3)]
+        print('Located the main halo at:', halo_center, velocity)
+        return halo_center, velocity
 
     length = 'code_length'
     vel = 'code_velocity'
@@ -20,17 +147,13 @@ def get_halo_center(ds, center_guess, **kwargs):
     sphere_region = ds.sphere(center_guess, (radius, 'kpc'))
     print("we have obtained the spherical region")
 
-    x_pos, y_pos, z_pos = np.array(sphere_region["x"].in_units(length)), \
-                          np.array(sphere_region["y"].in_units(length)), \
-                          np.array(sphere_region["z"].in_units(length))
-
     dm_density = sphere_region['Dark_Matter_Density']
     print("we have extracted the DM density")
 
     # now determine the location of the highest DM density, which should be the
-    # center of the main halo
-    imax = (np.where(dm_density > 0.9999 * np.max(dm_density)))[0]
-    halo_center = [x_pos[imax[0]], y_pos[imax[0]], z_pos[imax[0]]]
+    # center of the main halo (the first cell within 0.9999 of the maximum)
+    imax = np.argmax(dm_density > 0.9999 * np.max(dm_density))
+    halo_center = [float(sphere_region[axis][imax].in_units(length)) for axis in ['x', 'y', 'z']]
     print(" we have obtained the preliminary center")
 
     sph = ds.sphere(halo_center, (5., 'kpc'))
@@ -39,14 +162,9 @@ def get_halo_center(ds, center_guess, **kwargs):
                 np.mean(sph['z-velocity'])]
     print("got the velocities")
 
-    if (units == 'physical'): # do it over again but in the physical units
-        x_pos, y_pos, z_pos = np.array(sphere_region["x"].in_units('kpc')), \
-                              np.array(sphere_region["y"].in_units('kpc')), \
-                              np.array(sphere_region["z"].in_units('kpc'))
-        halo_center = [x_pos[imax[0]], y_pos[imax[0]], z_pos[imax[0]]]
-        velocity = [np.mean(sph['x-velocity'].in_units('km/s')),
-                        np.mean(sph['y-velocity'].in_units('km/s')),
-                        np.mean(sph['z-velocity'].in_units('km/s'))]
+    if (units == 'physical'): # convert the same center and velocities to physical units
+        halo_center = [float(value) for value in ds.arr(halo_center, length).in_units('kpc')]
+        velocity = [v.in_units('km/s') for v in velocity]
 
     print('Located the main halo at:', halo_center, velocity)
 
@@ -23,7 +23,6 @@ from astropy.table import Table
 from astropy.io import ascii
 import multiprocessing as multi
 import datetime
-import shutil
 import trident
 
 # These imports are FOGGIE-specific files
@@ -34,6 +33,8 @@ from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
+from foggie.utils.enclosed_mass import enclosed_mass_profiles, find_virial_index
 
 
 def parse_args():
@@ -112,21 +113,19 @@ def calc_masses(ds, snap, zsnap, refine_width_kpc, tablename, ions=True):
 
     halo_center_kpc = ds.halo_center_kpc
 
-    # Set up table of everything we want
+    # Columns of the table of everything we want
     # NOTE: Make sure table units are updated when things are added to this table!
+    names = ['redshift', 'snapshot', 'radius', 'total_mass', 'dm_mass', 'stars_mass', \
+             'young_stars_mass', 'old_stars_mass', 'sfr', 'gas_mass', 'gas_metal_mass']
+    gas_fields = [('gas_mass', 'cell_mass'), ('gas_metal_mass', 'metal_mass')]
     if (ions):
-        data = Table(names=('redshift', 'snapshot', 'radius', 'total_mass', 'dm_mass', \
-                            'stars_mass', 'young_stars_mass', 'old_stars_mass', 'sfr', 'gas_mass', \
-                            'gas_metal_mass', 'gas_H_mass', 'gas_HI_mass', 'gas_HII_mass', 'gas_CII_mass', \
-                            'gas_CIII_mass', 'gas_CIV_mass', 'gas_OVI_mass', 'gas_OVII_mass', 'gas_MgII_mass', \
-                            'gas_SiII_mass', 'gas_SiIII_mass', 'gas_SiIV_mass', 'gas_NeVIII_mass'), \
-                     dtype=('f8', 'S6', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', \
-                            'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8'))
-    else:
-        data = Table(names=('redshift', 'snapshot', 'radius', 'total_mass', 'dm_mass', \
-                            'stars_mass', 'young_stars_mass', 'old_stars_mass', 'sfr', 'gas_mass', \
-                            'gas_metal_mass'), \
-                     dtype=('f8', 'S6', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8', 'f8'))
+        ion_fields = [('gas_H_mass', 'H_mass'), ('gas_HI_mass', 'H_p0_mass'), ('gas_HII_mass', 'H_p1_mass'), \
+                      ('gas_CII_mass', 'C_p1_mass'), ('gas_CIII_mass', 'C_p2_mass'), ('gas_CIV_mass', 'C_p3_mass'), \
+                      ('gas_OVI_mass', 'O_p5_mass'), ('gas_OVII_mass', 'O_p6_mass'), ('gas_MgII_mass', 'Mg_p1_mass'), \
+                      ('gas_SiII_mass', 'Si_p1_mass'), ('gas_SiIII_mass', 'Si_p2_mass'), ('gas_SiIV_mass', 'Si_p3_mass'), \
+                      ('gas_NeVIII_mass', 'Ne_p7_mass')]
+        gas_fields += ion_fields
+        names += [name for (name, field) in ion_fields]
 
     # Define the radii of the spheres where we want to calculate mass enclosed
     radii = refine_width_kpc * np.logspace(-2,.7,250)
@@ -136,75 +135,28 @@ def calc_masses(ds, snap, zsnap, refine_width_kpc, tablename, ions=True):
     print('Loading field arrays')
     sphere = ds.sphere(halo_center_kpc, radii[-1])
 
-    gas_mass = sphere['gas','cell_mass'].in_units('Msun').v
-    gas_metal_mass = sphere['gas','metal_mass'].in_units('Msun').v
-    if (ions):
-        gas_H_mass = sphere['gas','H_mass'].in_units('Msun').v
-        gas_HI_mass = sphere['gas','H_p0_mass'].in_units('Msun').v
-        gas_HII_mass = sphere['gas','H_p1_mass'].in_units('Msun').v
-        gas_CII_mass = sphere['gas','C_p1_mass'].in_units('Msun').v
-        gas_CIII_mass = sphere['gas','C_p2_mass'].in_units('Msun').v
-        gas_CIV_mass = sphere['gas','C_p3_mass'].in_units('Msun').v
-        gas_OVI_mass = sphere['gas','O_p5_mass'].in_units('Msun').v
-        gas_OVII_mass = sphere['gas','O_p6_mass'].in_units('Msun').v
-        gas_MgII_mass = sphere['gas','Mg_p1_mass'].in_units('Msun').v
-        gas_SiII_mass = sphere['gas','Si_p1_mass'].in_units('Msun').v
-        gas_SiIII_mass = sphere['gas','Si_p2_mass'].in_units('Msun').v
-        gas_SiIV_mass = sphere['gas','Si_p3_mass'].in_units('Msun').v
-        gas_NeVIII_mass = sphere['gas','Ne_p7_mass'].in_units('Msun').v
-    dm_mass = sphere['dm','particle_mass'].in_units('Msun').v
-    stars_mass = sphere['stars','particle_mass'].in_units('Msun').v
-    young_stars_mass = sphere['young_stars','particle_mass'].in_units('Msun').v
-    old_stars_mass = sphere['old_stars','particle_mass'].in_units('Msun').v
-    gas_radius = sphere['gas','radius_corrected'].in_units('kpc').v
-    dm_radius = sphere['dm','radius_corrected'].in_units('kpc').v
-    stars_radius = sphere['stars','radius_corrected'].in_units('kpc').v
-    young_stars_radius = sphere['young_stars','radius_corrected'].in_units('kpc').v
-    old_stars_radius = sphere['old_stars','radius_corrected'].in_units('kpc').v
-
-    # Loop over radii
-    for i in range(len(radii)):
-
-        if (i%10==0): print("Computing radius " + str(i) + "/" + str(len(radii)-1) + \
-                            " for snapshot " + snap)
-
-        # Cut the data interior to this radius
-        gas_mass_enc = np.sum(gas_mass[gas_radius <= radii[i]])
-        gas_metal_mass_enc = np.sum(gas_metal_mass[gas_radius <= radii[i]])
-        if (ions):
-            gas_H_mass_enc = np.sum(gas_H_mass[gas_radius <= radii[i]])
-            gas_HI_mass_enc = np.sum(gas_HI_mass[gas_radius <= radii[i]])
-            gas_HII_mass_enc = np.sum(gas_HII_mass[gas_radius <= radii[i]])
-            gas_CII_mass_enc = np.sum(gas_CII_mass[gas_radius <= radii[i]])
-            gas_CIII_mass_enc = np.sum(gas_CIII_mass[gas_radius <= radii[i]])
-            gas_CIV_mass_enc = np.sum(gas_CIV_mass[gas_radius <= radii[i]])
-            gas_OVI_mass_enc = np.sum(gas_OVI_mass[gas_radius <= radii[i]])
-            gas_OVII_mass_enc = np.sum(gas_OVII_mass[gas_radius <= radii[i]])
-            gas_MgII_mass_enc = np.sum(gas_MgII_mass[gas_radius <= radii[i]])
-            gas_SiII_mass_enc = np.sum(gas_SiII_mass[gas_radius <= radii[i]])
-            gas_SiIII_mass_enc = np.sum(gas_SiIII_mass[gas_radius <= radii[i]])
-            gas_SiIV_mass_enc = np.sum(gas_SiIV_mass[gas_radius <= radii[i]])
-            gas_NeVIII_mass_enc = np.sum(gas_NeVIII_mass[gas_radius <= radii[i]])
-        dm_mass_enc = np.sum(dm_mass[dm_radius <= radii[i]])
-        stars_mass_enc = np.sum(stars_mass[stars_radius <= radii[i]])
-        young_stars_mass_enc = np.sum(young_stars_mass[young_stars_radius <= radii[i]])
-        old_stars_mass_enc = np.sum(old_stars_mass[old_stars_radius <= radii[i]])
-        sfr_enc = young_stars_mass_enc/1.e7
-        total_mass_enc = gas_mass_enc + dm_mass_enc + stars_mass_enc
-
-        # Add everything to the table
-        if (ions):
-            data.add_row([zsnap, snap, radii[i], total_mass_enc, dm_mass_enc, stars_mass_enc, \
-                        young_stars_mass_enc, old_stars_mass_enc, sfr_enc, gas_mass_enc, gas_metal_mass_enc, \
-                        gas_H_mass_enc, gas_HI_mass_enc, gas_HII_mass_enc, gas_CII_mass_enc, \
-                        gas_CIII_mass_enc, gas_CIV_mass_enc, gas_OVI_mass_enc, gas_OVII_mass_enc, \
-                        gas_MgII_mass_enc, gas_SiII_mass_enc, gas_SiIII_mass_enc, gas_SiIV_mass_enc, \
-                        gas_NeVIII_mass_enc])
-        else:
-            data.add_row([zsnap, snap, radii[i], total_mass_enc, dm_mass_enc, stars_mass_enc, \
-                        young_stars_mass_enc, old_stars_mass_enc, sfr_enc, gas_mass_enc, gas_metal_mass_enc])
+    species = {}
+    species['gas'] = (sphere['gas','radius_corrected'].in_units('kpc').v, \
+                      dict((name, sphere['gas',field].in_units('Msun').v) for (name, field) in gas_fields))
+    for ptype in ['dm', 'stars', 'young_stars', 'old_stars']:
+        species[ptype] = (sphere[ptype,'radius_corrected'].in_units('kpc').v, \
+                          {ptype + '_mass': sphere[ptype,'particle_mass'].in_units('Msun').v})
+
+    # Sort each species by radius once and accumulate its masses out to every radius
+    print('Computing enclosed masses at ' + str(len(radii)) + ' radii for snapshot ' + snap)
+    enclosed = enclosed_mass_profiles(species, radii.v)
+    enclosed['sfr'] = enclosed['young_stars_mass']/1.e7
+    enclosed['total_mass'] = enclosed['gas_mass'] + enclosed['dm_mass'] + enclosed['stars_mass']
+    enclosed['redshift'] = np.full(len(radii), zsnap, dtype=float)
+    enclosed['snapshot'] = np.array([snap]*len(radii), dtype='S6')
+    enclosed['radius'] = radii.v
+
+    # Virial radius and mass from the same enclosed mass profile
+    ivir, internal_density, rho_crit = find_virial_index(radii.v, enclosed['total_mass'], zsnap)
+    print('Rvir = %.2f kpc, Mvir = %.4e Msun for snapshot %s' % (radii.v[ivir], enclosed['total_mass'][ivir], snap))
 
     # Save to file
+    data = Table([enclosed[name] for name in names], names=names)
     data = set_table_units(data)
     data.write(tablename + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
 
@@ -217,11 +169,8 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     If 'ions' is True then it computes the enclosed mass of various gas-phase ions.'''
 
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     ds, refine_box = foggie_load(snap_name, track, halo_c_v_name=halo_c_v_name)
     refine_width_kpc = ds.quan(ds.refine_width, 'kpc')
     zsnap = ds.get_parameter('CosmologyCurrentRedshift')
@@ -230,9 +179,8 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
 
     # Do the actual calculation
     message = calc_masses(ds, snap, zsnap, refine_width_kpc, tablename, ions=ions)
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
     print(message)
     print(str(datetime.datetime.now()))
 
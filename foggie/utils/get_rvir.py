@@ -8,7 +8,6 @@ This file calculates the virial radius (R200) and the total/dark/gas/star mass i
 '''
 import glob
 from glob import glob
-import yt
 from astropy.io import ascii
 from yt.units import kpc
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
@@ -20,6 +19,7 @@ import numpy as np
 from numpy import *
 import argparse
 from foggie.utils.foggie_load import *
+from foggie.utils.enclosed_mass import enclosed_mass_profiles, find_virial_index
 from scipy.interpolate import interp1d
 import os.path
 
@@ -175,38 +175,34 @@ def make_fig(args, masses_trim, internal_density, rho_crit, data):
 
 
 def find_rvir(ds, halo_center = None, do_fig = False, sphere_radius = 250*kpc, figdir = '.', n_bins = 500):
-    """Calculate rvir and M(<rvir), return results in a dictionary
+    """Calculate rvir and M(<rvir), return results in a dictionary.
+    The dark matter, stars and gas masses enclosed within n_bins log-spaced radii out to
+    sphere_radius all come from one pass over the sphere (see enclosed_mass.py).
     """
     from yt.units import kpc
     sp_find_rvir = ds.sphere(center = halo_center, radius = sphere_radius)
     filter_particles(sp_find_rvir)
 
-    print ('measuring dm mass profile')
-    prof_dm = yt.create_profile(sp_find_rvir, ('index', 'radius'), fields = [('deposit', 'dm_mass')], \
-                                n_bins = n_bins, weight_field = None, accumulation = True)
-    print ('measuring stars mass profile')
-    prof_stars = yt.create_profile(sp_find_rvir, ('index', 'radius'), fields = [('deposit', 'stars_mass')], \
-                                  n_bins = n_bins, weight_field = None, accumulation = True)
-    print ('measuring gas mass profile')
-    prof_gas     = yt.create_profile(sp_find_rvir, ('index', 'radius'), fields = [('gas', 'cell_mass')],\
-                                     n_bins = n_bins, weight_field = None, accumulation = True)
+    print ('measuring dm, stars and gas mass profiles')
+    gas_radius = sp_find_rvir[('index', 'radius')].in_units('kpc').v
+    species = {'dm': (sp_find_rvir[('dm', 'particle_radius')].in_units('kpc').v, \
+                      {'dm_mass': sp_find_rvir[('dm', 'particle_mass')].in_units('Msun').v}), \
+               'stars': (sp_find_rvir[('stars', 'particle_radius')].in_units('kpc').v, \
+                         {'stars_mass': sp_find_rvir[('stars', 'particle_mass')].in_units('Msun').v}), \
+               'gas': (gas_radius, {'gas_mass': sp_find_rvir[('gas', 'cell_mass')].in_units('Msun').v})}
+    radii = np.logspace(np.log10(np.min(gas_radius[gas_radius > 0])), \
+                        np.log10(sp_find_rvir.radius.in_units('kpc').v), n_bins)
+    enclosed = enclosed_mass_profiles(species, radii)
+    total_mass = enclosed['dm_mass'] + enclosed['stars_mass'] + enclosed['gas_mass']
 
-
-    internal_density =  (prof_dm[('deposit', 'dm_mass')].to('g') + prof_stars[('deposit', 'stars_mass')].to('g') + prof_gas[('gas', 'cell_mass')].to('g'))/(4*np.pi*prof_dm.x.to('cm')**3./3.)
-
-    rho_crit = cosmo.critical_density(ds.current_redshift)
-    rvir = prof_dm.x[argmin(abs(internal_density.value - 200*rho_crit.value))]
-    Mdm_rvir    = prof_dm[('deposit', 'dm_mass')][argmin(abs(internal_density.value - 200*rho_crit.value))]
-    Mstars_rvir = prof_stars[('deposit', 'stars_mass')][argmin(abs(internal_density.value - 200*rho_crit.value))]
-    Mgas_rvir   = prof_gas[('gas', 'cell_mass')][argmin(abs(internal_density.value - 200*rho_crit.value))]
-    Mvir = Mdm_rvir + Mstars_rvir + Mgas_rvir
+    ivir, internal_density, rho_crit = find_virial_index(radii, total_mass, ds.current_redshift)
 
     res = {}
-    res['rvir']        = rvir.to('kpc')
-    res['Mvir']        = Mvir.to('Msun')
-    res['Mgas_rvir']   = Mgas_rvir.to('Msun')
-    res['Mdm_rvir']    = Mdm_rvir.to('Msun')
-    res['Mstars_rvir'] = Mstars_rvir.to('Msun')
+    res['rvir']        = ds.quan(radii[ivir], 'kpc')
+    res['Mvir']        = ds.quan(total_mass[ivir], 'Msun')
+    res['Mgas_rvir']   = ds.quan(enclosed['gas_mass'][ivir], 'Msun')
+    res['Mdm_rvir']    = ds.quan(enclosed['dm_mass'][ivir], 'Msun')
+    res['Mstars_rvir'] = ds.quan(enclosed['stars_mass'][ivir], 'Msun')
 
 
     return res
@@ -22,7 +22,7 @@ import multiprocessing as multi
 import datetime
 from photutils.segmentation import detect_sources
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
-import shutil
+from scipy.spatial import cKDTree
 
 # These imports are FOGGIE-specific files
 from foggie.utils.consistency import *
@@ -32,6 +32,8 @@ from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
+from foggie.utils.shell_binning import open_bin_index
 
 def parse_args():
     '''Parse command line arguments. Returns args object.
@@ -82,22 +84,26 @@ def parse_args():
     return args
 
 def identify_satellites(snap, sat_file, halo_center_kpc, region, width, i_orients = np.array([(0, 'x'), (1, 'y'), (2, 'z')]), selection_props = [(0.5, 5.e5), (1.0, 1.e6)]):
+    '''Finds satellites as connected regions of projected stellar mass above a mass limit per pixel,
+    for each (pixel size, mass limit) in 'selection_props' and each projection axis in 'i_orients',
+    and writes the median star position of each satellite to 'sat_file'. Satellites found within
+    1 kpc of one already in the catalog are dropped.
 
-    satellites = []
-    sat_count = 0
+    Stars are binned into the pixels of the projection once per pixel size, so the stars of every
+    segment are read off the segmentation image at each star's pixel instead of searching all stars
+    for every pixel, and duplicates are found with a KD-tree of the candidate positions.'''
 
     print ('loading star particle data...')
-    particle_ids = region['stars', 'particle_index']
-    particle_ages = region['stars', 'age'].in_units('Gyr')
     mass_stars = region['stars', 'particle_mass'].to('Msun')
-    x_stars = region['stars', 'particle_position_x'].to('kpc')
-    y_stars = region['stars', 'particle_position_y'].to('kpc')
-    z_stars = region['stars', 'particle_position_z'].to('kpc')
+    x_stars = region['stars', 'particle_position_x'].to('kpc').v
+    y_stars = region['stars', 'particle_position_y'].to('kpc').v
+    z_stars = region['stars', 'particle_position_z'].to('kpc').v
     all_stars = [x_stars, y_stars, z_stars]
     ortho_orients = [[1,2], [0,2], [0,1]]
     print('loaded')
 
     print('finding satellites')
+    candidates = []
     for (bin_size, mass_limit) in selection_props:
         xbin = np.arange(halo_center_kpc[0] - width/2., halo_center_kpc[0] + width/2. + bin_size, bin_size)
         ybin = np.arange(halo_center_kpc[1] - width/2., halo_center_kpc[1] + width/2. + bin_size, bin_size)
@@ -107,42 +113,46 @@ def identify_satellites(snap, sat_file, halo_center_kpc, region, width, i_orient
                             bins = (xbin, ybin, zbin))
         pp = p[0]
         pp[p[0] < mass_limit] = np.nan
+        # Pixel of every star along each axis (-1 if outside the grid or exactly on a pixel edge)
+        star_pixels = [open_bin_index(all_stars[axis], p[1][axis]) for axis in range(3)]
 
         for (i, orient) in i_orients:
             i = int(i)
             sm_im = np.log10(np.nansum(pp, axis = i))
             seg_im = detect_sources(sm_im, threshold = 0, npixels = 1, connectivity = 8)
-
+            if (seg_im is None): continue
+
+            # Label of the segment each star falls in, 0 for none
+            pix1 = star_pixels[ortho_orients[i][0]]
+            pix2 = star_pixels[ortho_orients[i][1]]
+            in_grid = (pix1 >= 0) & (pix2 >= 0)
+            star_labels = np.zeros(len(x_stars), dtype=int)
+            star_labels[in_grid] = seg_im.data[pix1[in_grid], pix2[in_grid]]
+
+            # Group the stars by label
+            order = np.argsort(star_labels, kind='stable')
+            sorted_labels = star_labels[order]
             for label in seg_im.labels:
-                edges1 = p[1][ortho_orients[i][0]]
-                edges2 = p[1][ortho_orients[i][1]]
-                gd = np.where(seg_im.data == label)[0:10]
-                all_ids = np.array([])
-                for gd1, gd2 in zip(gd[0], gd[1]):
-                    coord1_min, coord1_max = edges1[gd1], edges1[gd1+1]
-                    coord2_min, coord2_max = edges2[gd2], edges2[gd2+1]
-
-                    coords1 = all_stars[ortho_orients[i][0]]
-                    coords2 = all_stars[ortho_orients[i][1]]
-                    gd_ids = np.where((coords1 > coord1_min) & (coords1 < coord1_max) &\
-                                   (coords2 > coord2_min) & (coords2 < coord2_max))[0]
-                    all_ids = np.concatenate((all_ids, gd_ids), axis = None)
-                mn_x = np.median(x_stars[all_ids.astype('int')])
-                mn_y = np.median(y_stars[all_ids.astype('int')])
-                mn_z = np.median(z_stars[all_ids.astype('int')])
-                already_in_catalog = False
-                for sat in satellites:
-                    diff = np.sqrt((mn_x - sat[1])**2. + (mn_y - sat[2])**2. + (mn_z - sat[3])**2.)
-                    if diff.value < 1.:
-                        already_in_catalog = True
-                        break
-                if not already_in_catalog:
-                    sat_count+=1
-                    satellites.append([sat_count, mn_x, mn_y, mn_z])
+                members = order[np.searchsorted(sorted_labels, label, side='left'):np.searchsorted(sorted_labels, label, side='right')]
+                candidates.append([np.median(x_stars[members]), np.median(y_stars[members]), np.median(z_stars[members])])
+
+    # Keep each candidate unless an earlier kept one is within 1 kpc of it
+    candidates = np.array(candidates).reshape(-1, 3)
+    keep = np.zeros(len(candidates), dtype=bool)
+    finite = np.all(np.isfinite(candidates), axis=1)
+    keep[~finite] = True
+    finite_index = np.where(finite)[0]
+    if (len(finite_index) > 0):
+        tree = cKDTree(candidates[finite_index])
+        neighbors = tree.query_ball_point(candidates[finite_index], r = np.nextafter(1., 0.))
+        for j in range(len(finite_index)):
+            earlier = [finite_index[n] for n in neighbors[j] if n < j]
+            keep[finite_index[j]] = not np.any(keep[earlier])
+    satellites = candidates[keep]
 
     f = open(sat_file, 'w')
     for i in range(len(satellites)):
-        f.write('%d %.3f %.3f %.3f\n' % (satellites[i][0], satellites[i][1], satellites[i][2], satellites[i][3]))
+        f.write('%d %.3f %.3f %.3f\n' % (i+1, satellites[i][0], satellites[i][1], satellites[i][2]))
     f.close()
 
     return 'Satellites found for snap ' + snap + '!'
@@ -154,11 +164,8 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
     does the calculation on the loaded snapshot.'''
 
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     ds, refine_box = foggie_load(snap_name, track, halo_c_v_name=halo_c_v_name)
     refine_width_kpc = ds.quan(ds.refine_width, 'kpc')
 
@@ -170,9 +177,8 @@ def load_and_calculate(system, foggie_dir, run_dir, track, halo_c_v_name, snap,
 
     # Do the actual calculation
     message = identify_satellites(snap, sat_file, ds.halo_center_kpc.v, region, refine_width_kpc.v*5.)
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
     print(message)
     print(str(datetime.datetime.now()))
 
@@ -0,0 +1,119 @@
+"""
+Filename: halo_context.py
+This file contains functions for a persistent, per-snapshot store of the halo "context" that
+foggie_load needs every time it opens a snapshot:
+-the halo center (physical kpc) and bulk velocity (km/s)
+-the refine box edges (code units)
+-the disk angular momentum basis (x, y, z unit vectors), one per particle type used
+-Rvir (physical kpc)
+-the radius and enclosed mass knots used to build the Menc_profile spline
+
+The store is a directory of binary .npz files, one per snapshot, named after the snapshot (e.g.
+RD0036.npz). By default it lives in halo_context/ next to the halo_c_v file of the halo and run, and
+inside that directory each (halo, run, track) gets its own subdirectory named after a hash of the
+paths of the halo_c_v catalog and the track file, so snapshots with the same name from different
+halos or runs never share an entry, even if they share a halo_c_v file name. Files are written
+atomically so that parallel workers analyzing different snapshots (or the same one) never see a
+half-written file. Entries that have been read once are also kept in memory,
+so loading the same output again in the same process is a dictionary lookup.
+
+foggie_load consults this store after the halo_c_v catalog and writes back anything it had to
+calculate.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import os
+import hashlib
+import tempfile
+
+from astropy.table import Table
+
+# In-memory caches, keyed by file name
+_context_cache = {}
+_halo_c_v_cache = {}
+_track_cache = {}
+
+def halo_context_dir_from_halo_c_v(halo_c_v_name):
+    '''Returns the default location of the halo context store for the halo and run whose halo_c_v
+    catalog is 'halo_c_v_name'.'''
+
+    return os.path.join(os.path.dirname(halo_c_v_name), 'halo_context') + '/'
+
+def halo_context_subdir(context_dir, halo_c_v_name, trackfile):
+    '''Returns the directory inside the halo context store 'context_dir' that holds the contexts of
+    the halo and run whose halo_c_v catalog is 'halo_c_v_name' and whose track is 'trackfile'.'''
+
+    key = os.path.abspath(halo_c_v_name) + '\n' + os.path.abspath(trackfile)
+    return os.path.join(context_dir, hashlib.md5(key.encode()).hexdigest()[:12]) + '/'
+
+def halo_context_file(context_dir, snap):
+    '''Returns the name of the file in 'context_dir' holding the halo context of snapshot 'snap'.
+    'snap' can be either the snapshot name (e.g. RD0036) or the full path to the snapshot.'''
+
+    return os.path.join(context_dir, snap[-6:] + '.npz')
+
+def read_halo_context(context_dir, snap):
+    '''Returns a dictionary of everything that is stored in the halo context of snapshot 'snap' in
+    'context_dir', or an empty dictionary if nothing has been stored yet.'''
+
+    filename = halo_context_file(context_dir, snap)
+    if (filename in _context_cache):
+        return dict(_context_cache[filename])
+    if not (os.path.exists(filename)):
+        return {}
+    try:
+        with np.load(filename) as f:
+            context = {key: f[key] for key in f.files}
+    except (IOError, OSError, ValueError):
+        print('Could not read halo context file ' + filename + ', ignoring it')
+        return {}
+    _context_cache[filename] = context
+    return dict(context)
+
+def write_halo_context(context_dir, snap, **entries):
+    '''Adds the entries given as keyword arguments to the halo context of snapshot 'snap' in
+    'context_dir' and writes it to disk, keeping anything that was already stored. Entries that are
+    None are skipped. Returns the updated context dictionary.'''
+
+    filename = halo_context_file(context_dir, snap)
+    context = read_halo_context(context_dir, snap)
+    for key in entries:
+        if (entries[key] is not None):
+            context[key] = np.asarray(entries[key])
+    try:
+        if not (os.path.exists(context_dir)): os.makedirs(context_dir, exist_ok=True)
+        # Write to a temporary file in the same directory and rename it so the write is atomic
+        fd, tmpname = tempfile.mkstemp(dir=context_dir, prefix='.' + snap[-6:], suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **context)
+        os.replace(tmpname, filename)
+    except (IOError, OSError) as e:
+        print('Could not write halo context file ' + filename + ': ' + str(e))
+    _context_cache[filename] = context
+    return dict(context)
+
+def read_halo_c_v(halo_c_v_name):
+    '''Returns a dictionary mapping snapshot name to (center, velocity) for every row of the halo_c_v
+    catalog 'halo_c_v_name', where center is in physical kpc and velocity is in km/s. The catalog is
+    only parsed once per process.'''
+
+    if (halo_c_v_name not in _halo_c_v_cache):
+        halo_c_v = Table.read(halo_c_v_name, format='ascii')
+        # The "| redshift | name | xc | ..." header line is read in as a row, drop it
+        halo_c_v = halo_c_v[halo_c_v['col3'] != 'name']
+        centers = np.array([halo_c_v['col4'], halo_c_v['col5'], halo_c_v['col6']], dtype=float).T
+        velocities = np.array([halo_c_v['col7'], halo_c_v['col8'], halo_c_v['col9']], dtype=float).T
+        _halo_c_v_cache[halo_c_v_name] = dict(zip([str(s) for s in halo_c_v['col3']], zip(centers, velocities)))
+    return _halo_c_v_cache[halo_c_v_name]
+
+def read_track(trackfile):
+    '''Returns the halo track 'trackfile' as a table sorted by redshift. The track is only read
+    once per process.'''
+
+    if (trackfile not in _track_cache):
+        track = Table.read(trackfile, format='ascii')
+        track.sort('col1')
+        _track_cache[trackfile] = track
+    return _track_cache[trackfile]
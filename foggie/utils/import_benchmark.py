@@ -0,0 +1,88 @@
+"""
+Filename: import_benchmark.py
+This file contains a benchmark of the cold-start import time of FOGGIE modules. It guards the
+import cost of:
+-utils/foggie_load.py
+-utils/consistency.py
+
+Short batch jobs and worker processes pay the import time of foggie_load on every start, so it must
+not pull in plotting libraries. Each trial imports the module in a fresh Python process, so nothing
+is already cached in sys.modules, and reports the median wall time over the trials along with any
+of the plotting modules (matplotlib, seaborn, cmyt) that the import loaded. Run it as
+
+python import_benchmark.py --module foggie.utils.foggie_load --max_seconds 10
+
+and it exits with status 1 if a plotting module was loaded or the median time is over the limit.
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+heavy_modules = ['matplotlib', 'seaborn', 'cmyt']
+
+def parse_args():
+    '''Parse command line arguments. Returns args object.'''
+
+    parser = argparse.ArgumentParser(description='Times the cold-start import of a FOGGIE module.')
+
+    parser.add_argument('--module', metavar='module', type=str, action='store', \
+                        help='Which module to import? Default is foggie.utils.foggie_load')
+    parser.set_defaults(module='foggie.utils.foggie_load')
+
+    parser.add_argument('--trials', metavar='trials', type=int, action='store', \
+                        help='How many fresh processes to time? Default is 5')
+    parser.set_defaults(trials=5)
+
+    parser.add_argument('--max_seconds', metavar='max_seconds', type=float, action='store', \
+                        help='Fail if the median import time is longer than this many seconds. ' + \
+                        'Default is no limit, only the plotting modules are checked')
+    parser.set_defaults(max_seconds=None)
+
+    args = parser.parse_args()
+    return args
+
+def time_import(module):
+    '''Imports 'module' in a new Python process and returns the import time in seconds and the
+    list of the modules in 'heavy_modules' that were loaded by the import.'''
+
+    code = 'import sys, time, json\n' + \
+           't0 = time.perf_counter()\n' + \
+           'import ' + module + '\n' + \
+           't1 = time.perf_counter()\n' + \
+           'print(json.dumps([t1 - t0, [m for m in ' + repr(heavy_modules) + ' if m in sys.modules]]))\n'
+    output = subprocess.check_output([sys.executable, '-c', code])
+    seconds, loaded = json.loads(output.decode().strip().split('\n')[-1])
+    return seconds, loaded
+
+def benchmark_import(module, trials=5, max_seconds=None):
+    '''Times the import of 'module' in 'trials' fresh processes, prints the results, and returns True
+    if no plotting module was loaded and the median time is at most 'max_seconds' (if given).'''
+
+    times = []
+    loaded = set()
+    for t in range(trials):
+        seconds, heavy = time_import(module)
+        times.append(seconds)
+        loaded.update(heavy)
+    median = np.median(times)
+    print('import %s: median %.3f s, min %.3f s, max %.3f s over %d trials' % \
+          (module, median, np.min(times), np.max(times), trials))
+
+    passed = True
+    if (len(loaded) > 0):
+        print('FAIL: importing %s loaded %s' % (module, ', '.join(sorted(loaded))))
+        passed = False
+    if (max_seconds is not None) and (median > max_seconds):
+        print('FAIL: median import time %.3f s is over the limit of %.3f s' % (median, max_seconds))
+        passed = False
+    return passed
+
+if __name__ == "__main__":
+    args = parse_args()
+    passed = benchmark_import(args.module, trials=args.trials, max_seconds=args.max_seconds)
+    sys.exit(0 if passed else 1)
@@ -30,7 +30,6 @@ from astropy.io import ascii
 import multiprocessing as multi
 import datetime
 from scipy.interpolate import InterpolatedUnivariateSpline as IUS
-import shutil
 import ast
 import trident
 
@@ -42,6 +41,7 @@ from foggie.utils.get_proper_box_size import get_proper_box_size
 from foggie.utils.get_run_loc_etc import get_run_loc_etc
 from foggie.utils.yt_fields import *
 from foggie.utils.foggie_load import *
+from foggie.utils.snapshot_staging import staging_enabled, stage_snapshot, release_snapshot
 
 def parse_args():
     '''Parse command line arguments. Returns args object.
@@ -99,11 +99,8 @@ def parse_args():
 
 def add_to_files(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablename, new_fields, new_units):
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     ds, refine_box, refine_box_center, refine_width = load(snap_name, track, use_halo_c_v=True, \
       halo_c_v_name=halo_c_v_name, filter_particles=False)
     refine_width_kpc = ds.quan(refine_width, 'kpc')
@@ -121,17 +118,13 @@ def add_to_files(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablen
 
     field_table.write(tablename + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
 
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 def save_to_files(system, foggie_dir, run_dir, track, halo_c_v_name, snap, tablename, fields, units):
     snap_name = foggie_dir + run_dir + snap + '/' + snap
-    if (system=='pleiades_cassi'):
-        print('Copying directory to /tmp')
-        snap_dir = '/tmp/' + snap
-        shutil.copytree(foggie_dir + run_dir + snap, snap_dir)
-        snap_name = snap_dir + '/' + snap
+    if (staging_enabled(system)):
+        snap_name = stage_snapshot(foggie_dir + run_dir + snap) + '/' + snap
     ds, refine_box, refine_box_center, refine_width = load(snap_name, track, use_halo_c_v=True, \
       halo_c_v_name=halo_c_v_name, filter_particles=False)
     refine_width_kpc = ds.quan(refine_width, 'kpc')
@@ -168,9 +161,8 @@ def save_to_files(system, foggie_dir, run_dir, track, halo_c_v_name, snap, table
     field_table['redshift'].unit = 'dimensionless'
     field_table.write(tablename + '.hdf5', path='all_data', serialize_meta=True, overwrite=True)
 
-    if (system=='pleiades_cassi'):
-        print('Deleting directory from /tmp')
-        shutil.rmtree(snap_dir)
+    if (staging_enabled(system)):
+        release_snapshot(foggie_dir + run_dir + snap)
 
 if __name__ == "__main__":
     args = parse_args()
@@ -0,0 +1,51 @@
+"""
+Filename: particle_index.py
+This file contains a sorted index of particle IDs for looking up many particles by ID at once. It is
+used by:
+-satellites/track_satellites.py
+
+Finding each of N_query IDs with np.where(ids == id) scans all N particles every time. Instead, the
+IDs of a snapshot are argsorted once, and all the query IDs are then found together with a single
+np.searchsorted, at a cost of O(N_query log N). The sorted index can be saved to disk so it is built
+once per snapshot and reused for every satellite and every later run on that snapshot.
+"""
+
+from __future__ import print_function
+
+import os
+import numpy as np
+
+def build_particle_index(ids):
+    '''Returns the index of the particle IDs 'ids' as a tuple ('sorted_ids', 'order'), where 'order'
+    is the argsort of 'ids' and 'sorted_ids' = ids[order].'''
+
+    ids = np.asarray(ids).astype(np.int64)
+    order = np.argsort(ids, kind='stable')
+    return ids[order], order
+
+def lookup_particles(index, query_ids):
+    '''Returns the positions in the original ID array of the particles with IDs 'query_ids', using the
+    index 'index' from build_particle_index, with -1 for IDs that are not found. If an ID appears more
+    than once, the first occurrence is returned.'''
+
+    sorted_ids, order = index
+    query_ids = np.asarray(query_ids).astype(np.int64)
+    if (len(sorted_ids)==0): return np.full(len(query_ids), -1, dtype=np.int64)
+    loc = np.searchsorted(sorted_ids, query_ids, side='left')
+    loc = np.minimum(loc, len(sorted_ids)-1)
+    found = sorted_ids[loc] == query_ids
+    return np.where(found, order[loc], -1)
+
+def get_particle_index(ids, cache_file=None):
+    '''Returns the index of the particle IDs 'ids' (see build_particle_index). If 'cache_file' is given
+    and holds an index of the same number of particles, it is loaded from there instead of being
+    rebuilt; otherwise the index is built and saved to 'cache_file'.'''
+
+    if (cache_file is not None) and (os.path.exists(cache_file)):
+        cached = np.load(cache_file)
+        if (len(cached['sorted_ids'])==len(ids)):
+            return cached['sorted_ids'], cached['order']
+    index = build_particle_index(ids)
+    if (cache_file is not None):
+        np.savez(cache_file, sorted_ids=index[0], order=index[1])
+    return index
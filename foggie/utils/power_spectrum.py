@@ -0,0 +1,109 @@
+"""
+Filename: power_spectrum.py
+This file contains functions for computing spherically-binned power spectra of fields on uniform
+3D grids (e.g. yt covering grids), in bounded memory. It is used by:
+-turbulence/turbulence.py
+
+Because the fields are real, only half of Fourier space is computed, with real-to-complex FFTs
+(scipy.fft.rfftn, which can use several threads). The modes of the half space are binned in |k| one
+x-slab at a time, so the full 3D arrays of kx, ky, kz, and |k| are never made, and each slab is
+binned with a single weighted np.bincount. Fields can be memory-mapped arrays on disk, so only one
+field and its transform need to be held in memory at a time.
+"""
+
+from __future__ import print_function
+
+import os
+import numpy as np
+import scipy.fft
+
+def rfft_power(field, workers=-1):
+    '''Returns the power |F(k)|^2/N^2 of the real 3D array 'field' of N cells for the half of Fourier
+    space computed by a real-to-complex FFT, as an array of shape (nx, ny, nz//2+1). 'workers' is the
+    number of threads to use for the FFT (-1 for all available).'''
+
+    n_cells = np.prod(np.shape(field))
+    power = scipy.fft.rfftn(np.asarray(field, dtype=float), workers=workers)
+    power = power.real**2. + power.imag**2.
+    power /= float(n_cells)**2.
+    return power
+
+def radial_power_spectrum(power, shape, L, kbins):
+    '''Sums the half-space power 'power' (as returned by rfft_power) of a field with shape 'shape' on a
+    box of side lengths 'L' into spherical bins of wavenumber |k|, where bin i holds the modes with
+    kbins[i] <= |k| < kbins[i+1] and wavenumbers are in units of 1/[units of L]. Modes with kz > 0 that
+    are not at the Nyquist frequency stand in for their complex conjugates as well and are counted
+    twice. Returns an array of length len(kbins)-1.'''
+
+    nx, ny, nz = shape
+    kbins = np.asarray(kbins, dtype=float)
+    n_bins = len(kbins) - 1
+    kx = np.fft.fftfreq(nx) * nx/L[0]
+    ky = np.fft.fftfreq(ny) * ny/L[1]
+    kz = np.fft.rfftfreq(nz) * nz/L[2]
+    # Weight of each kz mode to account for the conjugate half of Fourier space
+    kz_weight = np.full(len(kz), 2.)
+    kz_weight[0] = 1.
+    if (nz%2==0): kz_weight[-1] = 1.
+    k_yz2 = ky[:,np.newaxis]**2. + kz[np.newaxis,:]**2.
+
+    spectrum = np.zeros(n_bins)
+    for i in range(nx):
+        k = np.sqrt(kx[i]**2. + k_yz2).ravel()
+        index = np.searchsorted(kbins, k, side='right') - 1
+        valid = (index >= 0) & (index < n_bins)
+        weights = (power[i]*kz_weight[np.newaxis,:]).ravel()
+        spectrum += np.bincount(index[valid], weights=weights[valid], minlength=n_bins)[:n_bins]
+    return spectrum
+
+def grid_to_memmap(array, filename):
+    '''Writes 'array' to a memory-mapped file 'filename' and returns the memory-mapped array, so the
+    in-memory copy can be freed.'''
+
+    mm = np.lib.format.open_memmap(filename, mode='w+', dtype=np.asarray(array).dtype, shape=np.shape(array))
+    mm[...] = array
+    mm.flush()
+    return mm
+
+def kinetic_energy_spectrum(density, velocities, L, kbins, nindex_rho=1./3., workers=-1, memmap_dir=None):
+    '''Calculates the kinetic energy power spectrum E(k)dk of the velocity field on a uniform grid with
+    side lengths 'L', binned in the wavenumber bins 'kbins' (see radial_power_spectrum).
+
+    'density' is the 3D array of density and 'velocities' is a list of 3D arrays (or functions that
+    return a 3D array when called, so that each velocity component is only loaded when it is needed)
+    of the velocity components. The spectrum is of density**nindex_rho * velocity summed over
+    components. 'workers' is the number of FFT threads. If 'memmap_dir' is given, the weighted
+    velocity fields are kept in memory-mapped files in that directory instead of in memory, and the
+    files are deleted when done.
+
+    The normalization matches the earlier octant-based estimate, where the positive-frequency octant
+    of the full FFT was kept and multiplied by 8.'''
+
+    shape = np.shape(density)
+    if (memmap_dir is not None):
+        rho_weight = grid_to_memmap(np.asarray(density, dtype=float)**nindex_rho, \
+          os.path.join(memmap_dir, 'power_spectrum_rho_%d.npy' % (os.getpid())))
+        filename = os.path.join(memmap_dir, 'power_spectrum_field_%d.npy' % (os.getpid()))
+    else:
+        rho_weight = np.asarray(density, dtype=float)**nindex_rho
+    spectrum = np.zeros(len(kbins)-1)
+    for i in range(len(velocities)):
+        vel = velocities[i]() if callable(velocities[i]) else velocities[i]
+        if (memmap_dir is not None):
+            # Fill the weighted field one x-slab at a time so no extra full-size array is made
+            field = np.lib.format.open_memmap(filename, mode='w+', dtype=float, shape=shape)
+            for j in range(shape[0]):
+                field[j] = rho_weight[j]*np.asarray(vel[j], dtype=float)
+            field.flush()
+        else:
+            field = rho_weight*np.asarray(vel, dtype=float)
+        del vel
+        power = rfft_power(field, workers=workers)
+        del field
+        spectrum += 0.5*8.*radial_power_spectrum(power, shape, L, kbins)
+        del power
+    if (memmap_dir is not None):
+        del rho_weight
+        os.remove(filename)
+        os.remove(os.path.join(memmap_dir, 'power_spectrum_rho_%d.npy' % (os.getpid())))
+    return spectrum
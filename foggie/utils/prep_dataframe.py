@@ -84,11 +84,9 @@ def check_dataframe(frame, field1, field2, count_cat):
 
     if ('phase' in count_cat): 
         frame['phase'] = categorize_by_temp(frame['temperature'])
-        frame.phase = frame.phase.astype('category')
 
     if ('metal' in count_cat): 
-        frame['metal'] = categorize_by_temp(frame['metallicity'])
-        frame.metal = frame.metal.astype('category')
+        frame['metal'] = categorize_by_metals(frame['metallicity'])
 
     return frame
 
@@ -167,7 +165,6 @@ def prep_dataframe(dataset, all_data, field_list, category, \
             data_frame['temperature'] = np.log10(all_data['temperature'])
 
         data_frame['phase'] = categorize_by_temp(data_frame['temperature'])
-        data_frame.phase = data_frame.phase.astype('category')
         print('Added phase category to the dataframe')
 
     if ('metal' in category):
@@ -175,7 +172,6 @@ def prep_dataframe(dataset, all_data, field_list, category, \
             data_frame['metallicity'] = all_data['metallicity']
 
         data_frame['metal'] = categorize_by_metals(all_data['metallicity'])
-        data_frame.metal = data_frame.metal.astype('category')
         print('Added metal category to the dataframe')
 
     if ('ion_fraction' in category):
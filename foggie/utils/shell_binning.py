@@ -0,0 +1,99 @@
+"""
+Filename: shell_binning.py
+This file contains a vectorized binning engine for computing sums of cell quantities in radial
+shells and sums of cell quantities crossing radial boundaries, for any number of fields and any
+number of extra groups (e.g. temperature bins) at once. It is used by:
+-flux_tracking/flux_tracking.py
+
+Every function sorts each cell into its shell (or the range of boundaries it crosses) once with
+np.searchsorted, and then produces the sums for all shells, all fields and all groups with
+np.bincount, instead of re-masking the full cell arrays for every shell, field and group.
+
+All bins are open intervals, to match the strict inequalities used throughout the analysis code:
+a cell at radius r is in shell i if edges[i] < r < edges[i+1], and a cell moving from r_start to
+r_end crosses boundary b if r_start < b < r_end (outward) or r_end < b < r_start (inward).
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+def open_bin_index(values, edges):
+    '''Returns an integer array the same size as 'values' giving, for each value, the index i of the
+    bin for which edges[i] < value < edges[i+1]. Values that are outside of all bins, that lie exactly
+    on an edge, or that are NaN get an index of -1. 'edges' must be sorted in increasing order.'''
+
+    values = np.asarray(values)
+    edges = np.asarray(edges, dtype=float)
+    # First edge that is >= value, so edges[index-1] < value <= edges[index]
+    index = np.searchsorted(edges, values, side='left')
+    valid = (index > 0) & (index < len(edges))
+    valid[valid] = values[valid] != edges[index[valid]]
+    return np.where(valid, index - 1, -1)
+
+def _grouped_bincount(index, n_bins, fields, groups, n_groups, weights_sign=None):
+    '''Sums each field in 'fields' into 'n_bins' bins given by 'index' (cells with an index outside
+    [0, n_bins) are ignored), both for all cells and separately for each of the 'n_groups' groups given
+    by 'groups' (cells with a group of -1 only count toward all cells). If 'weights_sign' is given, each
+    cell's contribution is multiplied by it. Returns an array of shape (len(fields), n_groups+1, n_bins)
+    where [:,0,:] is the sum over all cells and [:,k+1,:] is the sum over group k.'''
+
+    sums = np.zeros((len(fields), n_groups+1, n_bins))
+    valid = (index >= 0) & (index < n_bins)
+    index = index[valid]
+    if (n_groups > 0):
+        groups = groups[valid]
+        in_group = groups >= 0
+        group_index = groups[in_group]*n_bins + index[in_group]
+    for i in range(len(fields)):
+        weights = np.asarray(fields[i])[valid]
+        if (weights_sign is not None): weights = weights*weights_sign[valid]
+        sums[i,0,:] = np.bincount(index, weights=weights, minlength=n_bins)[:n_bins]
+        if (n_groups > 0):
+            sums[i,1:,:] = np.bincount(group_index, weights=weights[in_group], \
+              minlength=n_groups*n_bins)[:n_groups*n_bins].reshape(n_groups, n_bins)
+    return sums
+
+def shell_sums(radius, edges, fields, groups=None, n_groups=0):
+    '''Returns the sum of each field in the list 'fields' over the cells whose 'radius' lies within
+    each shell defined by the sorted shell edges 'edges', as an array of shape
+    (len(fields), n_groups+1, len(edges)-1). Index 0 along the second axis is the sum over all cells,
+    and index k+1 is the sum over only the cells with groups==k, where 'groups' is an integer array the
+    same size as 'radius' (e.g. from open_bin_index on temperature) and -1 means no group.'''
+
+    edges = np.asarray(edges, dtype=float)
+    index = open_bin_index(radius, edges)
+    return _grouped_bincount(index, len(edges)-1, fields, groups, n_groups)
+
+def crossing_sums(radius_start, radius_end, boundaries, fields, groups=None, n_groups=0):
+    '''Returns two arrays, 'outward' and 'inward', each of shape (len(fields), n_groups+1, len(boundaries)),
+    giving the sum of each field in the list 'fields' over the cells that cross each boundary in the sorted
+    array 'boundaries' while moving from 'radius_start' to 'radius_end'. A cell crosses boundary b
+    outward if radius_start < b < radius_end and inward if radius_end < b < radius_start. 'groups' and
+    'n_groups' are as in shell_sums.
+
+    Each cell crosses a contiguous range of boundaries, so the sums are computed by adding each cell's
+    value at the first boundary it crosses and subtracting it after the last one, then taking a
+    cumulative sum over boundaries.'''
+
+    boundaries = np.asarray(boundaries, dtype=float)
+    radius_start = np.asarray(radius_start)
+    radius_end = np.asarray(radius_end)
+    n_bounds = len(boundaries)
+    results = []
+    for low, high in [(radius_start, radius_end), (radius_end, radius_start)]:
+        # Boundaries crossed are those with low < b < high, i.e. indices first <= i < last
+        first = np.searchsorted(boundaries, low, side='right')
+        last = np.searchsorted(boundaries, high, side='left')
+        crosses = (first < last) & (~np.isnan(low)) & (~np.isnan(high))
+        first = first[crosses]
+        last = last[crosses]
+        cell_fields = [np.asarray(field)[crosses] for field in fields]
+        if (n_groups > 0): cell_groups = np.concatenate([groups[crosses], groups[crosses]])
+        else: cell_groups = None
+        index = np.concatenate([first, last])
+        sign = np.concatenate([np.ones(len(first)), -np.ones(len(last))])
+        doubled_fields = [np.concatenate([field, field]) for field in cell_fields]
+        diffs = _grouped_bincount(index, n_bounds+1, doubled_fields, cell_groups, n_groups, weights_sign=sign)
+        results.append(np.cumsum(diffs, axis=2)[:,:,:n_bounds])
+    return results[0], results[1]
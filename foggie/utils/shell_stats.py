@@ -0,0 +1,168 @@
+"""
+Filename: shell_stats.py
+This file contains a grouped-reduction kernel for computing statistics of cell quantities in many
+groups of cells at once, where a group is a combination of radial shell, radial velocity direction
+(all, in, or out), and temperature bin. It is used by:
+-radial_quantities/stats_in_shells.py
+-radial_quantities/totals_in_shells.py
+
+Instead of re-masking the cell arrays for every shell, direction, and temperature bin, each cell is
+assigned to all of the groups it belongs to once by shell_group_index, and then every statistic
+(weighted sums, means, standard deviations, quantiles, and PDFs) is computed for every group from
+a single sort of the data, with np.bincount doing the per-group reductions.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+from foggie.utils.shell_binning import open_bin_index
+
+def shell_group_id(shell, direction, temp_bin, n_temps):
+    '''Returns the group index used by shell_group_index for shell number 'shell', direction
+    'direction' (0 for all, 1 for inflowing, 2 for outflowing), and temperature bin 'temp_bin' (0 for all
+    temperatures and k for the k-th temperature bin), where there are 'n_temps' temperature entries
+    in total (including the one for all temperatures).'''
+
+    return (shell*3 + direction)*n_temps + temp_bin
+
+def shell_group_index(radius, edges, rad_vel, temperature, temps):
+    '''Assigns cells to the groups of (shell, direction, temperature) they belong to. 'radius' gives the
+    radius (or height) of each cell that will be binned into shells with edges 'edges', 'rad_vel' gives
+    the radial velocity of each cell, 'temperature' gives the log temperature of each cell, and 'temps'
+    gives the log temperature bin edges, e.g. [0.,4.,5.,6.,12.], or [0.] for no temperature bins.
+
+    Following the conventions of stats_in_shells.py and totals_in_shells.py, a cell is in shell i
+    if edges[i] < radius < edges[i+1], it counts toward all directions and toward inflow if
+    rad_vel < 0 or outflow if rad_vel > 0, and it counts toward all temperatures if temperature > 0
+    and toward temperature bin k if temps[k-1] < temperature < temps[k].
+
+    Returns 'cell_index', 'group_index', and 'n_groups', where 'cell_index' and 'group_index' are
+    arrays of the same length listing every (cell, group) membership, so that e.g.
+    field[cell_index] lists the value of 'field' once for each group the cell belongs to. Group
+    indices are given by shell_group_id.'''
+
+    n_temps = len(temps)
+    n_groups = (len(edges)-1)*3*n_temps
+    shell = open_bin_index(radius, edges)
+    direction = np.zeros(len(shell), dtype=int)
+    direction[np.asarray(rad_vel) < 0.] = 1
+    direction[np.asarray(rad_vel) > 0.] = 2
+    temperature = np.asarray(temperature)
+    all_temp = temperature > 0.
+    if (n_temps > 1):
+        temp_bin = open_bin_index(temperature, temps) + 1
+    else:
+        temp_bin = np.zeros(len(shell), dtype=int)
+    in_shell = shell >= 0
+
+    cell_index = []
+    group_index = []
+    cells = np.arange(len(shell))
+    for use_dir in [False, True]:
+        dir_mask = in_shell & ((direction > 0) if use_dir else True)
+        dirs = direction if use_dir else np.zeros(len(shell), dtype=int)
+        for use_temp in [False, True]:
+            if (use_temp) and (n_temps==1): continue
+            if (use_temp):
+                mask = dir_mask & (temp_bin > 0)
+                bins = temp_bin
+            else:
+                mask = dir_mask & all_temp
+                bins = np.zeros(len(shell), dtype=int)
+            cell_index.append(cells[mask])
+            group_index.append(shell_group_id(shell[mask], dirs[mask], bins[mask], n_temps))
+    cell_index = np.concatenate(cell_index)
+    group_index = np.concatenate(group_index)
+
+    return cell_index, group_index, n_groups
+
+def grouped_sums(values, group_index, n_groups):
+    '''Returns the sum of 'values' in each of the 'n_groups' groups given by 'group_index'.'''
+
+    return np.bincount(group_index, weights=values, minlength=n_groups)[:n_groups]
+
+def grouped_stats(values, weights, group_index, n_groups, quantiles=None, hist_range=None, hist_bins=200):
+    '''Computes weighted statistics of 'values' with weights 'weights' in each of the 'n_groups' groups
+    given by 'group_index', which is the same length as 'values' (usually values and weights have
+    been expanded with the cell_index from shell_group_index). Returns a dictionary with entries:
+    'count'     -- number of values in each group
+    'sum'       -- unweighted sum of the values in each group
+    'weight'    -- sum of the weights in each group
+    'avg'       -- weighted average in each group
+    'std'       -- weighted standard deviation in each group
+    and if 'quantiles' is given (a list of quantiles between 0 and 1):
+    'quantiles' -- array of shape (n_groups, len(quantiles)) of weighted quantiles, computed the same
+                   way as weighted_quantile in stats_in_shells.py
+    and if 'hist_range' is given:
+    'pdf'       -- array of shape (n_groups, hist_bins) of the weighted PDF in each group over
+                   'hist_range', normalized the same way as np.histogram(..., density=True)
+    'bin_edges' -- the edges of the PDF bins
+    Groups that contain no values have 0 for every statistic.'''
+
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    group_index = np.asarray(group_index)
+
+    count = np.bincount(group_index, minlength=n_groups)[:n_groups]
+    has_data = count > 0
+    total = grouped_sums(values, group_index, n_groups)
+    weight = grouped_sums(weights, group_index, n_groups)
+    avg = np.zeros(n_groups)
+    std = np.zeros(n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg[has_data] = grouped_sums(weights*values, group_index, n_groups)[has_data]/weight[has_data]
+        variance = grouped_sums(weights*(values-avg[group_index])**2., group_index, n_groups)
+        std[has_data] = np.sqrt(variance[has_data]/weight[has_data])
+    stats = {'count':count, 'sum':total, 'weight':weight, 'avg':avg, 'std':std}
+
+    if (quantiles is not None):
+        quantiles = np.asarray(quantiles, dtype=float)
+        # One sort of everything, by group and then by value within each group
+        sorter = np.lexsort((values, group_index))
+        sorted_values = values[sorter]
+        sorted_weights = weights[sorter]
+        sorted_groups = group_index[sorter]
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+        ends = starts + count
+        # Cumulative weight within each group, centered on each value and normalized to the group total
+        cumulative = np.cumsum(sorted_weights)
+        offset = np.concatenate(([0.], cumulative))[starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered = (cumulative - offset[sorted_groups] - 0.5*sorted_weights)/weight[sorted_groups]
+        # Shifting each group by its index makes the positions monotonic across all groups, so every
+        # quantile of every group can be found with one searchsorted
+        positions = sorted_groups + centered
+        groups = np.nonzero(has_data)[0]
+        quantile_values = np.zeros((n_groups, len(quantiles)))
+        for q in range(len(quantiles)):
+            upper = np.searchsorted(positions, groups + quantiles[q], side='right')
+            lower = upper - 1
+            below = lower < starts[groups]
+            above = upper >= ends[groups]
+            lower = np.clip(lower, starts[groups], ends[groups]-1)
+            upper = np.clip(upper, starts[groups], ends[groups]-1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                frac = (quantiles[q] - centered[lower])/(centered[upper] - centered[lower])
+                result = sorted_values[lower] + frac*(sorted_values[upper] - sorted_values[lower])
+            result[below] = sorted_values[starts[groups]][below]
+            result[above] = sorted_values[ends[groups]-1][above]
+            quantile_values[groups,q] = result
+        stats['quantiles'] = quantile_values
+
+    if (hist_range is not None):
+        bin_edges = np.linspace(hist_range[0], hist_range[1], hist_bins+1)
+        hist_index = np.searchsorted(bin_edges, values, side='right') - 1
+        # np.histogram includes the right edge in the last bin
+        hist_index[values==bin_edges[-1]] = hist_bins-1
+        in_range = (hist_index >= 0) & (hist_index < hist_bins)
+        flat_index = group_index[in_range]*hist_bins + hist_index[in_range]
+        hist = np.bincount(flat_index, weights=weights[in_range], \
+          minlength=n_groups*hist_bins)[:n_groups*hist_bins].reshape(n_groups, hist_bins)
+        pdf = np.zeros((n_groups, hist_bins))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pdf[has_data] = hist[has_data]/np.diff(bin_edges)/np.sum(hist[has_data], axis=1)[:,np.newaxis]
+        stats['pdf'] = pdf
+        stats['bin_edges'] = bin_edges
+
+    return stats
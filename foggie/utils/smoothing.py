@@ -0,0 +1,96 @@
+"""
+Filename: smoothing.py
+This file contains a separable, NaN-aware 3D Gaussian smoothing function for gridded fields (e.g.
+yt covering grids). It is used by:
+-pressure_support/pressure_support.py
+
+A 3D Gaussian is the product of three 1D Gaussians, so the cube is smoothed with a 1D Gaussian along
+each axis in turn (scipy.ndimage.gaussian_filter1d). Cells that are NaN or masked are handled by
+normalized convolution: the data (with bad cells set to zero) and the mask of good cells are smoothed
+together, and the smoothed data is divided by the smoothed mask, so bad cells neither contribute to
+nor dilute their neighbors. Each 1D pass is split into slabs along another axis that are run in
+parallel threads, and the cube can be processed in overlapping tiles so that only one tile (plus the
+kernel width on every side) of temporary arrays is in memory at a time.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+from concurrent.futures import ThreadPoolExecutor
+
+def _smooth_axis(arr, sigma, axis, truncate, mode, nthreads):
+    '''Smooths the 3D array 'arr' in place with a 1D Gaussian of width 'sigma' along 'axis', splitting
+    the array into 'nthreads' slabs along a different axis that are smoothed in parallel threads.'''
+
+    if (nthreads<=1):
+        gaussian_filter1d(arr, sigma, axis=axis, truncate=truncate, mode=mode, output=arr)
+        return
+    split_axis = 0 if (axis!=0) else 1
+    edges = np.linspace(0, arr.shape[split_axis], nthreads+1).astype(int)
+    def smooth_slab(i):
+        index = [slice(None)]*3
+        index[split_axis] = slice(edges[i], edges[i+1])
+        slab = arr[tuple(index)]
+        gaussian_filter1d(slab, sigma, axis=axis, truncate=truncate, mode=mode, output=slab)
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        list(pool.map(smooth_slab, range(nthreads)))
+
+def _smooth_block(arr, valid, sigma, truncate, mode, nthreads):
+    '''Returns the normalized convolution of the 3D array 'arr' with a Gaussian of width 'sigma',
+    using only the cells where 'valid' is True (or all cells if 'valid' is None).'''
+
+    if (valid is None):
+        smooth = np.array(arr, dtype=float)
+        for axis in range(3):
+            _smooth_axis(smooth, sigma[axis], axis, truncate, mode, nthreads)
+        return smooth
+    smooth = np.where(valid, arr, 0.).astype(float)
+    weight = valid.astype(float)
+    for axis in range(3):
+        _smooth_axis(smooth, sigma[axis], axis, truncate, mode, nthreads)
+        _smooth_axis(weight, sigma[axis], axis, truncate, mode, nthreads)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        smooth /= weight
+    return smooth
+
+def gaussian_smooth_3D(arr, sigma, mask=None, preserve_nan=True, truncate=4., mode='reflect', nthreads=1, tile_size=None):
+    '''Smooths the 3D array 'arr' with a Gaussian of standard deviation 'sigma' (in cells, either one
+    number or one per axis). Cells that are NaN or where the optional boolean array 'mask' is True are
+    left out of the smoothing, and the smoothed value at every other cell is normalized by the weight
+    of the good cells around it. If 'preserve_nan' is True, cells that were NaN in 'arr' are NaN in
+    the result; otherwise they are filled in from their neighbors. 'truncate' and 'mode' are passed to
+    scipy.ndimage.gaussian_filter1d; for an array with no NaNs and no mask, the result is the same as
+    scipy.ndimage.gaussian_filter(arr, sigma, truncate=truncate, mode=mode).
+
+    'nthreads' is the number of threads to use for each 1D pass. If 'tile_size' is given, the array is
+    smoothed in cubic tiles of that many cells on a side, each padded by the kernel width so the result
+    is the same as smoothing the whole array at once.'''
+
+    arr = np.asarray(arr)
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float), (3,))
+    nan_mask = np.isnan(arr)
+    bad = nan_mask if (mask is None) else (nan_mask | np.asarray(mask, dtype=bool))
+    if (not np.any(bad)): bad = None
+
+    if (tile_size is None):
+        smooth = _smooth_block(arr, None if (bad is None) else ~bad, sigma, truncate, mode, nthreads)
+    else:
+        smooth = np.empty(arr.shape, dtype=float)
+        pad = (truncate*sigma + 0.5).astype(int)
+        starts = [range(0, arr.shape[axis], tile_size) for axis in range(3)]
+        for i in starts[0]:
+            for j in starts[1]:
+                for k in starts[2]:
+                    lo = np.array([i, j, k])
+                    hi = np.minimum(lo + tile_size, arr.shape)
+                    pad_lo = np.maximum(lo - pad, 0)
+                    pad_hi = np.minimum(hi + pad, arr.shape)
+                    outer = tuple(slice(pad_lo[a], pad_hi[a]) for a in range(3))
+                    inner = tuple(slice(lo[a]-pad_lo[a], hi[a]-pad_lo[a]) for a in range(3))
+                    block = _smooth_block(arr[outer], None if (bad is None) else ~bad[outer], \
+                      sigma, truncate, mode, nthreads)
+                    smooth[tuple(slice(lo[a], hi[a]) for a in range(3))] = block[inner]
+
+    if (preserve_nan): smooth[nan_mask] = np.nan
+    return smooth
@@ -0,0 +1,158 @@
+"""
+Filename: snapshot_scheduler.py
+This file contains a work-queue scheduler for running an analysis function on many snapshots in
+parallel. It is used by:
+-flux_tracking/flux_tracking.py
+-radial_quantities/stats_in_shells.py
+-radial_quantities/totals_in_shells.py
+-turbulence/turbulence.py
+-pressure_support/pressure_support.py
+-utils/get_halo_c_v_parallel.py
+
+Each snapshot is run in its own process (so memory held by yt is released when the snapshot is
+done), but instead of starting a batch of nproc processes and waiting for the whole batch to finish,
+a new snapshot is started as soon as any running one finishes, so one slow snapshot does not stall
+the other processors. Snapshots can be ordered largest-first by the size of their directory on
+disk, so the longest jobs start first, snapshots whose output already exists can be skipped, and
+snapshots whose process fails are retried. The start, end, and run time of every snapshot are
+printed and can also be appended to a log file. Whenever a snapshot is started, the next one waiting
+can be prefetched, e.g. staged to local disk with utils/snapshot_staging.py.
+
+Scripts that save many files per snapshot can also mark a snapshot as done for a task once
+everything has been saved, and check for that marker instead of for each of the output files.
+"""
+
+from __future__ import print_function
+
+import os
+import time
+import hashlib
+import datetime
+import multiprocessing as multi
+from multiprocessing.connection import wait
+
+def snapshot_size(snap_dir):
+    '''Returns the total size in bytes of all files in the snapshot directory 'snap_dir', or 0 if it
+    does not exist. Used to order snapshots so that the largest (usually slowest) are run first.'''
+
+    total = 0
+    if not (os.path.isdir(snap_dir)): return 0
+    for root, dirs, files in os.walk(snap_dir):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+def task_name(name, args, ignore=[]):
+    '''Returns a name for the task 'name' run with the command line arguments 'args' that changes
+    whenever any of the arguments, except those listed in 'ignore', changes. Used to mark snapshots
+    as done only for the arguments they were run with.'''
+
+    arg_dict = vars(args)
+    key = ','.join([arg + '=' + str(arg_dict[arg]) for arg in sorted(arg_dict) if (arg not in ignore)])
+    return name + '_' + hashlib.md5(key.encode()).hexdigest()[:12]
+
+def done_marker(marker_dir, snap, task):
+    '''Returns the name of the file in 'marker_dir' that marks the snapshot 'snap' as done for the
+    task 'task'.'''
+
+    return os.path.join(marker_dir, '.done', snap + '_' + task)
+
+def mark_done(marker_dir, snap, task):
+    '''Marks the snapshot 'snap' as done for the task 'task' in 'marker_dir'. Call this only after
+    everything the task saves for the snapshot has been written.'''
+
+    marker = done_marker(marker_dir, snap, task)
+    if not (os.path.exists(os.path.dirname(marker))): os.makedirs(os.path.dirname(marker), exist_ok=True)
+    open(marker, 'w').close()
+
+def is_done(marker_dir, snap, task):
+    '''Returns True if the snapshot 'snap' has been marked as done for the task 'task' in 'marker_dir'.'''
+
+    return os.path.exists(done_marker(marker_dir, snap, task))
+
+def _log(message, log_file):
+    '''Prints 'message' with a timestamp and appends it to 'log_file' if one is given.'''
+
+    line = str(datetime.datetime.now()) + '  ' + message
+    print(line)
+    if (log_file):
+        with open(log_file, 'a') as f:
+            f.write(line + '\n')
+
+def run_snapshots(target, snaps, nproc=1, args_for=None, snap_dir=None, skip=None, failed=None, cleanup=None, retries=1, log_file=None, prefetch=None):
+    '''Runs the function 'target' on every snapshot in the list 'snaps', with up to 'nproc' snapshots
+    running at once, each in its own process. Optional arguments are:
+    args_for -- function that takes a snapshot name and returns the tuple of arguments to pass to
+                'target' for that snapshot. Default is to call target(snap).
+    snap_dir -- function that takes a snapshot name and returns the directory where that snapshot is
+                stored. If given, snapshots are run largest-first.
+    skip     -- function that takes a snapshot name and returns True if that snapshot should be skipped,
+                e.g. because its output already exists.
+    failed   -- function that takes a snapshot name and returns True if the snapshot's process failed even
+                though it exited normally, e.g. because it left files behind in /tmp. A snapshot whose
+                process exits with an error is always treated as failed.
+    cleanup  -- function that takes a snapshot name and is called after a snapshot fails, before it is
+                retried, e.g. to delete what it left behind in /tmp.
+    retries  -- how many times to retry a snapshot that fails. Default is 1.
+    log_file -- if given, the progress and timing log is also appended to this file.
+    prefetch -- function that takes a snapshot name and starts getting that snapshot ready in the
+                background, e.g. staging it to local disk. Called once for the next snapshot waiting
+                whenever a snapshot is started.
+    Returns the list of snapshots that still failed after all retries.'''
+
+    if (args_for is None): args_for = lambda snap: (snap,)
+
+    queue = []
+    for snap in snaps:
+        if (skip is not None) and (skip(snap)):
+            _log('Skipping %s, output already exists' % (snap), log_file)
+        else:
+            queue.append(snap)
+    if (snap_dir is not None):
+        sizes = dict([(snap, snapshot_size(snap_dir(snap))) for snap in queue])
+        queue.sort(key=lambda snap: sizes[snap], reverse=True)
+    n_total = len(queue)
+    attempts = dict([(snap, 0) for snap in queue])
+    running = {}
+    done = []
+    gave_up = []
+    prefetched = set()
+    start_all = time.time()
+
+    while (len(queue) > 0) or (len(running) > 0):
+        # Keep every processor busy as long as there are snapshots left
+        while (len(queue) > 0) and (len(running) < nproc):
+            snap = queue.pop(0)
+            attempts[snap] += 1
+            proc = multi.Process(target=target, args=args_for(snap))
+            proc.start()
+            running[proc.sentinel] = (proc, snap, time.time())
+            _log('Started %s (attempt %d), %d running, %d waiting' % (snap, attempts[snap], len(running), len(queue)), log_file)
+            if (prefetch is not None) and (len(queue) > 0) and (queue[0] not in prefetched):
+                prefetched.add(queue[0])
+                prefetch(queue[0])
+        # Wait for any running snapshot to finish
+        for sentinel in wait(list(running.keys())):
+            proc, snap, start = running.pop(sentinel)
+            proc.join()
+            elapsed = time.time() - start
+            if (proc.exitcode != 0) or ((failed is not None) and (failed(snap))):
+                if (cleanup is not None): cleanup(snap)
+                if (attempts[snap] <= retries):
+                    _log('FAILED %s after %.1f s (exit code %s), will retry' % (snap, elapsed, str(proc.exitcode)), log_file)
+                    queue.append(snap)
+                else:
+                    _log('FAILED %s after %.1f s (exit code %s), giving up' % (snap, elapsed, str(proc.exitcode)), log_file)
+                    gave_up.append(snap)
+            else:
+                done.append(snap)
+                _log('Finished %s in %.1f s (%d/%d done)' % (snap, elapsed, len(done), n_total), log_file)
+
+    _log('All %d snapshots finished in %.1f s, %d failed' % (n_total, time.time() - start_all, len(gave_up)), log_file)
+    if (len(gave_up) > 0):
+        _log('Failed snapshots: ' + ', '.join(gave_up), log_file)
+
+    return gave_up
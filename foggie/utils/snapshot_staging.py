@@ -0,0 +1,207 @@
+"""
+Filename: snapshot_staging.py
+This file contains a shared cache for staging snapshot directories on local scratch disk before
+they are analyzed. It is used by:
+-utils/foggie_load.py
+-utils/snapshot_scheduler.py
+-flux_tracking/flux_tracking.py
+-radial_quantities/stats_in_shells.py
+-radial_quantities/totals_in_shells.py
+-turbulence/turbulence.py
+-pressure_support/pressure_support.py
+
+Reading a snapshot from local disk is much faster than reading it from the network file system, so
+scripts used to copy the whole snapshot directory to /tmp, analyze it, and delete it again. Here a
+snapshot is copied into the staging directory only once and kept there: every process that stages
+it records its process ID in an index file, and a staged snapshot is only deleted when no running
+process is using it and the staging directory is over its disk budget, least-recently-used first.
+The index is protected by a file lock and each snapshot is copied under its own lock, so parallel
+workers that stage the same snapshot wait for one copy instead of colliding, and a copy is only
+visible once it is complete. References held by processes that have died are ignored, so a crashed
+worker does not pin its snapshot forever. The next snapshot can be copied in the background while
+the current one is being analyzed.
+
+The staging directory is FOGGIE_STAGING_DIR from the environment if it is set, otherwise /tmp, and
+should be on a disk local to the node. The disk budget is FOGGIE_STAGING_BUDGET_GB if it is set,
+otherwise half the size of the file system the staging directory is on.
+"""
+
+from __future__ import print_function
+
+import os
+import time
+import json
+import fcntl
+import shutil
+import hashlib
+import multiprocessing as multi
+from contextlib import contextmanager
+
+from foggie.utils.snapshot_scheduler import snapshot_size
+
+# Systems where snapshots are always staged, on any other system set FOGGIE_STAGING_DIR to turn it on
+staging_systems = ['pleiades_cassi']
+
+def staging_enabled(system):
+    '''Returns True if snapshots should be staged to local scratch on the system 'system', either
+    because it is one of 'staging_systems' or because FOGGIE_STAGING_DIR is set.'''
+
+    return (system in staging_systems) or ('FOGGIE_STAGING_DIR' in os.environ)
+
+def default_staging_dir():
+    '''Returns the staging directory to use when none is given.'''
+
+    return os.environ.get('FOGGIE_STAGING_DIR', '/tmp')
+
+def default_budget(staging_dir):
+    '''Returns the disk budget in bytes to use for 'staging_dir' when none is given.'''
+
+    if ('FOGGIE_STAGING_BUDGET_GB' in os.environ):
+        return float(os.environ['FOGGIE_STAGING_BUDGET_GB'])*1e9
+    stats = os.statvfs(staging_dir)
+    return 0.5*stats.f_blocks*stats.f_frsize
+
+@contextmanager
+def _locked(lock_file):
+    '''Holds an exclusive lock on 'lock_file' for the duration of the with block.'''
+
+    f = open(lock_file, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+def _cache_dir(staging_dir):
+    if (staging_dir is None): staging_dir = default_staging_dir()
+    cache_dir = os.path.join(staging_dir, 'foggie_staging')
+    if not (os.path.isdir(cache_dir)): os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'index.json')) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _write_index(cache_dir, index):
+    index_file = os.path.join(cache_dir, 'index.json')
+    with open(index_file + '.%d' % (os.getpid()), 'w') as f:
+        json.dump(index, f)
+    os.replace(index_file + '.%d' % (os.getpid()), index_file)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _evict(index, budget, keep=None):
+    '''Deletes staged snapshots in 'index' that no running process is using, least-recently-used
+    first, until the total size is within 'budget' bytes. The snapshot 'keep' is never deleted.
+    Returns True if the total size is within the budget afterwards.'''
+
+    total = sum([index[src]['size'] for src in index])
+    for src in sorted(index.keys(), key=lambda src: index[src]['last_used']):
+        if (total <= budget): break
+        entry = index[src]
+        entry['users'] = [pid for pid in entry['users'] if _pid_alive(pid)]
+        if (src==keep) or (len(entry['users']) > 0): continue
+        print('Evicting staged copy of ' + src)
+        shutil.rmtree(entry['local'], ignore_errors=True)
+        total -= entry['size']
+        del index[src]
+    return total <= budget
+
+def stage_snapshot(src_dir, staging_dir=None, budget=None):
+    '''Copies the snapshot directory 'src_dir' into the staging cache in 'staging_dir' if it is not
+    already there, marks it as in use by this process, and returns the path of the local copy. Call
+    release_snapshot when done with it (or let the process exit). 'budget' is the disk budget of the
+    cache in bytes. If the snapshot cannot fit in the budget because the other staged snapshots are
+    all in use, nothing is copied and 'src_dir' itself is returned.'''
+
+    src_dir = os.path.abspath(src_dir)
+    cache_dir = _cache_dir(staging_dir)
+    if (budget is None): budget = default_budget(cache_dir)
+    local_dir = os.path.join(cache_dir, os.path.basename(src_dir) + '_' + \
+                             hashlib.md5(src_dir.encode()).hexdigest()[:8])
+    size = snapshot_size(src_dir)
+
+    with _locked(os.path.join(cache_dir, 'index.lock')):
+        index = _read_index(cache_dir)
+        entry = index.setdefault(src_dir, {'local': local_dir, 'size': size, 'users': []})
+        entry['users'].append(os.getpid())
+        entry['last_used'] = time.time()
+        if not (_evict(index, budget, keep=src_dir)) and not (os.path.isdir(local_dir)):
+            entry['users'].remove(os.getpid())
+            if (len(entry['users'])==0): del index[src_dir]
+            _write_index(cache_dir, index)
+            print('Not enough room to stage ' + src_dir + ', reading it in place')
+            return src_dir
+        _write_index(cache_dir, index)
+
+    try:
+        with _locked(local_dir + '.lock'):
+            if (os.path.isdir(local_dir)):
+                print('Using staged copy ' + local_dir)
+            else:
+                print('Staging ' + src_dir + ' to ' + local_dir)
+                shutil.rmtree(local_dir + '.partial', ignore_errors=True)
+                shutil.copytree(src_dir, local_dir + '.partial')
+                os.rename(local_dir + '.partial', local_dir)
+    except:
+        release_snapshot(src_dir, staging_dir=staging_dir, budget=budget)
+        raise
+
+    return local_dir
+
+def release_snapshot(src_dir, staging_dir=None, budget=None):
+    '''Marks the staged copy of the snapshot directory 'src_dir' as no longer used by this process.
+    The copy is kept for later use unless the cache is over its disk budget.'''
+
+    src_dir = os.path.abspath(src_dir)
+    cache_dir = _cache_dir(staging_dir)
+    if (budget is None): budget = default_budget(cache_dir)
+
+    with _locked(os.path.join(cache_dir, 'index.lock')):
+        index = _read_index(cache_dir)
+        if (src_dir not in index): return
+        entry = index[src_dir]
+        if (os.getpid() in entry['users']): entry['users'].remove(os.getpid())
+        entry['last_used'] = time.time()
+        _evict(index, budget)
+        _write_index(cache_dir, index)
+
+def _prefetch(src_dir, staging_dir, budget):
+    try:
+        stage_snapshot(src_dir, staging_dir=staging_dir, budget=budget)
+        release_snapshot(src_dir, staging_dir=staging_dir, budget=budget)
+    except Exception as e:
+        print('Prefetching ' + src_dir + ' failed: ' + str(e))
+
+def prefetch_snapshot(src_dir, staging_dir=None, budget=None):
+    '''Stages the snapshot directory 'src_dir' in a background process, so that it is already on local
+    disk when it is needed, and releases it once it is copied. Returns the process. A process is used
+    rather than a thread so that worker processes forked while the copy is running are safe.'''
+
+    proc = multi.Process(target=_prefetch, args=(src_dir, staging_dir, budget))
+    proc.daemon = True
+    proc.start()
+    return proc
+
+@contextmanager
+def staged_snapshot(src_dir, staging_dir=None, budget=None):
+    '''Stages the snapshot directory 'src_dir' for the duration of a with block, e.g.
+    with staged_snapshot(foggie_dir + run_dir + snap) as snap_dir:
+        ds = yt.load(snap_dir + '/' + snap)'''
+
+    local_dir = stage_snapshot(src_dir, staging_dir=staging_dir, budget=budget)
+    try:
+        yield local_dir
+    finally:
+        release_snapshot(src_dir, staging_dir=staging_dir, budget=budget)
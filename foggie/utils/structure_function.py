@@ -0,0 +1,174 @@
+"""
+Filename: structure_function.py
+This file contains a pair-sampling engine for computing velocity structure functions (VSFs) of the
+cells in a region, for all cells and for any number of filter classes (e.g. temperature or
+metallicity bins) at once. It is used by:
+-turbulence/turbulence.py
+
+Pairs of cells are drawn in two ways. At large separations, random pairs of cells are drawn
+uniformly within each class, in chunks of bounded size so memory does not grow with the number of
+pairs. At small separations, where uniformly-drawn pairs almost never land, pairs are drawn from a
+KD-tree instead: random anchor cells are chosen and, for every small separation bin, one random
+neighbor of the anchor in that bin is picked and weighted by the number of neighbors the anchor has
+in that bin, so the small-separation bins are estimates of the same all-pairs average as the
+large-separation bins, but from many more pairs. Every pair is sorted into its separation bin with
+np.searchsorted and the weighted moments <|dv|^p> are accumulated for all classes, bins, and orders
+with np.bincount.
+
+Separation bins are open intervals, to match the strict inequalities used throughout the analysis
+code: a pair with separation s is in bin i if sep_bins[i] < s < sep_bins[i+1].
+"""
+
+from __future__ import print_function
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from foggie.utils.shell_binning import open_bin_index
+
+def vsf_class_members(labels, n_classes):
+    '''Lists the cells belonging to each group used by vsf_moments, where group 0 is all cells and
+    group k+1 is the cells with 'labels' equal to k. 'labels' is an integer array with one entry per
+    cell, where cells with a label of -1 belong to no class, or None if there are no classes.
+
+    Returns 'members', 'starts', and 'counts', where the cells of group g are
+    members[starts[g]:starts[g]+counts[g]].'''
+
+    if (labels is None) or (n_classes==0):
+        return None, np.array([0]), None
+    labels = np.asarray(labels)
+    in_class = np.flatnonzero(labels >= 0)
+    order = in_class[np.argsort(labels[in_class], kind='stable')]
+    class_counts = np.bincount(labels[in_class], minlength=n_classes)[:n_classes]
+    counts = np.concatenate([[len(labels)], class_counts])
+    members = np.concatenate([np.arange(len(labels)), order])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return members, starts, counts
+
+def _accumulate_pairs(sums, ind_A, ind_B, group, pos, vel, weights, sep_bins, orders, pair_weights=None):
+    '''Adds the pairs of cells 'ind_A', 'ind_B' belonging to groups 'group' into 'sums', an array of
+    shape (len(orders)+2, n_groups, n_bins) holding the number of pairs, the sum of pair weights, and
+    the weighted sums of |dv|^p for each order p in 'orders', in each group and separation bin.'''
+
+    n_groups = sums.shape[1]
+    n_bins = sums.shape[2]
+    sep = np.sqrt(np.sum((pos[ind_A] - pos[ind_B])**2., axis=1))
+    vdiff = np.sqrt(np.sum((vel[ind_A] - vel[ind_B])**2., axis=1))
+    sep_bin = open_bin_index(sep, sep_bins)
+    valid = sep_bin >= 0
+    index = group[valid]*n_bins + sep_bin[valid]
+    vdiff = vdiff[valid]
+    w = np.ones(len(index))
+    if (weights is not None): w = w*weights[ind_A[valid]]*weights[ind_B[valid]]
+    if (pair_weights is not None): w = w*pair_weights[valid]
+    size = n_groups*n_bins
+    sums[0] += np.bincount(index, minlength=size)[:size].reshape(n_groups, n_bins)
+    sums[1] += np.bincount(index, weights=w, minlength=size)[:size].reshape(n_groups, n_bins)
+    for i in range(len(orders)):
+        sums[i+2] += np.bincount(index, weights=w*vdiff**orders[i], minlength=size)[:size].reshape(n_groups, n_bins)
+
+def _random_pair_sums(pos, vel, weights, sep_bins, orders, members, starts, counts, pair_fraction, chunk_size, rng):
+    '''Draws int(pair_fraction*N) random pairs of cells within each group of N cells, 'chunk_size'
+    pairs at a time, and returns their accumulated sums as described in _accumulate_pairs.'''
+
+    n_groups = len(starts)
+    if (counts is None): counts = np.array([len(pos)])
+    sums = np.zeros((len(orders)+2, n_groups, len(sep_bins)-1))
+    npairs = (counts*pair_fraction).astype(int)
+    pair_group = np.repeat(np.arange(n_groups), npairs)
+    for c in range(0, len(pair_group), chunk_size):
+        group = pair_group[c:c+chunk_size]
+        ind_A = starts[group] + (rng.random(len(group))*counts[group]).astype(int)
+        ind_B = starts[group] + (rng.random(len(group))*counts[group]).astype(int)
+        if (members is not None):
+            ind_A = members[ind_A]
+            ind_B = members[ind_B]
+        _accumulate_pairs(sums, ind_A, ind_B, group, pos, vel, weights, sep_bins, orders)
+    return sums
+
+def _tree_pair_sums(pos, vel, weights, sep_bins, orders, tree_bins, members, starts, counts, n_anchors, anchor_batch, rng):
+    '''Draws 'n_anchors' random anchor cells within each group and, for each anchor and each of the
+    first 'tree_bins' separation bins, one random neighbor of the anchor within that bin, found with a
+    KD-tree. Each pair is weighted by the number of neighbors its anchor has in that bin, so the sums
+    estimate the average over all pairs in the bin. Returns the accumulated sums as described in
+    _accumulate_pairs.'''
+
+    n_groups = len(starts)
+    if (counts is None): counts = np.array([len(pos)])
+    sums = np.zeros((len(orders)+2, n_groups, len(sep_bins)-1))
+    r_max = sep_bins[tree_bins]
+    for g in range(n_groups):
+        if (counts[g]<2): continue
+        if (members is None): cells = np.arange(len(pos))
+        else: cells = members[starts[g]:starts[g]+counts[g]]
+        tree = cKDTree(pos[cells])
+        anchors = rng.choice(len(cells), size=min(n_anchors, len(cells)), replace=False)
+        for b in range(0, len(anchors), anchor_batch):
+            batch = anchors[b:b+anchor_batch]
+            neighbors = tree.query_ball_point(pos[cells[batch]], r_max)
+            n_neighbors = np.array([len(n) for n in neighbors])
+            if (np.sum(n_neighbors)==0): continue
+            anchor = np.repeat(batch, n_neighbors)
+            neighbor = np.concatenate([np.asarray(n, dtype=int) for n in neighbors])
+            sep = np.sqrt(np.sum((pos[cells[anchor]] - pos[cells[neighbor]])**2., axis=1))
+            sep_bin = open_bin_index(sep, sep_bins[:tree_bins+1])
+            valid = sep_bin >= 0
+            anchor = anchor[valid]
+            neighbor = neighbor[valid]
+            sep_bin = sep_bin[valid]
+            if (len(anchor)==0): continue
+            # Pick one neighbor per (anchor, bin) at random by sorting on a random key within each
+            # (anchor, bin) and keeping the first, and count how many there were to choose from
+            key = anchor.astype(np.int64)*tree_bins + sep_bin
+            order = np.lexsort((rng.random(len(key)), key))
+            key = key[order]
+            first = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+            n_in_bin = np.diff(np.concatenate([first, [len(key)]]))
+            ind_A = cells[anchor[order][first]]
+            ind_B = cells[neighbor[order][first]]
+            group = np.full(len(ind_A), g)
+            _accumulate_pairs(sums, ind_A, ind_B, group, pos, vel, weights, sep_bins, orders, \
+              pair_weights=n_in_bin.astype(float))
+    return sums
+
+def vsf_moments(pos, vel, sep_bins, weights=None, labels=None, n_classes=0, orders=[1], \
+  pair_fraction=0.5, tree_max_sep=None, n_anchors=10000, chunk_size=1000000, anchor_batch=1000, seed=None):
+    '''Calculates the velocity structure function moments <|dv|^p> in separation bins 'sep_bins' for
+    the cells with positions 'pos' and velocities 'vel' (both arrays of shape (N, 3), in any units).
+
+    'weights' gives an optional weight (e.g. mass or volume) for each cell; each pair is weighted by
+    the product of the weights of its two cells. 'labels' optionally gives an integer filter class
+    from 0 to 'n_classes'-1 for each cell (or -1 for none), and the VSF is calculated for all cells and
+    separately for pairs drawn within each class. 'orders' lists the orders p of the moments.
+
+    Separation bins whose upper edge is no larger than 'tree_max_sep' are sampled with a KD-tree from
+    'n_anchors' anchor cells per group (see _tree_pair_sums); all other bins are sampled with
+    pair_fraction*N uniformly-random pairs per group of N cells, drawn 'chunk_size' pairs at a time.
+    If 'tree_max_sep' is None, only uniformly-random pairs are used. 'seed' seeds the random draws.
+
+    Returns 'moments', 'npairs', where 'moments' has shape (len(orders), n_classes+1, len(sep_bins)-1)
+    and gives the weighted mean of |dv|^p for each order, group, and separation bin (NaN where there are
+    no pairs), and 'npairs' has shape (n_classes+1, len(sep_bins)-1) and gives the number of pairs
+    used. Group 0 is all cells and group k+1 is filter class k.'''
+
+    pos = np.asarray(pos, dtype=float)
+    vel = np.asarray(vel, dtype=float)
+    sep_bins = np.asarray(sep_bins, dtype=float)
+    if (weights is not None): weights = np.asarray(weights, dtype=float)
+    rng = np.random.default_rng(seed)
+    members, starts, counts = vsf_class_members(labels, n_classes)
+
+    if (tree_max_sep is None): tree_bins = 0
+    else: tree_bins = int(np.searchsorted(sep_bins[1:], tree_max_sep, side='right'))
+    sums = _random_pair_sums(pos, vel, weights, sep_bins, orders, members, starts, counts, \
+      pair_fraction, chunk_size, rng)
+    if (tree_bins > 0):
+        tree_sums = _tree_pair_sums(pos, vel, weights, sep_bins, orders, tree_bins, members, starts, \
+          counts, n_anchors, anchor_batch, rng)
+        sums[:,:,:tree_bins] = tree_sums[:,:,:tree_bins]
+
+    npairs = sums[0].astype(int)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        moments = sums[2:]/sums[1]
+    moments[:,npairs==0] = np.nan
+    return moments, npairs
@@ -0,0 +1,36 @@
+"""
+Filename: test_coldens_threshold.py
+This file contains tests of the cloud-method threshold solver in utils/coldens_threshold.py. Run with
+python -m pytest foggie/utils/test_coldens_threshold.py
+"""
+
+import numpy as np
+
+from foggie.utils.coldens_threshold import coldens_fraction_threshold
+
+def stepped_threshold(density, coldens_fraction):
+    '''The original stepped search of the cloud method, for comparison.'''
+
+    cut = 0.999
+    total = np.sum(density)
+    ratio = 0.001
+    while ratio < coldens_fraction:
+        part = np.sum(density[density > cut * np.max(density)])
+        ratio = part / total
+        cut = cut - 0.001
+    return cut * np.max(density)
+
+def test_matches_stepped_search():
+    density = np.random.RandomState(42).lognormal(size=1000)
+    for coldens_fraction in [0.5, 0.8, 0.9]:
+        assert np.isclose(coldens_fraction_threshold(density, coldens_fraction), \
+                          stepped_threshold(density, coldens_fraction))
+
+def test_fraction_of_one():
+    # With a fraction of 1 every nonzero cell must be kept, without the threshold going negative
+    density = np.random.RandomState(42).lognormal(size=1000)
+    density[0] = 0.
+    for step in [0.001, None]:
+        threshold = coldens_fraction_threshold(density, 1.0, step=step)
+        assert (threshold >= 0.)
+        assert (threshold <= np.min(density[density > 0.]))